@@ -3,6 +3,24 @@ import threading
 from config.database import DatabaseConfig
 import pymysql
 
+
+class DuplicateNumberError(ValueError):
+    """Numri i dokumentit është i zënë (indeksi UNIQUE doc_year, seq_no, seq_suffix)"""
+
+    def __init__(self, number, year=None):
+        where = f" për vitin {year}" if year else ""
+        super().__init__(f"Numri '{number}' ekziston tashmë{where}. Zgjidhni një numër tjetër.")
+
+
+def is_duplicate_number(error):
+    """A është IntegrityError nga indeksi i numrit (1062 Duplicate entry ... uq_*_year_seq)"""
+    return (
+        isinstance(error, pymysql.err.IntegrityError)
+        and bool(error.args) and error.args[0] == 1062
+        and "_year_seq" in str(error)
+    )
+
+
 class Database:
     """Klasa hibride për operacionet me databazën (Cloud & Local Backup)"""
     
@@ -84,6 +102,10 @@ class Database:
                                 Database._backup_conn.commit()
                         except: pass
                     return last_id
+            except pymysql.err.IntegrityError:
+                # Shkelje e një indeksi (p.sh. numër dokumenti i zënë): jo problem lidhjeje.
+                # Nuk kalojmë në backup, përndryshe dy databazat ndahen pa u vënë re.
+                raise
             except:
                 Database._is_offline = True
                 # Bejme fallback te Backup nese ka
@@ -97,6 +119,8 @@ class Database:
                         return cursor.fetchall()
                     Database._backup_conn.commit()
                     return cursor.lastrowid
+            except pymysql.err.IntegrityError:
+                raise
             except:
                 Database._backup_conn = None # Mark as dead
                 
@@ -120,6 +144,8 @@ class Database:
                                 Database._backup_conn.commit()
                         except: pass
                 return True
+            except pymysql.err.IntegrityError:
+                raise
             except:
                 Database._is_offline = True
 
@@ -129,6 +155,8 @@ class Database:
                     cursor.executemany(query, params_list)
                     Database._backup_conn.commit()
                 return True
+            except pymysql.err.IntegrityError:
+                raise
             except:
                 Database._backup_conn = None
         return False
@@ -1,7 +1,9 @@
 """
 Modeli për faturave
 """
-from models.database import Database
+from models.database import Database, DuplicateNumberError, is_duplicate_number
+from models.monthly_rollup import MonthlyRollup
+from utils.doc_number import seq_columns, doc_year
 from datetime import datetime, date
 from decimal import Decimal
 
@@ -55,7 +57,7 @@ class Invoice:
                 params.extend([search_pattern, search_pattern])
         
         # Renditja sipas numrit të faturës (duke nxjerrë pjesën numerike për radhitje të saktë)
-        query += " ORDER BY CAST(SUBSTRING_INDEX(i.invoice_number, 'NR.', -1) AS UNSIGNED) DESC, i.id DESC"
+        query += " ORDER BY i.seq_no DESC, i.id DESC"
         
         # LIMIT vetëm nëse specifikohet eksplicitisht
         if limit and limit > 0:
@@ -108,20 +110,13 @@ class Invoice:
                 prefix = f"/{res[0]['setting_value']}"
         except: pass
 
-        # 2. Merr faturën e fundit të këtij viti
-        query = "SELECT invoice_number FROM invoices WHERE YEAR(date) = %s ORDER BY id DESC LIMIT 1"
-        result = database.execute_query(query, (current_year,))
+        # 2. Numri më i madh i këtij viti për këtë prapashtesë (indeks mbi doc_year, seq_no, seq_suffix)
+        query = "SELECT MAX(seq_no) as max_seq FROM invoices WHERE doc_year = %s AND seq_suffix = %s"
+        result = database.execute_query(query, (current_year, prefix.lstrip('/')))
         
         next_val = 1
-        if result and len(result) > 0:
-            last_number = result[0]['invoice_number']
-            try:
-                # Nxirr vetëm numrin (heqim 'FATURA NR.' dhe prapashtesën '/A')
-                import re
-                nums = re.findall(r'NR\.(\d+)', last_number.upper())
-                if nums:
-                    next_val = int(nums[0]) + 1
-            except: pass
+        if result and result[0]['max_seq']:
+            next_val = int(result[0]['max_seq']) + 1
         
         return f"FATURA NR.{next_val}{prefix}"
 
@@ -179,30 +174,41 @@ class Invoice:
         # Llogarit totalet para se të ruhet
         self.calculate_totals()
         
+        previous_date = None
         if self.id:
+            previous = self.db.execute_query("SELECT date FROM invoices WHERE id = %s", (self.id,))
+            previous_date = previous[0]['date'] if previous else None
             # Update
             query = """UPDATE invoices SET 
                 invoice_number = %s, date = %s, payment_due_date = %s,
                 client_id = %s, template_id = %s, subtotal = %s,
                 vat_percentage = %s, vat_amount = %s, total = %s, status = %s,
-                pdf_path = %s
+                pdf_path = %s, doc_year = %s, seq_no = %s, seq_suffix = %s
                 WHERE id = %s"""
             params = (self.invoice_number, self.date, self.payment_due_date,
                      self.client_id, self.template_id, float(self.subtotal),
                      float(self.vat_percentage), float(self.vat_amount),
-                     float(self.total), self.status, self.pdf_path, self.id)
+                     float(self.total), self.status, self.pdf_path,
+                     doc_year(self.date), *seq_columns(self.invoice_number), self.id)
         else:
             # Insert
             query = """INSERT INTO invoices 
                 (invoice_number, date, payment_due_date, client_id, template_id,
-                 subtotal, vat_percentage, vat_amount, total, status, pdf_path)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
+                 subtotal, vat_percentage, vat_amount, total, status, pdf_path,
+                 doc_year, seq_no, seq_suffix)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
             params = (self.invoice_number, self.date, self.payment_due_date,
                      self.client_id, self.template_id, float(self.subtotal),
                      float(self.vat_percentage), float(self.vat_amount),
-                     float(self.total), self.status, self.pdf_path)
+                     float(self.total), self.status, self.pdf_path,
+                     doc_year(self.date), *seq_columns(self.invoice_number))
         
-        result = self.db.execute_query(query, params)
+        try:
+            result = self.db.execute_query(query, params)
+        except Exception as e:
+            if is_duplicate_number(e):
+                raise DuplicateNumberError(self.invoice_number, doc_year(self.date)) from e
+            raise
         if result is not None:
             if not self.id:
                 self.id = result
@@ -225,6 +231,7 @@ class Invoice:
                 ]
                 self.db.execute_many(insert_query, items_params)
             
+            MonthlyRollup.refresh(self.db, 'invoice', previous_date, self.date)
             return True
         return False
     
@@ -235,6 +242,7 @@ class Invoice:
         
         query = "DELETE FROM invoices WHERE id = %s"
         result = self.db.execute_query(query, (self.id,))
+        MonthlyRollup.refresh(self.db, 'invoice', self.date)
         # Sigurohu qe ndryshimi ruhet ne Cloud nese jemi online
         if self.db.connection:
             try: self.db.connection.commit()
@@ -246,7 +254,27 @@ class Invoice:
         """Merr statistikat për dashboard"""
         database = db or Database()
         today = date.today()
+        params = (today.month, today.year, today.year)
         
+        # Lexon rreshtat e monthly_rollups në vend që të skanojë faturat
+        if MonthlyRollup.available(database):
+            query = """
+                SELECT 
+                    COALESCE(SUM(CASE WHEN month = %s AND year = %s THEN revenue ELSE 0 END), 0) as month_total,
+                    COALESCE(SUM(CASE WHEN year = %s THEN revenue ELSE 0 END), 0) as year_total,
+                    COALESCE(SUM(unpaid_revenue), 0) as unpaid_total,
+                    COALESCE(SUM(doc_count), 0) as total_invoices,
+                    COUNT(*) as rollup_rows
+                FROM monthly_rollups
+                WHERE doc_type = 'invoice'
+            """
+            result = database.execute_query(query, params)
+            if result and result[0]['rollup_rows']:
+                stats = result[0]
+                stats.pop('rollup_rows')
+                return stats
+        
+        # Tabela mungon ose s'është mbushur ende - agregati mbi faturat
         query = """
             SELECT 
                 COALESCE(SUM(CASE WHEN MONTH(date) = %s AND YEAR(date) = %s THEN total ELSE 0 END), 0) as month_total,
@@ -255,8 +283,7 @@ class Invoice:
                 COUNT(*) as total_invoices
             FROM invoices
         """
-        
-        result = database.execute_query(query, (today.month, today.year, today.year))
+        result = database.execute_query(query, params)
         return result[0] if result else {'month_total': 0, 'year_total': 0, 'unpaid_total': 0, 'total_invoices': 0}
 
     @staticmethod
@@ -287,9 +314,12 @@ class Invoice:
     def get_available_years(db=None):
         """Kthen listën e viteve që kanë fatura"""
         database = db or Database()
-        query = "SELECT DISTINCT YEAR(date) as year FROM invoices ORDER BY year DESC"
-        result = database.execute_query(query)
-        years = [str(r['year']) for r in result] if result else []
+        years = MonthlyRollup.get_years(database, 'invoice')
+        if not years:
+            # Tabela e rollup-it mungon (p.sh. backup lokal) - skano faturat
+            query = "SELECT DISTINCT YEAR(date) as year FROM invoices ORDER BY year DESC"
+            result = database.execute_query(query)
+            years = [str(r['year']) for r in result] if result else []
         current_year = str(date.today().year)
         if current_year not in years:
             years.insert(0, current_year)
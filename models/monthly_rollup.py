@@ -0,0 +1,68 @@
+"""
+Rollup mujor (monthly_rollups) - lexim për dashboard dhe vitet, rifreskim pas shkrimeve të desktop-it.
+Rifreskimi është i njëjtë me atë të backend-it web (web/backend/rollups.py, refresh): muajt e prekur
+rillogariten nga rreshtat burim dhe rreshti mbishkruhet, ndaj vlerat nuk varen nga kush shkroi i fundit.
+"""
+from datetime import date
+from models.database import Database
+
+# doc_type -> (tabela, kolona e datës, ka status pagese)
+_SOURCES = {
+    'invoice': ('invoices', 'date', True),
+    'offer': ('offers', 'date', False),
+}
+
+
+class MonthlyRollup:
+    """Agregatet mujore të faturave/ofertave (të njëjtat rreshta që mban backend-i web)"""
+
+    @staticmethod
+    def available(db):
+        """A ekziston tabela në databazën aktive (backup-i lokal mund të ketë skemë të vjetër).
+        Një query mbi tabelë që mungon e shënon lidhjen e backup-it si të vdekur, ndaj kontrollohet më parë."""
+        database = db or Database()
+        query = """SELECT COUNT(*) as n FROM information_schema.tables
+                   WHERE table_schema = DATABASE() AND table_name = 'monthly_rollups'"""
+        result = database.execute_query(query)
+        return bool(result and result[0]['n'])
+
+    @staticmethod
+    def refresh(db, doc_type, *dates):
+        """Rillogarit muajt e prekur nga një shkrim (p.sh. data e vjetër dhe e re e faturës)"""
+        database = db or Database()
+        if not MonthlyRollup.available(database):
+            return
+        table, date_col, has_status = _SOURCES[doc_type]
+        if has_status:
+            status_cols = """
+                COALESCE(SUM(CASE WHEN status = 'paid' THEN 1 ELSE 0 END), 0),
+                COALESCE(SUM(CASE WHEN status != 'paid' THEN 1 ELSE 0 END), 0),
+                COALESCE(SUM(CASE WHEN status != 'paid' THEN total ELSE 0 END), 0)"""
+        else:
+            status_cols = "0, 0, 0"
+        months = {(d.year, d.month) for d in dates if d}
+        for year, month in months:
+            start = date(year, month, 1)
+            end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+            query = f"""
+                INSERT INTO monthly_rollups
+                    (doc_type, year, month, doc_count, revenue, vat, paid_count, unpaid_count, unpaid_revenue)
+                SELECT %s, %s, %s, COUNT(*), COALESCE(SUM(total), 0), COALESCE(SUM(vat_amount), 0), {status_cols}
+                FROM {table} WHERE {date_col} >= %s AND {date_col} < %s
+                ON DUPLICATE KEY UPDATE
+                    doc_count = VALUES(doc_count), revenue = VALUES(revenue), vat = VALUES(vat),
+                    paid_count = VALUES(paid_count), unpaid_count = VALUES(unpaid_count),
+                    unpaid_revenue = VALUES(unpaid_revenue)
+            """
+            database.execute_query(query, (doc_type, year, month, start, end))
+
+    @staticmethod
+    def get_years(db, doc_type):
+        """Vitet me të paktën një dokument (zbritës); [] nëse tabela mungon"""
+        database = db or Database()
+        if not MonthlyRollup.available(database):
+            return []
+        query = """SELECT DISTINCT year FROM monthly_rollups
+                   WHERE doc_type = %s AND doc_count > 0 ORDER BY year DESC"""
+        result = database.execute_query(query, (doc_type,))
+        return [str(r['year']) for r in result] if result else []
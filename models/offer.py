@@ -1,7 +1,9 @@
 from datetime import date
 from decimal import Decimal
 import mysql.connector
-from models.database import Database
+from models.database import Database, DuplicateNumberError, is_duplicate_number
+from models.monthly_rollup import MonthlyRollup
+from utils.doc_number import seq_columns, doc_year
 
 class Offer:
     def __init__(self, db_connection=None):
@@ -54,30 +56,37 @@ class Offer:
             return False
             
         try:
+            previous_date = None
             if not self.id:
                 # Insert
                 query = """
-                    INSERT INTO offers (offer_number, date, client_id, subject, description, subtotal, vat_percentage, vat_amount, total, pdf_path)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    INSERT INTO offers (offer_number, date, client_id, subject, description, subtotal, vat_percentage, vat_amount, total, pdf_path,
+                                        doc_year, seq_no, seq_suffix)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 """
                 values = (
                     self.offer_number, self.date, self.client_id, self.subject, self.description,
-                    float(self.subtotal), float(self.vat_percentage), float(self.vat_amount), float(self.total), self.pdf_path
+                    float(self.subtotal), float(self.vat_percentage), float(self.vat_amount), float(self.total), self.pdf_path,
+                    doc_year(self.date), *seq_columns(self.offer_number)
                 )
                 result = self.db.execute_query(query, values)
                 if result:
                     self.id = result
             else:
+                previous = self.db.execute_query("SELECT date FROM offers WHERE id = %s", (self.id,))
+                previous_date = previous[0]['date'] if previous else None
                 # Update
                 query = """
                     UPDATE offers 
                     SET offer_number=%s, date=%s, client_id=%s, subject=%s, description=%s,
-                        subtotal=%s, vat_percentage=%s, vat_amount=%s, total=%s, pdf_path=%s
+                        subtotal=%s, vat_percentage=%s, vat_amount=%s, total=%s, pdf_path=%s,
+                        doc_year=%s, seq_no=%s, seq_suffix=%s
                     WHERE id=%s
                 """
                 values = (
                     self.offer_number, self.date, self.client_id, self.subject, self.description,
                     float(self.subtotal), float(self.vat_percentage), float(self.vat_amount), float(self.total), self.pdf_path,
+                    doc_year(self.date), *seq_columns(self.offer_number),
                     self.id
                 )
                 self.db.execute_query(query, values)
@@ -102,9 +111,13 @@ class Offer:
                             custom_attr_json, idx
                         ))
                     self.db.execute_many(item_query, item_values)
+                MonthlyRollup.refresh(self.db, 'offer', previous_date, self.date)
             
             return True
         except Exception as err:
+            if is_duplicate_number(err):
+                # Ofertat numërohen pa vit, por indeksi mban edhe doc_year
+                raise DuplicateNumberError(self.offer_number, doc_year(self.date)) from err
             print(f"Error saving offer: {err}")
             return False
 
@@ -203,6 +216,7 @@ class Offer:
         try:
             self.db.execute_query("DELETE FROM offer_items WHERE offer_id = %s", (self.id,))
             self.db.execute_query("DELETE FROM offers WHERE id = %s", (self.id,))
+            MonthlyRollup.refresh(self.db, 'offer', self.date)
             return True
         except Exception as e:
             print(f"Error deleting offer: {e}")
@@ -238,7 +252,7 @@ class Offer:
             query += " WHERE " + " AND ".join(conditions)
             
         # Renditja sipas numrit të ofertës (duke nxjerrë pjesën sekuenciale)
-        query += " ORDER BY CAST(SUBSTRING_INDEX(o.offer_number, '-', -1) AS UNSIGNED) DESC, o.id DESC"
+        query += " ORDER BY o.seq_no DESC, o.id DESC"
         
         return db.execute_query(query, tuple(params))
 
@@ -247,6 +261,8 @@ class Offer:
         """Kthen vitet e disponueshme në oferta"""
         db = db_connection or Database()
         try:
+            years = MonthlyRollup.get_years(db, 'offer')
+            if years: return years
             query = "SELECT DISTINCT YEAR(date) as year FROM offers ORDER BY year DESC"
             result = db.execute_query(query)
             if result: return [str(r['year']) for r in result]
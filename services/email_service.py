@@ -3,11 +3,8 @@ Shërbimi për dërgimin e email-eve - v1.0.0
 """
 import smtplib
 import os
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
 from models.company import Company
+from services import mime_stream
 
 class EmailService:
     @staticmethod
@@ -24,11 +21,7 @@ class EmailService:
             return False, "Adresa e email-it marrës nuk është caktuar."
             
         try:
-            # Krijo mesazhin (kodi ekzistues)
-            msg = MIMEMultipart()
-            msg['From'] = f"{company.name} <{company.smtp_user}>"
-            msg['To'] = dest_email
-            msg['Subject'] = f"Faturë e re: {invoice.invoice_number} - {company.name}"
+            subject = f"Faturë e re: {invoice.invoice_number} - {company.name}"
 
             if is_to_company:
                 body = f"""
@@ -61,51 +54,50 @@ Me respekt,
 {company.name}
 {company.phone}
 """
-            msg.attach(MIMEText(body, 'plain'))
-
-            if os.path.exists(pdf_path):
-                with open(pdf_path, "rb") as attachment:
-                    part = MIMEBase("application", "octet-stream")
-                    part.set_payload(attachment.read())
-                encoders.encode_base64(part)
-                part.add_header("Content-Disposition", f"attachment; filename= {os.path.basename(pdf_path)}")
-                msg.attach(part)
-
-            # --- LOGJIKA E RE E DËRGIMIT ME FALLBACK ---
-            text = msg.as_string()
-            error_msg = ""
-            import ssl
-            context = ssl.create_default_context()
-            
-            # 1. Provo SSL (465)
-            try:
-                # Nëse porti është konfiguruar 587, provoje atë fillimisht me TLS, ndryshe provo SSL
-                if int(company.smtp_port) == 587:
-                     raise Exception("Skipping SSL for 587")
-                     
-                server = smtplib.SMTP_SSL(company.smtp_server, 465, context=context, timeout=15)
-                server.login(company.smtp_user, company.smtp_password)
-                server.sendmail(company.smtp_user, dest_email, text)
-                server.quit()
-                return True, "Email u dërgua me sukses (SSL)!"
-            except Exception as e_ssl:
-                error_msg += f"SSL [{company.smtp_server}:465]: {e_ssl}. "
-                
-                # 2. Provo TLS (587) - Fallback
-                try:
-                    server = smtplib.SMTP(company.smtp_server, 587, timeout=15)
-                    server.starttls(context=context)
-                    server.login(company.smtp_user, company.smtp_password)
-                    server.sendmail(company.smtp_user, dest_email, text)
-                    server.quit()
-                    return True, "Email u dërgua me sukses (TLS)!"
-                except Exception as e_tls:
-                    error_msg += f"TLS [{company.smtp_server}:587]: {e_tls}."
-                    return False, f"Dështoi: {error_msg}"
+            # Mesazhi ndërtohet në një skedar spool: PDF-ja nuk mbahet e tëra në memorie
+            spool = mime_stream.spool_message(
+                company.name, company.smtp_user, dest_email, subject, body,
+                [(pdf_path, os.path.basename(pdf_path))]
+            )
+            with spool:
+                return EmailService._send_with_fallback(company, dest_email, spool)
 
         except Exception as e:
             return False, f"Gabim gjatë përgatitjes: {str(e)}"
 
+    @staticmethod
+    def _send_with_fallback(company, dest_email, spool):
+        """SSL (465), pastaj TLS (587) si fallback; i njëjti spool rilexohet nga fillimi."""
+        error_msg = ""
+        import ssl
+        context = ssl.create_default_context()
+
+        # 1. Provo SSL (465)
+        try:
+            # Nëse porti është konfiguruar 587, provoje atë fillimisht me TLS, ndryshe provo SSL
+            if int(company.smtp_port) == 587:
+                 raise Exception("Skipping SSL for 587")
+
+            server = smtplib.SMTP_SSL(company.smtp_server, 465, context=context, timeout=15)
+            server.login(company.smtp_user, company.smtp_password)
+            mime_stream.send_spooled(server, company.smtp_user, dest_email, spool)
+            server.quit()
+            return True, "Email u dërgua me sukses (SSL)!"
+        except Exception as e_ssl:
+            error_msg += f"SSL [{company.smtp_server}:465]: {e_ssl}. "
+
+            # 2. Provo TLS (587) - Fallback
+            try:
+                server = smtplib.SMTP(company.smtp_server, 587, timeout=15)
+                server.starttls(context=context)
+                server.login(company.smtp_user, company.smtp_password)
+                mime_stream.send_spooled(server, company.smtp_user, dest_email, spool)
+                server.quit()
+                return True, "Email u dërgua me sukses (TLS)!"
+            except Exception as e_tls:
+                error_msg += f"TLS [{company.smtp_server}:587]: {e_tls}."
+                return False, f"Dështoi: {error_msg}"
+
     @staticmethod
     def send_bulk_invoices(invoice_pdf_pairs, dest_email):
         """
@@ -120,10 +112,7 @@ Me respekt,
             return False, "Cilësimet e email-it (SMTP) nuk janë konfiguruar."
             
         try:
-            msg = MIMEMultipart()
-            msg['From'] = f"{company.name} <{company.smtp_user}>"
-            msg['To'] = dest_email
-            msg['Subject'] = f"Faturat ({len(invoice_pdf_pairs)}) - {company.name}"
+            subject = f"Faturat ({len(invoice_pdf_pairs)}) - {company.name}"
 
             # Ndërto trupin e email-it vetëm me data dhe numra
             body_lines = []
@@ -133,57 +122,19 @@ Me respekt,
                 body_lines.append(line)
             
             body = "\n".join(body_lines)
-            msg.attach(MIMEText(body, 'plain'))
 
             # Bashkëngjit të gjitha PDF-të
+            attachments = []
             for inv, pdf_path in invoice_pdf_pairs:
-                if os.path.exists(pdf_path):
-                    with open(pdf_path, "rb") as attachment:
-                        part = MIMEBase("application", "octet-stream")
-                        part.set_payload(attachment.read())
-                    
-                    encoders.encode_base64(part)
-                    filename = f"{inv.invoice_number}.pdf"
-                    # Pastro filename nga karaktere të palejueshme nëse ka
-                    filename = "".join([c for c in filename if c.isalnum() or c in (' ', '.', '-', '_')])
-                    
-                    part.add_header(
-                        "Content-Disposition",
-                        f"attachment; filename= {filename}",
-                    )
-                    msg.attach(part)
-
-            # --- LOGJIKA E RE E DËRGIMIT ME FALLBACK (BULK) ---
-            text = msg.as_string()
-            error_msg = ""
-            import ssl
-            context = ssl.create_default_context()
-            
-            # 1. Provo SSL (465)
-            try:
-                # Nëse porti është konfiguruar 587, provoje atë fillimisht me TLS, ndryshe provo SSL
-                if int(company.smtp_port) == 587:
-                     raise Exception("Skipping SSL for 587")
-                     
-                server = smtplib.SMTP_SSL(company.smtp_server, 465, context=context, timeout=15)
-                server.login(company.smtp_user, company.smtp_password)
-                server.sendmail(company.smtp_user, dest_email, text)
-                server.quit()
-                return True, "Email u dërgua me sukses (SSL)!"
-            except Exception as e_ssl:
-                error_msg += f"SSL [{company.smtp_server}:465]: {e_ssl}. "
-                
-                # 2. Provo TLS (587) - Fallback
-                try:
-                    server = smtplib.SMTP(company.smtp_server, 587, timeout=15)
-                    server.starttls(context=context)
-                    server.login(company.smtp_user, company.smtp_password)
-                    server.sendmail(company.smtp_user, dest_email, text)
-                    server.quit()
-                    return True, "Email u dërgua me sukses (TLS)!"
-                except Exception as e_tls:
-                    error_msg += f"TLS [{company.smtp_server}:587]: {e_tls}."
-                    return False, f"Dështoi: {error_msg}"
+                filename = f"{inv.invoice_number}.pdf"
+                # Pastro filename nga karaktere të palejueshme nëse ka
+                filename = "".join([c for c in filename if c.isalnum() or c in (' ', '.', '-', '_')])
+                attachments.append((pdf_path, filename))
+
+            # PDF-të lexohen nga disku në copa gjatë ndërtimit, jo të gjitha njëherësh në memorie
+            spool = mime_stream.spool_message(company.name, company.smtp_user, dest_email, subject, body, attachments)
+            with spool:
+                return EmailService._send_with_fallback(company, dest_email, spool)
 
         except Exception as e:
             return False, f"Gabim gjatë dërgimit: {str(e)}"
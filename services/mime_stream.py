@@ -0,0 +1,146 @@
+"""
+Mesazhe email me bashkëngjitje të mëdha pa i mbajtur në memorie.
+
+Mesazhi (multipart/mixed) gjenerohet rresht pas rreshti: PDF-të lexohen nga disku në copa
+CHUNK_SIZE, kodohen në base64 dhe shkruhen në një SpooledTemporaryFile (në memorie deri në
+SPOOL_MAX_MEMORY, pastaj në disk). send_spooled e dërgon skedarin drejt e te komanda SMTP DATA,
+kështu memoria mbetet rreth një copë sido që të jenë numri dhe madhësia e bashkëngjitjeve.
+"""
+import base64
+import os
+import smtplib
+import tempfile
+import uuid
+from email.header import Header
+from email.utils import formataddr, formatdate, make_msgid
+from urllib.parse import quote
+
+# Shumëfish i 57: çdo rresht base64 ka saktësisht 76 karaktere
+CHUNK_SIZE = 57 * 1024
+SPOOL_MAX_MEMORY = 512 * 1024
+_SEND_BUFFER = 64 * 1024
+
+
+def _header(value: str) -> str:
+    if value.isascii():
+        return value
+    return Header(value, "utf-8").encode()
+
+
+def _filename_param(filename: str) -> str:
+    if filename.isascii():
+        return 'filename="{}"'.format(filename.replace('"', ""))
+    return "filename*=utf-8''{}".format(quote(filename))
+
+
+def _base64_lines(data: bytes) -> bytes:
+    return base64.encodebytes(data).replace(b"\n", b"\r\n")
+
+
+def message_chunks(from_name, from_addr, dest_email, subject, body, attachments):
+    """
+    Bajtet e mesazhit në copa (CRLF, vetëm ASCII).
+    attachments: [(rruga, emri i skedarit)]; skedarët që mungojnë anashkalohen.
+    """
+    boundary = f"=={uuid.uuid4().hex}"
+    headers = [
+        f"From: {formataddr((from_name or '', from_addr), 'utf-8')}",
+        f"To: {dest_email}",
+        f"Subject: {_header(subject)}",
+        f"Date: {formatdate(localtime=True)}",
+        f"Message-ID: {make_msgid()}",
+        "MIME-Version: 1.0",
+        f'Content-Type: multipart/mixed; boundary="{boundary}"',
+    ]
+    yield ("\r\n".join(headers) + "\r\n\r\n").encode("ascii")
+
+    yield (
+        f"--{boundary}\r\n"
+        "Content-Type: text/plain; charset=\"utf-8\"\r\n"
+        "Content-Transfer-Encoding: base64\r\n\r\n"
+    ).encode("ascii")
+    yield _base64_lines(body.encode("utf-8"))
+
+    for path, filename in attachments:
+        if not path or not os.path.exists(path):
+            continue
+        yield (
+            f"--{boundary}\r\n"
+            "Content-Type: application/octet-stream\r\n"
+            "Content-Transfer-Encoding: base64\r\n"
+            f"Content-Disposition: attachment; {_filename_param(filename or os.path.basename(path))}\r\n\r\n"
+        ).encode("ascii")
+        with open(path, "rb") as source:
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield _base64_lines(chunk)
+
+    yield f"--{boundary}--\r\n".encode("ascii")
+
+
+def spool_message(from_name, from_addr, dest_email, subject, body, attachments):
+    """Mesazhi i plotë në një SpooledTemporaryFile, i kthyer në fillim (thirrësi e mbyll)."""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    try:
+        for chunk in message_chunks(from_name, from_addr, dest_email, subject, body, attachments):
+            spool.write(chunk)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def send_spooled(server, from_addr, to_addrs, spool):
+    """
+    Si smtplib.SMTP.sendmail, por përmbajtja lexohet nga `spool` dhe dërgohet në copa te DATA.
+    Ngre të njëjtat gabime si sendmail; kthen marrësit e refuzuar (dict).
+    """
+    if isinstance(to_addrs, str):
+        to_addrs = [to_addrs]
+    server.ehlo_or_helo_if_needed()
+    code, resp = server.mail(from_addr)
+    if code != 250:
+        _reset(server, code)
+        raise smtplib.SMTPSenderRefused(code, resp, from_addr)
+    refused = {}
+    for addr in to_addrs:
+        code, resp = server.rcpt(addr)
+        if code not in (250, 251):
+            refused[addr] = (code, resp)
+    if len(refused) == len(to_addrs):
+        _reset(server, code)
+        raise smtplib.SMTPRecipientsRefused(refused)
+
+    code, resp = server.docmd("data")
+    if code != 354:
+        _reset(server, code)
+        raise smtplib.SMTPDataError(code, resp)
+    spool.seek(0)
+    buffer = bytearray()
+    for line in spool:
+        if line.startswith(b"."):
+            buffer += b"."
+        buffer += line
+        if len(buffer) >= _SEND_BUFFER:
+            server.send(bytes(buffer))
+            buffer.clear()
+    buffer += b".\r\n"
+    server.send(bytes(buffer))
+    code, resp = server.getreply()
+    if code != 250:
+        _reset(server, code)
+        raise smtplib.SMTPDataError(code, resp)
+    return refused
+
+
+def _reset(server, code):
+    if code == 421:
+        server.close()
+        return
+    try:
+        server.rset()
+    except smtplib.SMTPServerDisconnected:
+        pass
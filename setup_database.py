@@ -7,6 +7,17 @@ from mysql.connector import Error
 import os
 from config.database import DatabaseConfig
 from config.settings import SQL_DIR
+from utils.doc_number import seq_columns, doc_year
+
+def backfill_seq_columns(cursor, table, number_col):
+    """Plotëson doc_year, seq_no, seq_suffix aty ku mungojnë"""
+    cursor.execute(f"SELECT id, {number_col}, date FROM {table} WHERE doc_year IS NULL")
+    params = []
+    for row_id, number, doc_date in cursor.fetchall():
+        seq_no, suffix = seq_columns(number)
+        params.append((doc_year(doc_date), seq_no, suffix, row_id))
+    if params:
+        cursor.executemany(f"UPDATE {table} SET doc_year = %s, seq_no = %s, seq_suffix = %s WHERE id = %s", params)
 
 def create_database(is_backup=False):
     """Krijon databazën dhe tabelat (Primary ose Backup)"""
@@ -80,12 +91,26 @@ def create_database(is_backup=False):
                     "ALTER TABLE invoices ADD COLUMN IF NOT EXISTS status ENUM('draft', 'sent', 'paid') DEFAULT 'draft'",
                     "DROP INDEX IF EXISTS invoice_number ON invoices"
                 ]
+                for table in ("invoices", "offers"):
+                    updates += [
+                        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS doc_year INT NULL",
+                        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS seq_no INT NULL",
+                        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS seq_suffix VARCHAR(20) NOT NULL DEFAULT ''",
+                        f"CREATE INDEX IF NOT EXISTS ix_{table}_seq_no ON {table} (seq_no)",
+                        f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{table}_year_seq ON {table} (doc_year, seq_no, seq_suffix)",
+                    ]
                 
                 for up_sql in updates:
                     try: cursor.execute(up_sql)
                     except: pass
                 
                 connection.commit()
+                
+                # 5. Mbush doc_year/seq_no për rreshtat e vjetër (renditja pa CAST mbi numrin)
+                for table, number_col in (("invoices", "invoice_number"), ("offers", "offer_number")):
+                    try: backfill_seq_columns(cursor, table, number_col)
+                    except: pass
+                connection.commit()
                 print(f"✓ {db_label} sinkronizuar.")
 
             cursor.close()
@@ -53,12 +53,17 @@ CREATE TABLE IF NOT EXISTS invoices (
     total DECIMAL(10, 2) DEFAULT 0.00,
     status ENUM('draft', 'sent', 'paid') DEFAULT 'draft',
     pdf_path VARCHAR(500),
+    doc_year INT NULL,
+    seq_no INT NULL,
+    seq_suffix VARCHAR(20) NOT NULL DEFAULT '',
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (client_id) REFERENCES clients(id) ON DELETE RESTRICT,
     FOREIGN KEY (template_id) REFERENCES templates(id) ON DELETE SET NULL,
     INDEX idx_invoice_date (date),
-    INDEX idx_invoice_number (invoice_number)
+    INDEX idx_invoice_number (invoice_number),
+    INDEX ix_invoices_seq_no (seq_no),
+    UNIQUE KEY uq_invoices_year_seq (doc_year, seq_no, seq_suffix)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 CREATE TABLE IF NOT EXISTS invoice_items (
@@ -92,9 +97,14 @@ CREATE TABLE IF NOT EXISTS offers (
     vat_amount DECIMAL(10, 2) DEFAULT 0.00,
     total DECIMAL(10, 2) DEFAULT 0.00,
     pdf_path VARCHAR(500),
+    doc_year INT NULL,
+    seq_no INT NULL,
+    seq_suffix VARCHAR(20) NOT NULL DEFAULT '',
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-    FOREIGN KEY (client_id) REFERENCES clients(id) ON DELETE RESTRICT
+    FOREIGN KEY (client_id) REFERENCES clients(id) ON DELETE RESTRICT,
+    INDEX ix_offers_seq_no (seq_no),
+    UNIQUE KEY uq_offers_year_seq (doc_year, seq_no, seq_suffix)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 CREATE TABLE IF NOT EXISTS offer_items (
@@ -113,3 +123,17 @@ CREATE TABLE IF NOT EXISTS offer_items (
 
 INSERT IGNORE INTO companies (id, name, address, phone, email, unique_number, fiscal_number, account_nib) 
 VALUES (1, 'HOLKOS', 'Kashice - Istog', '044 224 031', 'holkosmetal@yahoo.com', '811226530', '600610093', '1706017400348068');
+
+CREATE TABLE IF NOT EXISTS monthly_rollups (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    doc_type VARCHAR(20) NOT NULL,
+    year INT NOT NULL,
+    month INT NOT NULL,
+    doc_count INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0.00,
+    vat DECIMAL(14, 2) NOT NULL DEFAULT 0.00,
+    paid_count INT NOT NULL DEFAULT 0,
+    unpaid_count INT NOT NULL DEFAULT 0,
+    unpaid_revenue DECIMAL(14, 2) NOT NULL DEFAULT 0.00,
+    UNIQUE KEY uq_monthly_rollups_bucket (doc_type, year, month)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
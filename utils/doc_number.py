@@ -0,0 +1,39 @@
+"""
+Analiza e numrit të dokumentit ('FATURA NR.12/A' -> 12, 'A') për kolonat seq_no/seq_suffix.
+
+Kopje e qëllimshme e web/backend/sequences.py (parse_number/seq_columns): desktop-i (exe) dhe
+backend-i web ndërtohen e shpërndahen veç e veç dhe asnjëri nuk e importon tjetrin. Të dy shkruajnë
+të njëjtat kolona mbi indeksin UNIQUE (doc_year, seq_no, seq_suffix), ndaj duhet të japin të njëjtin
+rezultat; web/backend/tests/test_doc_number.py i krahason. Ndryshimet bëhen në të dy skedarët.
+"""
+import re
+
+_NUMBER_RE = re.compile(r'NR\.(\d+)', re.IGNORECASE)
+# Formati i vjetër i ofertave: OF-2024-007
+_LEGACY_OFFER_RE = re.compile(r'^OF-\d+-(\d+)$', re.IGNORECASE)
+SUFFIX_LENGTH = 20
+
+
+def seq_columns(number):
+    """Kthen (seq_no, seq_suffix); (None, '') nëse numri nuk ka format të njohur"""
+    number = number or ""
+    match = _NUMBER_RE.search(number)
+    if match:
+        suffix = number[match.end():].strip().lstrip("/")
+        return int(match.group(1)), suffix[:SUFFIX_LENGTH]
+    legacy = _LEGACY_OFFER_RE.match(number.strip())
+    if legacy:
+        return int(legacy.group(1)), ""
+    return None, ""
+
+
+def doc_year(value):
+    """Viti i datës së dokumentit (date ose 'YYYY-MM-DD')"""
+    if not value:
+        return None
+    if hasattr(value, 'year'):
+        return value.year
+    try:
+        return int(str(value)[:4])
+    except ValueError:
+        return None
@@ -419,7 +419,14 @@ class InvoiceFormView(ctk.CTkFrame):
         target_btn.configure(text="Duke u ruajtur...", state="disabled"); self.update_idletasks()
         
         invoice.status = 'sent'
-        if invoice.save():
+        try:
+            saved = invoice.save()
+        except Exception as e:
+            # P.sh. numri është zënë ndërkohë nga një pajisje tjetër (DuplicateNumberError)
+            target_btn.configure(text=original_text, state="normal")
+            messagebox.showerror("Gabim", str(e))
+            return
+        if saved:
             self.invoice_id = invoice.id
             try:
                 generator = PDFGenerator(); output_path = generator.generate(invoice)
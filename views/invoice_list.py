@@ -4,6 +4,7 @@ from datetime import datetime, date
 from tkinter import messagebox
 from models.database import Database
 from models.invoice import Invoice
+from models.monthly_rollup import MonthlyRollup
 from services.pdf_generator import PDFGenerator
 from services.email_service import EmailService
 from views.invoice_form import InvoiceFormView
@@ -386,6 +387,9 @@ class InvoiceListView(ctk.CTkFrame):
         try:
             self.db.execute_query(query, (new_status, inv_id))
             self.db.connection.commit()
+            res = self.db.execute_query("SELECT date FROM invoices WHERE id = %s", (inv_id,))
+            if res:
+                MonthlyRollup.refresh(self.db, 'invoice', res[0]['date'])
             self.load_invoices() # Refresh
         except Exception as e:
             messagebox.showerror("Gabim", f"Ndryshimi i statusit dështoi: {e}")
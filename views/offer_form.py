@@ -550,7 +550,14 @@ class OfferFormView(ctk.CTkFrame):
         original_text = target_btn.cget("text")
         target_btn.configure(text="Duke u ruajtur...", state="disabled"); self.update_idletasks()
         
-        if offer.save():
+        try:
+            saved = offer.save()
+        except Exception as e:
+            # P.sh. numri është zënë ndërkohë nga një pajisje tjetër (DuplicateNumberError)
+            target_btn.configure(text=original_text, state="normal")
+            messagebox.showerror("Gabim", str(e))
+            return
+        if saved:
             self.offer_id = offer.id
             try:
                 if action == 'pdf':
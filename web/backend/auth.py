@@ -1,5 +1,9 @@
 """Auth utilities: JWT creation/validation and password hashing."""
+import hashlib
 import os
+import threading
+import time
+from collections import OrderedDict
 import bcrypt
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
@@ -36,6 +40,37 @@ def decode_token(token: str) -> dict | None:
         return None
 
 
+TOKEN_CACHE_SIZE = 256
+_token_lock = threading.Lock()
+_verified_tokens: OrderedDict = OrderedDict()
+
+
+def verify_token_cached(token: str) -> dict | None:
+    """
+    Si decode_token, por token-at e verifikuar së fundmi mbahen në një LRU (çelësi: sha256 i token-it)
+    deri në `exp` të tyre, kështu kërkesat e njëpasnjëshme nuk e rillogaritin HMAC-in dhe JSON-in.
+    Token-at e pavlefshëm nuk ruhen.
+    """
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    now = time.time()
+    with _token_lock:
+        entry = _verified_tokens.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                _verified_tokens.move_to_end(key)
+                return entry[1]
+            del _verified_tokens[key]
+    payload = decode_token(token)
+    if payload is None or "exp" not in payload:
+        return payload
+    with _token_lock:
+        _verified_tokens[key] = (float(payload["exp"]), payload)
+        _verified_tokens.move_to_end(key)
+        while len(_verified_tokens) > TOKEN_CACHE_SIZE:
+            _verified_tokens.popitem(last=False)
+    return payload
+
+
 def get_username_from_token(credentials) -> str | None:
     if not credentials or credentials.credentials is None:
         return None
@@ -0,0 +1,108 @@
+"""
+Benchmark i listës së faturave (GET /invoices): ORM + _serialize_invoice + json kundrejt
+rreshtave Core + fast_json. Përdor një databazë SQLite të përkohshme me të dhëna sintetike,
+kështu nuk prek databazën e konfiguruar.
+
+    python bench_invoices.py [numri_i_faturave] [artikuj_për_faturë]
+"""
+import os
+import sys
+import tempfile
+import time
+
+_db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+_db_file.close()
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_file.name}"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from fastapi.responses import JSONResponse
+from sqlalchemy import insert, select
+from sqlalchemy.orm import selectinload
+
+import database
+import fast_json
+import main
+import models
+
+INCLUDE = {"client", "items"}
+ROUNDS = 5
+
+
+def seed(invoice_count: int, items_per_invoice: int):
+    models.Base.metadata.create_all(bind=database.engine)
+    now = datetime(2026, 1, 1, 12, 0, 0)
+    with database.engine.begin() as conn:
+        conn.execute(insert(models.Client), [
+            {"id": i + 1, "name": f"Klienti {i + 1}", "email": f"k{i + 1}@example.com",
+             "address": "Rr. Nënë Tereza 1", "created_at": now, "updated_at": now}
+            for i in range(50)
+        ])
+        conn.execute(insert(models.Invoice), [
+            {"id": i + 1, "invoice_number": f"FATURA NR.{i + 1}", "date": date(2025, 1, 1) + timedelta(days=i % 365),
+             "client_id": i % 50 + 1, "subtotal": Decimal("1000.00"), "vat_percentage": Decimal("18.00"),
+             "vat_amount": Decimal("180.00"), "total": Decimal("1180.00"), "status": "paid",
+             "created_at": now, "updated_at": now}
+            for i in range(invoice_count)
+        ])
+        if items_per_invoice:
+            conn.execute(insert(models.InvoiceItem), [
+                {"invoice_id": i + 1, "description": f"Artikulli {j + 1}", "quantity": Decimal("2.00"),
+                 "unit_price": Decimal("100.00"), "subtotal": Decimal("200.00"), "order_index": j}
+                for i in range(invoice_count) for j in range(items_per_invoice)
+            ])
+
+
+def orm_path(db) -> bytes:
+    """Rruga e mëparshme: objekte ORM me selectinload, dict-e me float()/str(), json."""
+    invoices = db.scalars(
+        select(models.Invoice)
+        .options(selectinload(models.Invoice.client), selectinload(models.Invoice.items))
+        .order_by(models.Invoice.date.desc(), models.Invoice.id.desc())
+    ).all()
+    content = [main._serialize_invoice(inv, INCLUDE) for inv in invoices]
+    return JSONResponse(content=content).body
+
+
+def core_path(db) -> bytes:
+    """Rruga e re: tuple Core, artikujt me IN në grupe, fast_json."""
+    rows = db.execute(
+        main._invoice_rows_stmt(INCLUDE).order_by(models.Invoice.date.desc(), models.Invoice.id.desc())
+    ).all()
+    item_rows = []
+    for batch in main._invoice_id_batches(rows):
+        item_rows += db.execute(main._invoice_items_stmt(batch)).all()
+    return fast_json.FastJSONResponse(content=main._invoice_row_dicts(rows, item_rows, INCLUDE)).body
+
+
+def measure(fn, invoice_count: int) -> tuple:
+    """(ms për 1000 fatura – më e mira nga ROUNDS përsëritje, sesion i ri çdo herë; madhësia e trupit)."""
+    best = None
+    for _ in range(ROUNDS):
+        db = database.SessionLocal()
+        try:
+            started = time.perf_counter()
+            body = fn(db)
+            elapsed = time.perf_counter() - started
+        finally:
+            db.close()
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000 * 1000 / invoice_count, len(body)
+
+
+if __name__ == "__main__":
+    invoice_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    items_per_invoice = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    try:
+        seed(invoice_count, items_per_invoice)
+        print(f"{invoice_count} fatura x {items_per_invoice} artikuj, json: {'orjson' if fast_json.orjson else 'stdlib'}")
+        orm_ms, orm_size = measure(orm_path, invoice_count)
+        core_ms, core_size = measure(core_path, invoice_count)
+        print(f"ORM + _serialize_invoice : {orm_ms:8.1f} ms / 1000 fatura ({orm_size} bytes)")
+        print(f"Core + fast_json         : {core_ms:8.1f} ms / 1000 fatura ({core_size} bytes)")
+        print(f"Përshpejtimi             : {orm_ms / core_ms:8.1f}x")
+    finally:
+        database.engine.dispose()
+        os.remove(_db_file.name)
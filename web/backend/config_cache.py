@@ -0,0 +1,143 @@
+"""Konfigurimi i aplikacionit në memorie: rreshti i kompanisë dhe cilësimet (settings).
+
+PDF-të, email-et dhe ikonat lexojnë kompaninë në çdo kërkesë; këtu ngarkohet njëherë
+(kompania + të gjitha cilësimet në një query) dhe mbahet për proces.
+- Shkrimet nga ky proces e invalidojnë menjëherë (listener after_commit mbi sesionin).
+- Proceset e tjera (ose desktop-i) vërehen nga vula e versionit (count + max(id) +
+  max(updated_at) e të dy tabelave), e cila rikontrollohet më së shumti çdo STAMP_INTERVAL sekonda.
+"""
+import threading
+import time
+from dataclasses import dataclass, fields
+
+from sqlalchemy import event, literal, null, select, union_all
+
+import http_cache
+import models
+
+STAMP_INTERVAL = 5.0
+_PENDING_KEY = "config_cache_pending"
+_WATCHED = (models.Company, models.Setting)
+
+
+@dataclass(frozen=True)
+class CompanyConfig:
+    """Kopje vetëm-për-lexim e rreshtit të kompanisë (atributet si te models.Company)."""
+    id: int
+    name: str | None
+    address: str | None
+    phone: str | None
+    email: str | None
+    unique_number: str | None
+    fiscal_number: str | None
+    account_nib: str | None
+    logo_path: str | None
+    logo_light_path: str | None
+    logo_dark_path: str | None
+    smtp_server: str | None
+    smtp_port: int | None
+    smtp_user: str | None
+    smtp_password: str | None
+
+
+_COMPANY_FIELDS = [f.name for f in fields(CompanyConfig)]
+
+
+@dataclass(frozen=True)
+class AppConfig:
+    company: CompanyConfig | None
+    settings: dict
+    stamp: tuple
+
+    def setting(self, key: str, default: str = "") -> str:
+        value = self.settings.get(key)
+        return value if value is not None else default
+
+    def flag(self, key: str, default: bool) -> bool:
+        """Cilësimet 'true'/'false'; mungesa e rreshtit kthen `default`."""
+        value = self.settings.get(key)
+        return default if value is None else value == "true"
+
+
+_lock = threading.Lock()
+_state = {"config": None, "checked_at": 0.0, "generation": 0}
+
+
+def _stamp(db) -> tuple:
+    columns = http_cache.table_stamp(models.Company) + http_cache.table_stamp(models.Setting)
+    return tuple(db.execute(select(*columns)).one())
+
+
+def _load(db, stamp: tuple) -> AppConfig:
+    """Kompania (rreshti i parë) dhe cilësimet me një UNION ALL."""
+    company_cols = [getattr(models.Company, name) for name in _COMPANY_FIELDS]
+    first_company = select(models.Company.id).order_by(models.Company.id).limit(1).scalar_subquery()
+    company_rows = select(
+        literal("company").label("kind"), null().label("setting_key"), null().label("setting_value"), *company_cols
+    ).where(models.Company.id == first_company)
+    setting_rows = select(
+        literal("setting"), models.Setting.setting_key, models.Setting.setting_value,
+        *[null() for _ in company_cols]
+    )
+    company = None
+    settings = {}
+    for row in db.execute(union_all(company_rows, setting_rows)):
+        if row[0] == "company":
+            company = CompanyConfig(**dict(zip(_COMPANY_FIELDS, row[3:])))
+        else:
+            settings[row[1]] = row[2]
+    return AppConfig(company=company, settings=settings, stamp=stamp)
+
+
+def get(db) -> AppConfig:
+    """Konfigurimi aktual; brenda STAMP_INTERVAL nuk bën asnjë query."""
+    now = time.monotonic()
+    with _lock:
+        config = _state["config"]
+        if config is not None and now - _state["checked_at"] < STAMP_INTERVAL:
+            return config
+        generation = _state["generation"]
+    stamp = _stamp(db)
+    if config is None or config.stamp != stamp:
+        config = _load(db, stamp)
+    with _lock:
+        # Mos ruaj gjendje të lexuar para një invalidate-i që ndodhi ndërkohë
+        if generation == _state["generation"]:
+            _state["config"] = config
+            _state["checked_at"] = now
+    return config
+
+
+def company(db) -> CompanyConfig | None:
+    return get(db).company
+
+
+def invalidate(*_args):
+    with _lock:
+        _state["generation"] += 1
+        _state["config"] = None
+
+
+def _after_flush(session, flush_context):
+    if session.info.get(_PENDING_KEY):
+        return
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, _WATCHED):
+            session.info[_PENDING_KEY] = True
+            return
+
+
+def _after_commit(session):
+    if session.info.pop(_PENDING_KEY, None):
+        invalidate()
+
+
+def _after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def install(session_factory):
+    """Shkrimet e kompanisë/cilësimeve (PUT /company, logot, /settings/*) invalidojnë cache-in pas commit-it."""
+    for name, fn in (("after_flush", _after_flush), ("after_commit", _after_commit), ("after_rollback", _after_rollback)):
+        if not event.contains(session_factory, name, fn):
+            event.listen(session_factory, name, fn)
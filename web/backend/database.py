@@ -66,3 +66,48 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# --- ASYNC (endpoint-et e leximit) ---
+# Një kërkesë që pret TiDB-në (p.sh. zgjimi i Serverless) nuk zë thread nga pool-i i AnyIO:
+# aiomysql për MySQL/TiDB, aiosqlite për SQLite (teste/zhvillim lokal)
+_ASYNC_DRIVERS = {
+    "mysql+pymysql://": "mysql+aiomysql://",
+    "sqlite://": "sqlite+aiosqlite://",
+}
+
+def _async_database_url(url: str) -> str:
+    """E njëjta databazë me driver-in async përkatës (ASYNC_DATABASE_URL e mbishkruan)."""
+    override = os.getenv("ASYNC_DATABASE_URL")
+    if override:
+        return override
+    for sync_prefix, async_prefix in _ASYNC_DRIVERS.items():
+        if url.startswith(sync_prefix):
+            return async_prefix + url[len(sync_prefix):]
+    return url
+
+ASYNC_DATABASE_URL = _async_database_url(DATABASE_URL)
+
+try:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        connect_args=_connect_args if _connect_args else {},
+        pool_pre_ping=True,
+        pool_recycle=300,
+    )
+    # expire_on_commit=False: objektet serializohen pas kthimit nga endpoint-i, pa lazy-load
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+except ImportError:
+    # Driver-i async (aiomysql/aiosqlite) ose greenlet mungon: skriptet që importojnë
+    # vetëm engine-in sync (update_db.py, desktop-i) vazhdojnë të punojnë
+    async_engine = None
+    AsyncSessionLocal = None
+
+async def get_async_db():
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async database driver missing: pip install aiomysql greenlet")
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,213 @@
+"""Radha e email-eve (email_outbox): dërgimi bëhet në sfond, jo brenda kërkesës HTTP.
+
+POST /invoices/{id}/email, /offers/{id}/email dhe /email-outbox vetëm shtojnë një rresht
+në tabelë dhe zgjojnë dërguesin. Dërguesi (një thread në çdo proces) merr mesazhet e
+radhës, renderon PDF-në (nga cache-i kur ekziston) dhe i dërgon përmes një SMTPPool.
+- Gabimet e përkohshme riprovohen me vonesë eksponenciale (RETRY_BASE · 2^n, deri në RETRY_MAX),
+  më së shumti MAX_ATTEMPTS herë; pastaj mesazhi mbetet 'failed' dhe mund të riprovohet me dorë.
+- Mesazhi merret me UPDATE të kushtëzuar, kështu disa instanca të API-së nuk e dërgojnë dy herë.
+- Mesazhet 'sending' të mbetura nga një proces që ra (më të vjetra se STALE_AFTER) rikthehen në
+  radhë nga dërguesi në çdo cikël, jo vetëm në startup; edhe retry me dorë i pranon.
+"""
+import logging
+import os
+import smtplib
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+import config_cache
+import database
+import models
+import render_queue
+from services.email_service import SMTPPool, WebEmailService
+
+POLL_INTERVAL = float(os.getenv("EMAIL_OUTBOX_POLL", "15"))
+RETRY_BASE = timedelta(seconds=30)
+RETRY_MAX = timedelta(hours=1)
+MAX_ATTEMPTS = 6
+BATCH_SIZE = 20
+STALE_AFTER = timedelta(minutes=10)
+DOCUMENTS = ("invoice", "offer")
+
+_lock = threading.Lock()
+_wake = threading.Event()
+_stop = threading.Event()
+_thread = None
+
+
+def enqueue(db, doc_type: str, doc_id: int, dest_email: str) -> models.OutboxEmail:
+    """Shton email-in në radhë, bën commit dhe zgjon dërguesin."""
+    message = models.OutboxEmail(
+        doc_type=doc_type, doc_id=doc_id, dest_email=dest_email,
+        status="queued", attempts=0, next_attempt_at=datetime.now(),
+    )
+    db.add(message)
+    db.commit()
+    db.refresh(message)
+    _wake.set()
+    return message
+
+
+def is_stale(message: models.OutboxEmail) -> bool:
+    """'sending' prej më shumë se STALE_AFTER: procesi që e mori ka rënë."""
+    return (
+        message.status == "sending"
+        and (message.started_at is None or message.started_at < datetime.now() - STALE_AFTER)
+    )
+
+
+def retry(db, message: models.OutboxEmail) -> models.OutboxEmail:
+    """Rikthen në radhë një mesazh 'failed' ose 'sending' të mbetur (ose përshpejton një 'queued')."""
+    if message.status in ("failed", "queued") or is_stale(message):
+        message.status = "queued"
+        message.attempts = 0
+        message.next_attempt_at = datetime.now()
+        db.commit()
+        db.refresh(message)
+        _wake.set()
+    return message
+
+
+def _backoff(attempts: int) -> timedelta:
+    return min(RETRY_BASE * (2 ** max(attempts - 1, 0)), RETRY_MAX)
+
+
+def _permanent(error: Exception) -> bool:
+    """Gabime që nuk rregullohen duke pritur: dokumenti mungon, marrësi refuzohet (5xx)."""
+    if isinstance(error, LookupError):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        # 4xx (p.sh. greylisting) riprovohet
+        return all(500 <= code < 600 for code, _ in error.recipients.values())
+    return (
+        isinstance(error, smtplib.SMTPResponseException)
+        and not isinstance(error, smtplib.SMTPAuthenticationError)
+        and 500 <= error.smtp_code < 600
+    )
+
+
+def _deliver(db, pool, company, message_id: int):
+    outbox = models.OutboxEmail
+    claimed = db.query(outbox).filter(
+        outbox.id == message_id, outbox.status == "queued"
+    ).update({"status": "sending", "started_at": datetime.now()}, synchronize_session=False)
+    db.commit()
+    if not claimed:
+        return
+    message = db.get(outbox, message_id)
+    try:
+        doc = db.get(render_queue.DOCUMENTS[message.doc_type], message.doc_id)
+        if doc is None:
+            raise LookupError(f"{message.doc_type} {message.doc_id} nuk ekziston më")
+        filename, pdf_path = render_queue.render_attachment(db, message.doc_type, doc)
+        WebEmailService.send_with_pool(
+            pool, doc, company, message.dest_email, pdf_path,
+            is_offer=message.doc_type == "offer", filename=filename,
+        )
+    except Exception as e:
+        db.rollback()
+        message.attempts += 1
+        message.error = str(e)[:1000] or type(e).__name__
+        if _permanent(e) or message.attempts >= MAX_ATTEMPTS:
+            message.status = "failed"
+            message.next_attempt_at = None
+        else:
+            message.status = "queued"
+            message.next_attempt_at = datetime.now() + _backoff(message.attempts)
+        logging.warning(f"Email {message_id} to {message.dest_email} failed ({message.attempts}): {e}")
+    else:
+        message.attempts += 1
+        message.status = "sent"
+        message.error = None
+        message.sent_at = datetime.now()
+        message.next_attempt_at = None
+    db.commit()
+
+
+def deliver_due(limit: int = BATCH_SIZE) -> int:
+    """Dërgon mesazhet që u ka ardhur radha; kthen sa u morën (0 = radha bosh ose SMTP pa konfigurim)."""
+    outbox = models.OutboxEmail
+    db = database.SessionLocal()
+    try:
+        reclaim_stale(db)
+        company = config_cache.company(db)
+        if not company or not company.smtp_user or not company.smtp_password:
+            return 0
+        ids = [row.id for row in db.query(outbox.id).filter(
+            outbox.status == "queued", outbox.next_attempt_at <= datetime.now()
+        ).order_by(outbox.next_attempt_at, outbox.id).limit(limit)]
+        if ids:
+            # Një lidhje SMTP (handshake + login) për gjithë grupin
+            with SMTPPool(company, size=1) as pool:
+                for message_id in ids:
+                    if _stop.is_set():
+                        break
+                    _deliver(db, pool, company, message_id)
+        return len(ids)
+    finally:
+        db.close()
+
+
+def _idle_timeout() -> float:
+    """Sa të presë dërguesi: deri te ripërpjekja e radhës, por jo më shumë se POLL_INTERVAL."""
+    outbox = models.OutboxEmail
+    db = database.SessionLocal()
+    try:
+        next_at = db.query(func.min(outbox.next_attempt_at)).filter(outbox.status == "queued").scalar()
+    finally:
+        db.close()
+    remaining = (next_at - datetime.now()).total_seconds() if next_at is not None else 0
+    # Mesazhe të radhës që nuk u dërguan (p.sh. SMTP pa konfigurim): mos e rrotullo ciklin
+    return min(remaining, POLL_INTERVAL) if remaining > 0 else POLL_INTERVAL
+
+
+def _run():
+    while not _stop.is_set():
+        try:
+            busy = deliver_due()
+            timeout = 0 if busy else _idle_timeout()
+        except Exception as e:
+            timeout = POLL_INTERVAL
+            logging.warning(f"Email outbox run failed: {e}")
+        if timeout:
+            _wake.wait(timeout)
+            _wake.clear()
+
+
+def start():
+    """Nis dërguesin në sfond (një herë për proces)."""
+    global _thread
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _stop.clear()
+        _thread = threading.Thread(target=_run, name="email-outbox", daemon=True)
+        _thread.start()
+
+
+def shutdown():
+    _stop.set()
+    _wake.set()
+
+
+def reclaim_stale(db) -> int:
+    """Mesazhet 'sending' të një procesi që ra rikthehen në radhë (thirret në çdo cikël të dërguesit)."""
+    outbox = models.OutboxEmail
+    reclaimed = db.query(outbox).filter(
+        outbox.status == "sending",
+        (outbox.started_at.is_(None)) | (outbox.started_at < datetime.now() - STALE_AFTER),
+    ).update({"status": "queued", "next_attempt_at": datetime.now()}, synchronize_session=False)
+    db.commit()
+    if reclaimed:
+        logging.warning(f"Email outbox: {reclaimed} stale 'sending' message(s) requeued")
+    return reclaimed
+
+
+def prune(db, days: int = 30) -> int:
+    """Fshin mesazhet e dërguara më të vjetra se `days` ditë."""
+    outbox = models.OutboxEmail
+    return db.query(outbox).filter(
+        outbox.status == "sent", outbox.sent_at < datetime.now() - timedelta(days=days)
+    ).delete(synchronize_session=False)
@@ -0,0 +1,42 @@
+"""Serializimi JSON i përgjigjeve të mëdha (p.sh. lista e faturave) pa konvertime manuale.
+
+Me orjson (nëse është instaluar) date/datetime shkruhen drejtpërdrejt në ISO 8601 dhe
+Decimal kalon te `_default` si float; pa orjson përdoret json i standardit me të njëjtin rezultat.
+"""
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def _default_std(value):
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    return _default(value)
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, default=_default_std, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """Si JSONResponse, por `content` mund të mbajë Decimal, date dhe datetime."""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
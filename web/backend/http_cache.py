@@ -0,0 +1,59 @@
+"""Conditional GET: validator i lirë për koleksione (count + max(id) + max(updated_at)) dhe 304.
+
+`updated_at` ka rezolucion një sekondë: dy ndryshime brenda së njëjtës sekondë do jepnin të njëjtin
+ETag. Për tabelat që shkojnë te change_log shtohet edhe max(change_log.id), që rritet me çdo commit.
+"""
+import hashlib
+
+from fastapi import Response
+from sqlalchemy import func, select
+
+import models
+import sync_log
+
+# Shfletuesi e ruan përgjigjen, por e rivërteton çdo herë me If-None-Match
+CACHE_CONTROL = "private, no-cache"
+
+
+def stamp_columns(model) -> list:
+    """Agregatet që ndryshojnë me çdo insert/update/delete të tabelës."""
+    columns = [func.count(model.id), func.max(model.id)]
+    if hasattr(model, "updated_at"):
+        columns.append(func.max(model.updated_at))
+    if model in sync_log.TRACKED or model in sync_log.CHILDREN:
+        columns.append(select(func.max(models.ChangeLog.id)).correlate(None).scalar_subquery())
+    return columns
+
+
+def table_stamp(model) -> list:
+    """Si `stamp_columns`, por si scalar subqueries (për tabela të lidhura pa filtra)."""
+    return [select(col).correlate(None).scalar_subquery() for col in stamp_columns(model)]
+
+
+def compute_etag(scope: str, values) -> str:
+    raw = scope + "|" + "|".join(str(v) for v in values)
+    return 'W/"' + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:24] + '"'
+
+
+def _strip_weak(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    wanted = _strip_weak(etag)
+    return any(_strip_weak(tag) == wanted for tag in if_none_match.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def apply_headers(response: Response, etag: str) -> Response:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
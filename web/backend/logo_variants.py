@@ -0,0 +1,153 @@
+"""Ikonat e aplikacionit (PWA, iOS, login dark) të llogaritura një herë nga logot e kompanisë.
+
+Logoja e ngarkuar normalizohet (orientimi EXIF, PNG, më së shumti MAX_SOURCE_SIDE px) dhe
+prej saj nxirren variantet: 192/512 me sfond transparent, 180 me sfond të bardhë (apple-touch-icon)
+dhe 512 dark. Çdo variant ruhet te uploads/icons/{emri}-{çelësi}.png, ku çelësi është hash-i i
+logos burim + parametrave të variantit: i njëjti burim jep gjithmonë të njëjtin skedar, prandaj
+çelësi shërben si ETag i fortë dhe si `v` në URL-të e manifest-it.
+Nëse logoja ndryshon jashtë endpoint-eve të ngarkimit (p.sh. nga desktop-i), varianti i ri
+llogaritet në kërkesën e parë që e vëren ndryshimin (mtime/madhësia e skedarit burim).
+"""
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+from io import BytesIO
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ICONS_DIR = os.path.join(BASE_DIR, "uploads", "icons")
+DEFAULT_ICON = os.path.join(os.path.dirname(BASE_DIR), "app", "public", "icon-512.png")
+MAX_SOURCE_SIDE = 1024
+RENDER_VERSION = "1"
+
+# emri -> (kolonat burim sipas prioritetit, madhësia, sfondi, a lejohet ikona default)
+VARIANTS = {
+    "icon-192": (("logo_light_path", "logo_path"), 192, "transparent", True),
+    "icon-512": (("logo_light_path", "logo_path"), 512, "transparent", True),
+    "apple-180": (("logo_path",), 180, "white", True),
+    "dark-512": (("logo_dark_path", "logo_path"), 512, "transparent", False),
+}
+
+
+@dataclass(frozen=True)
+class Variant:
+    path: str
+    key: str
+    source: tuple  # (rruga, mtime_ns, madhësia) e burimit kur u llogarit
+
+
+_lock = threading.Lock()
+_index: dict = {}
+
+
+def normalize_upload(data: bytes) -> bytes:
+    """Logoja e ngarkuar si PNG: e rrotulluar sipas EXIF dhe e zvogëluar në MAX_SOURCE_SIDE."""
+    from PIL import Image as PILImage, ImageOps
+
+    img = ImageOps.exif_transpose(PILImage.open(BytesIO(data)))
+    img = img.convert("RGBA")
+    img.thumbnail((MAX_SOURCE_SIDE, MAX_SOURCE_SIDE), PILImage.Resampling.LANCZOS)
+    buf = BytesIO()
+    img.save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+
+def render(source_path: str, size: int, background: str = "transparent") -> bytes:
+    """
+    transparent: pikselët pothuajse të bardhë (R,G,B > 240) bëhen transparentë, logoja në qendër.
+    white: sfond i bardhë me 10% hapësirë anash (iOS nuk pranon transparencë).
+    """
+    from PIL import Image as PILImage
+
+    img = PILImage.open(source_path).convert("RGBA")
+    if background == "white":
+        canvas = PILImage.new("RGB", (size, size), (255, 255, 255))
+        max_side = int(size * 0.8)
+        img.thumbnail((max_side, max_side), PILImage.Resampling.LANCZOS)
+    else:
+        import numpy as np
+
+        arr = np.array(img, dtype=np.uint8)
+        white = (arr[:, :, 0] > 240) & (arr[:, :, 1] > 240) & (arr[:, :, 2] > 240)
+        arr[white, 3] = 0
+        img = PILImage.fromarray(arr, "RGBA")
+        canvas = PILImage.new("RGBA", (size, size), (0, 0, 0, 0))
+        img.thumbnail((size, size), PILImage.Resampling.LANCZOS)
+    canvas.paste(img, ((size - img.width) // 2, (size - img.height) // 2), img)
+
+    buf = BytesIO()
+    canvas.save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+
+def source_path(company, name: str):
+    """Skedari burim i variantit: kolona e parë që ekziston në disk, ose ikona default."""
+    attrs, _, _, allow_default = VARIANTS[name]
+    for attr in attrs:
+        value = getattr(company, attr, None) if company else None
+        if value:
+            full_path = os.path.join(BASE_DIR, value.replace("\\", "/").lstrip("/"))
+            if os.path.exists(full_path):
+                return full_path
+    if allow_default and os.path.exists(DEFAULT_ICON):
+        return DEFAULT_ICON
+    return None
+
+
+def _source_key(source: str, name: str) -> str:
+    _, size, background, _ = VARIANTS[name]
+    digest = hashlib.sha256(f"{RENDER_VERSION}|{size}|{background}|".encode("utf-8"))
+    with open(source, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+
+def _prune(name: str, keep: str):
+    prefix = f"{name}-"
+    for entry in os.scandir(ICONS_DIR):
+        if entry.name.startswith(prefix) and entry.path != keep:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def get(company, name: str):
+    """Varianti aktual (Variant) ose None kur nuk ka burim; renderon vetëm kur burimi ndryshon."""
+    source = source_path(company, name)
+    if source is None:
+        return None
+    stat = os.stat(source)
+    ident = (source, stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        cached = _index.get(name)
+    if cached is not None and cached.source == ident and os.path.exists(cached.path):
+        return cached
+
+    key = _source_key(source, name)
+    path = os.path.join(ICONS_DIR, f"{name}-{key}.png")
+    if not os.path.exists(path):
+        _, size, background, _ = VARIANTS[name]
+        data = render(source, size, background)
+        os.makedirs(ICONS_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        _prune(name, path)
+    variant = Variant(path=path, key=key, source=ident)
+    with _lock:
+        _index[name] = variant
+    return variant
+
+
+def generate_all(company, names=None):
+    """Pas ngarkimit të një logoje: llogarit menjëherë variantet që varen prej saj."""
+    for name in names or VARIANTS:
+        get(company, name)
+
+
+def names_for(attr: str) -> list:
+    """Variantet që përdorin kolonën `attr` (logo_path, logo_light_path, logo_dark_path)."""
+    return [name for name, (attrs, _, _, _) in VARIANTS.items() if attr in attrs]
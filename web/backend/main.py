@@ -1,49 +1,32 @@
 from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Query, Body, Header
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from starlette.requests import Request
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, extract, or_, cast, Integer, text
+from sqlalchemy.orm import Session, joinedload, selectinload, noload, defer
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import func, extract, and_, or_, case, literal, null, select, union_all, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import ValidationError
 from typing import List, Optional
 from datetime import date
+from collections import defaultdict
+from itertools import islice
 import json
-import models, schemas, database, os
+import re
+import models, schemas, database, fast_json, metrics, profiler, pagination, http_cache, sync_log, ttl_cache, rollups, sequences, search_index, config_cache, render_queue, prerender, zip_stream, email_outbox, logo_variants, os
 from services.pdf_generator import WebPDFGenerator
 from services.email_service import WebEmailService
-from auth import decode_token
+from auth import verify_token_cached
 
 # Initialize global services
 pdf_generator = WebPDFGenerator()
-email_service = WebEmailService()
 
-# Cache në memorie për logot e processuara (path -> {mtime, data})
+# Cache në memorie për logot në madhësi jo-standarde (path -> {mtime, data});
+# 192/512/180/dark llogariten një herë te logo_variants
 _logo_png_cache: dict = {}
 
-def _process_logo_transparent(logo_path: str, size: int = 512) -> bytes:
-    """Hap logo-n, heq background të bardhë me numpy (shpejt), kthen PNG bytes."""
-    from io import BytesIO
-    from PIL import Image as PILImage
-    import numpy as np
-
-    img = PILImage.open(logo_path).convert('RGBA')
-    arr = np.array(img, dtype=np.uint8)
-    # Pixel me R,G,B > 240 → transparent (alpha = 0)
-    white = (arr[:, :, 0] > 240) & (arr[:, :, 1] > 240) & (arr[:, :, 2] > 240)
-    arr[white, 3] = 0
-    img = PILImage.fromarray(arr, 'RGBA')
-
-    canvas = PILImage.new('RGBA', (size, size), (0, 0, 0, 0))
-    img.thumbnail((size, size), PILImage.Resampling.LANCZOS)
-    x = (size - img.width) // 2
-    y = (size - img.height) // 2
-    canvas.paste(img, (x, y), img)
-
-    buf = BytesIO()
-    canvas.save(buf, format='PNG', optimize=True)
-    return buf.getvalue()
-
 def _get_logo_bytes(logo_path: str, size: int = 512) -> bytes:
     """Kthen logo bytes me cache - ri-processon vetëm nëse ndryshon file-i."""
     mtime = os.path.getmtime(logo_path)
@@ -51,7 +34,7 @@ def _get_logo_bytes(logo_path: str, size: int = 512) -> bytes:
     cached = _logo_png_cache.get(key)
     if cached and cached['mtime'] == mtime:
         return cached['data']
-    data = _process_logo_transparent(logo_path, size)
+    data = logo_variants.render(logo_path, size)
     _logo_png_cache[key] = {'mtime': mtime, 'data': data}
     return data
 
@@ -60,6 +43,7 @@ AUTH_SKIP_PATHS = {
     "/", "/health", "/auth/login", "/auth/refresh",
     "/docs", "/redoc", "/openapi.json",
     "/logo.png", "/logo-dark.png", "/apple-touch-icon.png", "/manifest.webmanifest",
+    "/metrics",  # autorizohet te endpoint-i (METRICS_TOKEN ose token përdoruesi)
 }
 
 def _is_public_path(path: str) -> bool:
@@ -72,23 +56,49 @@ def _is_public_path(path: str) -> bool:
         return True
     return False
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        if request.method == "OPTIONS":
-            return await call_next(request)
-        path = request.scope.get("path", "")
-        if _is_public_path(path):
-            return await call_next(request)
-        auth_header = request.headers.get("Authorization")
+class AuthMiddleware:
+    """
+    Middleware ASGI i pastër: kërkesat e autentikuara i kalojnë aplikacionit pa asnjë mbështjellje,
+    kështu përgjigjet në rrjedhë (PDF, eksportet) nuk kalojnë nëpër buffer-a të ndërmjetëm.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or _is_public_path(scope.get("path", "")):
+            await self.app(scope, receive, send)
+            return
         token = None
-        if auth_header and auth_header.startswith("Bearer "):
-            token = auth_header[7:].strip()
-        if not token or not decode_token(token):
-            return JSONResponse(content={"detail": "Not authenticated"}, status_code=401)
-        return await call_next(request)
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                auth_header = value.decode("latin-1")
+                if auth_header.startswith("Bearer "):
+                    token = auth_header[7:].strip()
+                break
+        if not token or not verify_token_cached(token):
+            response = JSONResponse(content={"detail": "Not authenticated"}, status_code=401)
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
 
 app = FastAPI(title="Holkos Fatura API")
 
+# Çdo flush i faturave/ofertave/klientëve shkruhet në change_log (delta sync)
+sync_log.install(database.SessionLocal)
+rollups.install(database.SessionLocal)
+sequences.install()
+search_index.install()
+# Kompania dhe cilësimet lexohen nga memoria; shkrimet i invalidojnë pas commit-it
+config_cache.install(database.SessionLocal)
+# PDF_PRERENDER=1: PDF-ja renderohet në sfond menjëherë pas ruajtjes së faturës/ofertës
+prerender.install(database.SessionLocal)
+# Numri dhe koha e query-ve për /metrics dhe Server-Timing
+metrics.install(database.engine, database.async_engine)
+
+# X-Profile: 1 / ?profile=1 – profilizon kërkesën (pas auth-it; kontrollon vetë token-in edhe te rrugët publike)
+app.add_middleware(profiler.ProfilerMiddleware, verify_token=verify_token_cached)
+
 # Auth middleware (last added = runs first for incoming request)
 app.add_middleware(AuthMiddleware)
 
@@ -102,6 +112,9 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Metrikat mbështjellin gjithçka (edhe 401-shat e auth-it dhe CORS-in)
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Serve uploaded assets (e.g., company logo)
 UPLOADS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
 os.makedirs(UPLOADS_DIR, exist_ok=True)
@@ -123,8 +136,43 @@ def run_db_migration():
     except Exception as e:
         import logging
         logging.warning(f"Auth credentials init skipped: {e}")
+    try:
+        pruned = sync_log.prune(db)
+        # Çelësat e batch-it mbahen aq sa mund të rilexohet një radhë offline
+        from datetime import datetime, timedelta
+        pruned += db.query(models.IdempotencyKey).filter(
+            models.IdempotencyKey.created_at < datetime.now() - timedelta(days=30)
+        ).delete(synchronize_session=False)
+        pruned += render_queue.prune(db)
+        pruned += email_outbox.prune(db)
+        if pruned:
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        import logging
+        logging.warning(f"Change log prune skipped: {e}")
+    try:
+        # Punët e renderimit që mbetën pa përfunduar para restartit
+        render_queue.resume_pending(db)
+    except Exception as e:
+        db.rollback()
+        import logging
+        logging.warning(f"Render jobs resume skipped: {e}")
     finally:
         db.close()
+    # Cikli i parë i dërguesit rikthen edhe email-et 'sending' të mbetura nga procesi që ra
+    email_outbox.start()
+
+@app.on_event("shutdown")
+def stop_render_workers():
+    prerender.shutdown()
+    render_queue.shutdown()
+    email_outbox.shutdown()
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    if database.async_engine is not None:
+        await database.async_engine.dispose()
 
 # Dependency to get DB session
 def get_db():
@@ -283,6 +331,14 @@ def refresh_token(Authorization: Optional[str] = Header(None, alias="Authorizati
 def read_root():
     return {"message": "Holkos Fatura API is running"}
 
+@app.get("/metrics")
+def get_metrics(authorization: Optional[str] = Header(None)):
+    """Metrikat e këtij procesi në formatin tekst të Prometheus."""
+    token = authorization[7:].strip() if authorization and authorization.startswith("Bearer ") else None
+    if not metrics.authorized(token, verify_token_cached):
+        return JSONResponse(content={"detail": "Not authenticated"}, status_code=401)
+    return Response(content=metrics.render_text(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/health")
 def health_check(db: Session = Depends(get_db)):
     """Verifikon që API dhe databaza funksionojnë."""
@@ -298,7 +354,7 @@ def health_check(db: Session = Depends(get_db)):
 @app.get("/email/status")
 def email_status(db: Session = Depends(get_db)):
     """Kontrollon konfigurimin e email-it për diagnostikim."""
-    db_company = db.query(models.Company).first()
+    db_company = config_cache.company(db)
     smtp_ok = bool(db_company and db_company.smtp_user and db_company.smtp_password)
     return {
         "smtp_configured": smtp_ok,
@@ -307,129 +363,341 @@ def email_status(db: Session = Depends(get_db)):
     }
 
 # --- INVOICES ---
+def _iso(value):
+    """datetime → ISO 8601 (si Pydantic dhe fast_json), që PWA të marrë një format nga çdo endpoint."""
+    return value.isoformat() if value is not None else None
+
+def _serialize_client(client) -> dict:
+    return {
+        "id": client.id,
+        "name": client.name,
+        "address": client.address or "",
+        "unique_number": client.unique_number or "",
+        "phone": client.phone or "",
+        "email": client.email or "",
+        "created_at": _iso(client.created_at),
+        "updated_at": _iso(client.updated_at)
+    }
+
+def _serialize_invoice(inv, include: set) -> dict:
+    invoice_dict = {
+        "id": inv.id,
+        "invoice_number": inv.invoice_number,
+        "date": str(inv.date),
+        "payment_due_date": str(inv.payment_due_date) if inv.payment_due_date else None,
+        "client_id": inv.client_id,
+        "template_id": inv.template_id,
+        "subtotal": float(inv.subtotal),
+        "vat_percentage": float(inv.vat_percentage),
+        "vat_amount": float(inv.vat_amount),
+        "total": float(inv.total),
+        "status": inv.status,
+        "pdf_path": inv.pdf_path,
+        "created_at": _iso(inv.created_at),
+        "updated_at": _iso(inv.updated_at),
+    }
+    if "client" in include:
+        invoice_dict["client"] = _serialize_client(inv.client) if inv.client else None
+    if "items" in include:
+        invoice_dict["items"] = [{
+            "id": item.id,
+            "invoice_id": item.invoice_id,
+            "description": item.description,
+            "quantity": float(item.quantity),
+            "unit_price": float(item.unit_price),
+            "subtotal": float(item.subtotal),
+            "order_index": item.order_index or 0
+        } for item in inv.items]
+    return invoice_dict
+
+# --- LEXIMI I LISTËS SË FATURAVE ME CORE (pa identity map, pa relacione) ---
+# Rreshtat mbeten tuple; Decimal/date serializohen nga fast_json, jo me float()/str() për çdo fushë
+_INVOICE_FIELDS = (
+    "id", "invoice_number", "date", "payment_due_date", "client_id", "template_id", "subtotal",
+    "vat_percentage", "vat_amount", "total", "status", "pdf_path", "created_at", "updated_at",
+)
+_INVOICE_CLIENT_FIELDS = ("id", "name", "address", "unique_number", "phone", "email", "created_at", "updated_at")
+_INVOICE_CLIENT_TEXT = {"address", "unique_number", "phone", "email"}  # None → "" si te _serialize_client
+_INVOICE_ITEM_FIELDS = ("id", "invoice_id", "description", "quantity", "unit_price", "subtotal", "order_index")
+_ITEMS_BATCH = 500
+
+def _invoice_rows_stmt(include: set):
+    """select() i kolonave të faturës (+ klienti me LEFT JOIN) – filtrat/renditja si te ORM."""
+    columns = [getattr(models.Invoice, name) for name in _INVOICE_FIELDS]
+    if "client" not in include:
+        return select(*columns)
+    columns += [getattr(models.Client, name).label(f"client_{name}") for name in _INVOICE_CLIENT_FIELDS]
+    return select(*columns).outerjoin(models.Client, models.Client.id == models.Invoice.client_id)
+
+def _invoice_items_stmt(invoice_ids: list):
+    item = models.InvoiceItem
+    return select(*[getattr(item, name) for name in _INVOICE_ITEM_FIELDS]).filter(
+        item.invoice_id.in_(invoice_ids)
+    ).order_by(item.invoice_id, item.order_index, item.id)
+
+def _invoice_row_dicts(rows, item_rows, include: set) -> list:
+    """Rreshtat Core → dict-et e përgjigjes (të njëjtat fusha si _serialize_invoice)."""
+    by_invoice = defaultdict(list)
+    for item in item_rows:
+        entry = dict(zip(_INVOICE_ITEM_FIELDS, item))
+        entry["order_index"] = entry["order_index"] or 0
+        by_invoice[entry["invoice_id"]].append(entry)
+    field_count = len(_INVOICE_FIELDS)
+    result = []
+    for row in rows:
+        invoice = dict(zip(_INVOICE_FIELDS, row))
+        if "client" in include:
+            client_values = row[field_count:]
+            if client_values[0] is None:
+                invoice["client"] = None
+            else:
+                client = dict(zip(_INVOICE_CLIENT_FIELDS, client_values))
+                for name in _INVOICE_CLIENT_TEXT:
+                    client[name] = client[name] or ""
+                invoice["client"] = client
+        if "items" in include:
+            invoice["items"] = by_invoice.get(invoice["id"], [])
+        result.append(invoice)
+    return result
+
+def _invoice_id_batches(rows):
+    ids = [row.id for row in rows]
+    return [ids[start:start + _ITEMS_BATCH] for start in range(0, len(ids), _ITEMS_BATCH)]
+
+def _relation_options(model, include: set) -> list:
+    """selectinload për relacionet e kërkuara, noload për të tjerat (pa N+1 gjatë serializimit)."""
+    options = []
+    for name in ("client", "items"):
+        attr = getattr(model, name)
+        options.append(selectinload(attr) if name in include else noload(attr))
+    return options
+
+def _filter_invoices(query, search=None, status=None, date_from=None, date_to=None, client_id=None):
+    if client_id:
+        query = query.filter(models.Invoice.client_id == client_id)
+    if status:
+        query = query.filter(models.Invoice.status == status)
+    if date_from:
+        query = query.filter(models.Invoice.date >= date_from)
+    if date_to:
+        query = query.filter(models.Invoice.date <= date_to)
+    if search:
+        query = query.filter(_search_filter(models.Invoice, search))
+    return query
+
+def _search_filter(model, search: str):
+    """
+    `?search=` i listave: nënvarg (ilike '%term%') mbi numrin, emrin e klientit dhe subjektin e
+    ofertës, si te aplikacioni desktop. Indeksi search_tokens (prefiks fjalësh) përdoret vetëm nga /search.
+    """
+    term = f"%{search}%"
+    clients = select(models.Client.id).where(models.Client.name.ilike(term))
+    if model is models.Invoice:
+        fields = [models.Invoice.invoice_number.ilike(term)]
+    else:
+        fields = [models.Offer.offer_number.ilike(term), models.Offer.subject.ilike(term)]
+    return or_(*fields, model.client_id.in_(clients))
+
+# --- NDJSON STREAMING (eksporte të mëdha pa i mbajtur të gjitha në memorie) ---
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+_STREAM_BATCH = 500
+
+def _wants_ndjson(accept: Optional[str]) -> bool:
+    return bool(accept) and NDJSON_MEDIA_TYPE in accept.lower()
+
+def _stream_documents(build_query, item_model, item_fk, serialize, include: set):
+    """
+    Gjenerator NDJSON: dokumentet lexohen me server-side cursor (yield_per),
+    artikujt ngarkohen për çdo grup me një lidhje të dytë (cursor-i kryesor mbetet i hapur).
+    """
+    db = database.SessionLocal()
+    items_db = database.SessionLocal() if "items" in include else None
+    try:
+        rows = iter(build_query(db).yield_per(_STREAM_BATCH))
+        while True:
+            batch = list(islice(rows, _STREAM_BATCH))
+            if not batch:
+                break
+            if items_db is not None:
+                by_parent = defaultdict(list)
+                items = items_db.query(item_model).filter(
+                    item_fk.in_([doc.id for doc in batch])
+                ).order_by(item_fk, item_model.order_index, item_model.id)
+                for item in items:
+                    by_parent[getattr(item, item_fk.key)].append(item)
+                for doc in batch:
+                    set_committed_value(doc, "items", by_parent.get(doc.id, []))
+            yield "".join(json.dumps(serialize(doc, include), ensure_ascii=False) + "\n" for doc in batch)
+    except Exception:
+        import traceback
+        traceback.print_exc()
+        raise
+    finally:
+        if items_db is not None:
+            items_db.close()
+        db.close()
+
+def _invoice_stream_response(search, status, date_from, date_to, client_id, include_set):
+    def build_query(session: Session):
+        query = session.query(models.Invoice).options(
+            joinedload(models.Invoice.client) if "client" in include_set else noload(models.Invoice.client),
+            noload(models.Invoice.items)
+        )
+        query = _filter_invoices(query, search, status, date_from, date_to, client_id)
+        return query.order_by(models.Invoice.date.desc(), models.Invoice.id.desc())
+    return StreamingResponse(
+        _stream_documents(build_query, models.InvoiceItem, models.InvoiceItem.invoice_id, _serialize_invoice, include_set),
+        media_type=NDJSON_MEDIA_TYPE
+    )
+
+def _etag_scope(request: Request) -> str:
+    return f"{request.url.path}?{request.url.query}|{request.headers.get('accept', '')}"
+
+def _collection_etag(request: Request, stamp_query, related: tuple = ()) -> str:
+    """Validator i koleksionit me një query agregate: filtrat e listës + tabelat e lidhura."""
+    columns = [col for model in related for col in http_cache.table_stamp(model)]
+    row = stamp_query.add_columns(*columns).one() if columns else stamp_query.one()
+    return http_cache.compute_etag(_etag_scope(request), row)
+
+async def _collection_etag_async(request: Request, db: AsyncSession, stamp_stmt, related: tuple = ()) -> str:
+    """Si `_collection_etag`, për një select() të ekzekutuar me AsyncSession."""
+    columns = [col for model in related for col in http_cache.table_stamp(model)]
+    row = (await db.execute(stamp_stmt.add_columns(*columns) if columns else stamp_stmt)).one()
+    return http_cache.compute_etag(_etag_scope(request), row)
+
+def _include_stamps(include: set, item_model) -> tuple:
+    related = []
+    if "client" in include:
+        related.append(models.Client)
+    if "items" in include:
+        related.append(item_model)
+    return tuple(related)
+
 @app.get("/invoices")
-def get_invoices(
+async def get_invoices(
+    request: Request,
     search: str = None,
     status: str = None,
     date_from: date = None,
     date_to: date = None,
     client_id: int = None,
-    db: Session = Depends(get_db)
+    limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_LIMIT),
+    cursor: Optional[str] = None,
+    include: Optional[str] = None,
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(database.get_async_db)
 ):
-    try:
-        query = db.query(models.Invoice).options(
-            joinedload(models.Invoice.client),
-            joinedload(models.Invoice.items)
+    include_set = pagination.parse_include(include, {"client", "items"}, {"client", "items"})
+    stamp_stmt = _filter_invoices(
+        select(*http_cache.stamp_columns(models.Invoice)), search, status, date_from, date_to, client_id
+    )
+    etag = await _collection_etag_async(request, db, stamp_stmt, _include_stamps(include_set, models.InvoiceItem))
+    if http_cache.matches(if_none_match, etag):
+        return http_cache.not_modified(etag)
+    if _wants_ndjson(accept) and not limit and not cursor:
+        return http_cache.apply_headers(
+            _invoice_stream_response(search, status, date_from, date_to, client_id, include_set), etag
         )
+    cursor_values = pagination.decode_cursor(cursor, (date, int)) if cursor else None
+    if cursor and not limit:
+        limit = pagination.DEFAULT_LIMIT
+    try:
+        stmt = _filter_invoices(_invoice_rows_stmt(include_set), search, status, date_from, date_to, client_id)
+        if cursor_values:
+            stmt = stmt.filter(pagination.keyset_after([models.Invoice.date, models.Invoice.id], cursor_values))
         
-        if client_id:
-            query = query.filter(models.Invoice.client_id == client_id)
-        if status:
-            query = query.filter(models.Invoice.status == status)
-        if date_from:
-            query = query.filter(models.Invoice.date >= date_from)
-        if date_to:
-            query = query.filter(models.Invoice.date <= date_to)
-        if search:
-            query = query.outerjoin(models.Client).filter(
-                or_(
-                    models.Invoice.invoice_number.ilike(f"%{search}%"),
-                    models.Client.name.ilike(f"%{search}%")
-                )
-            )
-        
-        invoices = query.order_by(
+        stmt = stmt.order_by(
             models.Invoice.date.desc(),
             models.Invoice.id.desc()
-        ).all()
-        
-        result = []
-        for inv in invoices:
-            invoice_dict = {
-                "id": inv.id,
-                "invoice_number": inv.invoice_number,
-                "date": str(inv.date),
-                "payment_due_date": str(inv.payment_due_date) if inv.payment_due_date else None,
-                "client_id": inv.client_id,
-                "template_id": inv.template_id,
-                "subtotal": float(inv.subtotal),
-                "vat_percentage": float(inv.vat_percentage),
-                "vat_amount": float(inv.vat_amount),
-                "total": float(inv.total),
-                "status": inv.status,
-                "pdf_path": inv.pdf_path,
-                "created_at": str(inv.created_at),
-                "updated_at": str(inv.updated_at),
-                "client": {
-                    "id": inv.client.id,
-                    "name": inv.client.name,
-                    "address": inv.client.address or "",
-                    "unique_number": inv.client.unique_number or "",
-                    "phone": inv.client.phone or "",
-                    "email": inv.client.email or "",
-                    "created_at": str(inv.client.created_at),
-                    "updated_at": str(inv.client.updated_at)
-                } if inv.client else None,
-                "items": [{
-                    "id": item.id,
-                    "invoice_id": item.invoice_id,
-                    "description": item.description,
-                    "quantity": float(item.quantity),
-                    "unit_price": float(item.unit_price),
-                    "subtotal": float(item.subtotal),
-                    "order_index": item.order_index or 0
-                } for item in inv.items]
-            }
-            result.append(invoice_dict)
-        
-        return result
+        )
+        rows, next_cursor = await pagination.fetch_page_async(
+            db, stmt, limit, lambda row: [row.date, row.id], scalars=False
+        )
+        item_rows = []
+        if "items" in include_set:
+            for batch in _invoice_id_batches(rows):
+                item_rows += (await db.execute(_invoice_items_stmt(batch))).all()
+        headers = {pagination.NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+        content = _invoice_row_dicts(rows, item_rows, include_set)
+        return http_cache.apply_headers(fast_json.FastJSONResponse(content=content, headers=headers), etag)
         
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
-def _get_next_val(db: Session, year: int, doc_type: str = 'invoice'):
-    import re
-    from datetime import date
-    model = models.Invoice if doc_type == 'invoice' else models.Offer
-    
-    # Get last items of the year/period
-    query = db.query(model)
-    if doc_type == 'invoice':
-        query = query.filter(model.date >= date(year, 1, 1), model.date < date(year + 1, 1, 1))
-    
-    items = query.order_by(model.id.desc()).limit(20).all()
-    
-    max_val = 0
-    pattern = r'NR\.(\d+)' if doc_type == 'invoice' else r'NR\.(\d+)' # Assuming same pattern
-    
-    for item in items:
-        num_str = item.invoice_number if doc_type == 'invoice' else item.offer_number
-        try:
-            nums = re.findall(pattern, num_str.upper())
-            if nums:
-                val = int(nums[0])
-                if val > max_val: max_val = val
-        except: pass
-    return max_val + 1
+@app.get("/invoices/stream")
+def stream_invoices(
+    search: str = None,
+    status: str = None,
+    date_from: date = None,
+    date_to: date = None,
+    client_id: int = None,
+    include: Optional[str] = None,
+):
+    """Eksport NDJSON i faturave (një dokument JSON për rresht) për tërheqje vjetore."""
+    include_set = pagination.parse_include(include, {"client", "items"}, {"client", "items"})
+    return _invoice_stream_response(search, status, date_from, date_to, client_id, include_set)
+
+# --- ZIP EXPORT (PDF-të e një periudhe, të renderuara paralelisht dhe të dërguara në rrjedhë) ---
+def _zip_entries(doc_type: str, ids: list):
+    """Hyrjet e arkivit sipas radhës së përfundimit; dështimet shënohen në errors.txt në fund."""
+    used_names = set()
+    errors = []
+    for doc_id, result, error in render_queue.render_many(doc_type, ids):
+        if error is not None:
+            errors.append(f"{doc_type} {doc_id}: {error}")
+            continue
+        filename, location = result
+        if filename in used_names:
+            stem, ext = os.path.splitext(filename)
+            filename = f"{stem}_{doc_id}{ext}"
+        used_names.add(filename)
+        yield filename, zip_stream.location_chunks(location)
+    if errors:
+        yield "errors.txt", [("\n".join(errors) + "\n").encode("utf-8")]
+
+def _zip_export_response(doc_type: str, ids: list, name: str, date_from=None, date_to=None):
+    if not ids:
+        raise HTTPException(status_code=404, detail="Nuk ka dokumente për këta filtra.")
+    period = "_".join(str(d) for d in (date_from, date_to) if d)
+    filename = f"{name}_{period}.zip" if period else f"{name}.zip"
+    return StreamingResponse(
+        zip_stream.stream_zip(_zip_entries(doc_type, ids)),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/invoices/export.zip")
+def export_invoices_zip(
+    search: str = None,
+    status: str = None,
+    date_from: date = None,
+    date_to: date = None,
+    client_id: int = None,
+    db: Session = Depends(get_db)
+):
+    """PDF-të e faturave të filtruara në një ZIP (p.sh. një muaj për kontabilistin)."""
+    query = _filter_invoices(db.query(models.Invoice.id), search, status, date_from, date_to, client_id)
+    ids = [row.id for row in query.order_by(models.Invoice.date, models.Invoice.id)]
+    return _zip_export_response("invoice", ids, "Faturat", date_from, date_to)
 
 @app.get("/invoices/next-number")
 def get_next_invoice_number(db: Session = Depends(get_db)):
     from datetime import date
     current_year = date.today().year
     prefix = ""
-    db_prefix = db.query(models.Setting).filter(models.Setting.setting_key == 'device_prefix').first()
-    if db_prefix and db_prefix.setting_value:
-        prefix = f"/{db_prefix.setting_value}"
+    device_prefix = config_cache.get(db).setting("device_prefix")
+    if device_prefix:
+        prefix = f"/{device_prefix}"
     
-    next_val = _get_next_val(db, current_year, 'invoice')
+    next_val = sequences.peek(db, "invoice", current_year, prefix.lstrip("/"))
     return {"next_number": f"FATURA NR.{next_val}{prefix}"}
 
 @app.get("/invoices/years")
 def get_invoice_years(db: Session = Depends(get_db)):
-    years = db.query(extract('year', models.Invoice.date).label("year")).distinct().order_by(extract('year', models.Invoice.date).desc()).all()
-    result = [str(y.year) for y in years if y.year]
+    result = [str(y) for y in rollups.years(db, "invoice")]
     if not result:
         result = [str(date.today().year)]
     return {"years": result}
@@ -437,7 +705,9 @@ def get_invoice_years(db: Session = Depends(get_db)):
 @app.post("/invoices", response_model=schemas.Invoice)
 def create_invoice(invoice: schemas.InvoiceCreate, db: Session = Depends(get_db)):
     try:
-        return _create_invoice_impl(invoice, db)
+        db_invoice = _create_invoice_impl(invoice, db)
+        db.commit()
+        return _load_invoice(db, db_invoice.id)
     except HTTPException:
         raise
     except Exception as e:
@@ -445,94 +715,44 @@ def create_invoice(invoice: schemas.InvoiceCreate, db: Session = Depends(get_db)
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+def _load_invoice(db: Session, invoice_id: int):
+    return db.query(models.Invoice).options(
+        joinedload(models.Invoice.client),
+        joinedload(models.Invoice.items)
+    ).filter(models.Invoice.id == invoice_id).first()
+
 def _create_invoice_impl(invoice: schemas.InvoiceCreate, db: Session):
-    from datetime import date as dt_date
-    
-    # Check for duplicate within the same year
-    year = invoice.date.year
-    year_start = dt_date(year, 1, 1)
-    year_end = dt_date(year + 1, 1, 1)
-    
-    existing = db.query(models.Invoice).filter(
-        models.Invoice.invoice_number == invoice.invoice_number,
-        models.Invoice.date >= year_start,
-        models.Invoice.date < year_end
-    ).first()
-    
-    target_number = invoice.invoice_number
-    
-    if existing:
-        # Conflict Resolution Logic: "Earlier one gets the number"
-        new_ts = invoice.save_timestamp or dt_date.today()
-        ext_ts = existing.save_timestamp or existing.created_at
-        
-        # Ensure comparison works (naive vs aware or datetime vs date)
-        if hasattr(new_ts, 'timestamp') and hasattr(ext_ts, 'timestamp'):
-             is_earlier = new_ts < ext_ts
-        else:
-             is_earlier = False # Fallback
-
-        if is_earlier:
-            # Shift existing one to next available
-            next_val = _get_next_val(db, year, 'invoice')
-            # Extract prefix from existing
-            import re
-            parts = re.split(r'NR\.\d+', existing.invoice_number)
-            prefix = parts[1] if len(parts) > 1 else ""
-            existing.invoice_number = f"FATURA NR.{next_val}{prefix}"
-            existing.pdf_path = None # Invalidate PDF
-            db.commit()
-        else:
-            # Adjust incoming one to next available
-            next_val = _get_next_val(db, year, 'invoice')
-            import re
-            parts = re.split(r'NR\.\d+', target_number)
-            prefix = parts[1] if len(parts) > 1 else ""
-            target_number = f"FATURA NR.{next_val}{prefix}"
+    """Krijon faturën brenda transaksionit aktual (flush, pa commit)."""
+    # Numri merret nga document_sequences (i bllokuar deri në commit); nëse numri i kërkuar
+    # është zënë, fatura e re merr të radhës – faturat e ruajtura nuk rinumërohen
+    year = sequences.sequence_year("invoice", invoice.date)
+    target_number = sequences.allocate(db, "invoice", year, invoice.invoice_number)
 
     # Remove client_name if present (not in schema)
     invoice_data = invoice.dict(exclude={'items', 'client_name'})
     invoice_data['invoice_number'] = target_number
     db_invoice = models.Invoice(**invoice_data)
-    db.add(db_invoice)
-    db.commit()
-    db.refresh(db_invoice)
-    
-    # Add items
-    for item in invoice.items:
-        db_item = models.InvoiceItem(**item.dict(), invoice_id=db_invoice.id)
-        db.add(db_item)
-    
-    db.commit()
-    
-    # Reload with relationships
-    db_invoice = db.query(models.Invoice).options(
-        joinedload(models.Invoice.client),
-        joinedload(models.Invoice.items)
-    ).filter(models.Invoice.id == db_invoice.id).first()
-    
-    return db_invoice
+    # Fatura dhe artikujt në një flush të vetëm
+    db_invoice.items = [models.InvoiceItem(**item.dict()) for item in invoice.items]
+    return sequences.flush_new(db, db_invoice, "invoice", year)
 
 @app.put("/invoices/{invoice_id}", response_model=schemas.Invoice)
 def update_invoice(invoice_id: int, invoice: schemas.InvoiceCreate, db: Session = Depends(get_db)):
-    from datetime import date as dt_date
+    _update_invoice_impl(invoice_id, invoice, db)
+    db.commit()
     
+    # Reload with relationships
+    return _load_invoice(db, invoice_id)
+
+def _update_invoice_impl(invoice_id: int, invoice: schemas.InvoiceCreate, db: Session):
     db_invoice = db.query(models.Invoice).filter(models.Invoice.id == invoice_id).first()
     if not db_invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
     
-    # Check for duplicate if number changed (within same year)
-    if db_invoice.invoice_number != invoice.invoice_number:
+    # Check for duplicate if number or year changed (within same year)
+    if db_invoice.invoice_number != invoice.invoice_number or db_invoice.date.year != invoice.date.year:
         year = invoice.date.year
-        year_start = dt_date(year, 1, 1)
-        year_end = dt_date(year + 1, 1, 1)
-        
-        existing = db.query(models.Invoice).filter(
-            models.Invoice.invoice_number == invoice.invoice_number,
-            models.Invoice.date >= year_start,
-            models.Invoice.date < year_end
-        ).first()
-        if existing:
+        if sequences.is_taken(db, "invoice", year, invoice.invoice_number, exclude_id=invoice_id):
             raise HTTPException(status_code=400, detail=f"Fatura me numrin '{invoice.invoice_number}' ekziston për vitin {year}!")
 
     # Update main info (exclude client_name if present)
@@ -548,23 +768,16 @@ def update_invoice(invoice_id: int, invoice: schemas.InvoiceCreate, db: Session
     for item in invoice.items:
         db_item = models.InvoiceItem(**item.dict(), invoice_id=invoice_id)
         db.add(db_item)
-    
-    db.commit()
-    
-    # Reload with relationships
-    db_invoice = db.query(models.Invoice).options(
-        joinedload(models.Invoice.client),
-        joinedload(models.Invoice.items)
-    ).filter(models.Invoice.id == invoice_id).first()
-    
+    db.flush()
     return db_invoice
 
 @app.get("/invoices/{invoice_id}", response_model=schemas.Invoice)
-def get_invoice(invoice_id: int, db: Session = Depends(get_db)):
-    db_invoice = db.query(models.Invoice).options(
-        joinedload(models.Invoice.client),
-        joinedload(models.Invoice.items)
-    ).filter(models.Invoice.id == invoice_id).first()
+async def get_invoice(invoice_id: int, db: AsyncSession = Depends(database.get_async_db)):
+    db_invoice = await db.scalar(
+        select(models.Invoice)
+        .options(selectinload(models.Invoice.client), selectinload(models.Invoice.items))
+        .filter(models.Invoice.id == invoice_id)
+    )
     
     if db_invoice is None:
         raise HTTPException(status_code=404, detail="Invoice not found")
@@ -572,37 +785,91 @@ def get_invoice(invoice_id: int, db: Session = Depends(get_db)):
 
 @app.delete("/invoices/{invoice_id}")
 def delete_invoice(invoice_id: int, db: Session = Depends(get_db)):
+    _delete_invoice_impl(invoice_id, db)
+    db.commit()
+    return {"message": "Invoice deleted"}
+
+def _delete_invoice_impl(invoice_id: int, db: Session):
     db_invoice = db.query(models.Invoice).filter(models.Invoice.id == invoice_id).first()
     if not db_invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
     db.delete(db_invoice)
-    db.commit()
-    return {"message": "Invoice deleted"}
+    db.flush()
 
 @app.put("/invoices/{invoice_id}/status")
 def update_invoice_status(invoice_id: int, status_update: schemas.StatusUpdate, db: Session = Depends(get_db)):
+    db_invoice = _update_invoice_status_impl(invoice_id, status_update.status, db)
+    db.commit()
+    return {"id": db_invoice.id, "status": db_invoice.status}
+
+def _update_invoice_status_impl(invoice_id: int, new_status: str, db: Session):
     db_invoice = db.query(models.Invoice).filter(models.Invoice.id == invoice_id).first()
     if not db_invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
-    db_invoice.status = status_update.status
-    db.commit()
-    return {"id": db_invoice.id, "status": db_invoice.status}
+    db_invoice.status = new_status
+    db.flush()
+    return db_invoice
 
 @app.post("/invoices/bulk-delete")
 def bulk_delete_invoices(req: schemas.BulkDeleteRequest, db: Session = Depends(get_db)):
     if not req.invoice_ids:
         return {"deleted": 0}
+    buckets = rollups.buckets_of(db, models.Invoice, req.invoice_ids)
     db.query(models.InvoiceItem).filter(models.InvoiceItem.invoice_id.in_(req.invoice_ids)).delete(synchronize_session=False)
     deleted = db.query(models.Invoice).filter(models.Invoice.id.in_(req.invoice_ids)).delete(synchronize_session=False)
+    rollups.refresh(db.connection(), buckets)
+    sync_log.record(db, "invoices", req.invoice_ids)
     db.commit()
     return {"deleted": deleted}
 
+def _send_bulk_email(db: Session, kind: str, documents: list, company, override_email=None):
+    """
+    Pa override_email, dokumentet grupohen sipas email-it të klientit: një mesazh për klient,
+    të gjithë përmes të njëjtave lidhje SMTP (SMTPPool). Me override_email shkon një mesazh i vetëm.
+    """
+    is_offer = kind == "offer"
+    label = "ofertave" if is_offer else "faturave"
+    groups = {}
+    errors = []
+    for doc in documents:
+        dest_email = override_email or (doc.client.email if doc.client else None)
+        if dest_email:
+            groups.setdefault(dest_email, []).append(doc)
+        else:
+            number = doc.offer_number if is_offer else doc.invoice_number
+            errors.append(f"{number}: klienti nuk ka email.")
+    if not groups:
+        raise HTTPException(status_code=400, detail=f"Zgjidhni një email për dërgimin e {label}.")
+
+    batches = [
+        (
+            dest_email,
+            docs,
+            # Bashkëngjitjet lexohen nga cache-i lokal (edhe kur vendndodhja e PDF-së është në Blob)
+            [render_queue.render_attachment(db, kind, doc)[1] for doc in docs],
+            [pdf_generator.document_filename(kind, doc) for doc in docs],
+        )
+        for dest_email, docs in groups.items()
+    ]
+    results = WebEmailService.send_bulk_per_recipient(batches, company, is_offer=is_offer)
+
+    success = 0
+    for (dest_email, ok, msg), (_, docs, _, _) in zip(results, batches):
+        if ok:
+            success += len(docs)
+        else:
+            errors.append(f"{dest_email}: {msg}")
+    failed = len(documents) - success
+    if not success:
+        raise HTTPException(status_code=500, detail="; ".join(errors))
+    return {"success": success, "failed": failed, "errors": errors}
+
 @app.post("/invoices/bulk-email")
 def bulk_email_invoices(req: schemas.BulkEmailRequest, db: Session = Depends(get_db)):
     if not req.invoice_ids:
         return {"success": 0, "failed": 0, "errors": []}
     
-    db_company = db.query(models.Company).first()
+    db_company = config_cache.company(db)
     if not db_company:
         raise HTTPException(status_code=400, detail="Company not found")
     
@@ -617,102 +884,338 @@ def bulk_email_invoices(req: schemas.BulkEmailRequest, db: Session = Depends(get
 
     ordered_invoices = [found_by_id[inv_id] for inv_id in req.invoice_ids]
 
-    dest_email = req.override_email
-    if not dest_email:
-        emails = {inv.client.email for inv in ordered_invoices if inv.client and inv.client.email}
-        if len(emails) == 1:
-            dest_email = next(iter(emails))
-        else:
-            raise HTTPException(status_code=400, detail="Zgjidhni një email për dërgimin e faturave.")
-
-    pdf_paths = []
-    for inv in ordered_invoices:
-        pdf_path = inv.pdf_path
-        if not pdf_path or not os.path.exists(pdf_path):
-            pdf_path = pdf_generator.generate_invoice_pdf(inv, db_company, inv.client)
-            inv.pdf_path = pdf_path
-            db.commit()
-        pdf_paths.append(pdf_path)
+    return _send_bulk_email(db, "invoice", ordered_invoices, db_company, req.override_email)
 
-    email_service = WebEmailService()
-    ok, msg = email_service.send_bulk_documents(ordered_invoices, db_company, dest_email, pdf_paths)
-    if not ok:
-        raise HTTPException(status_code=500, detail=msg)
+# --- PDF (cache sipas përmbajtjes: i njëjti dokument → i njëjti skedar) ---
+PDF_IMMUTABLE = "private, max-age=31536000, immutable"
+_PDF_KEY_RE = re.compile(r"^[0-9a-f]{64}$")
+
+def _document_pdf(kind: str, doc, company, client=None, font_size=None):
+    """
+    (rruga ose URL, çelësi) nga cache-i. Vetëm lexim: pdf_path nuk shkruhet këtu (e ruan render_queue),
+    por kur mban URL-në e Blob-it për këtë çelës përdoret pa renderuar.
+    """
+    return pdf_generator.render_cached(
+        kind, doc, company, client, font_size=font_size, known=render_queue.known_location(doc, font_size)
+    )
 
-    return {"success": len(ordered_invoices), "failed": 0, "errors": []}
+def _pdf_response(location: str, key: str, filename: str, if_none_match: Optional[str] = None):
+    """PDF-ja e dokumentit; ETag = çelësi, Content-Location = URL-ja e pandryshueshme /pdf/{key}.pdf."""
+    if location.startswith(('http://', 'https://')):
+        from fastapi.responses import RedirectResponse
+        return RedirectResponse(location)
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": http_cache.CACHE_CONTROL, "Content-Location": f"/pdf/{key}.pdf"}
+    if http_cache.matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(
+        location, media_type='application/pdf', filename=filename,
+        content_disposition_type='inline', headers=headers
+    )
+
+@app.get("/pdf/{key}.pdf")
+def get_cached_pdf(key: str, if_none_match: Optional[str] = Header(None)):
+    """PDF nga cache-i sipas çelësit; përmbajtja nuk ndryshon kurrë, prandaj ruhet 1 vit."""
+    path = pdf_generator.cache_path(key) if _PDF_KEY_RE.match(key) else None
+    if not path or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="PDF not found")
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": PDF_IMMUTABLE}
+    if http_cache.matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type='application/pdf', content_disposition_type='inline', headers=headers)
+
+_PRINT_BATCH_MAX = 200
+
+def _print_batch_response(db: Session, kind: str, ids: list, font_size=None):
+    """Dokumentet sipas radhës së kërkesës në një PDF të vetëm (një build ReportLab)."""
+    if not ids:
+        raise HTTPException(status_code=400, detail="Zgjidhni të paktën një dokument.")
+    if len(ids) > _PRINT_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"Maksimumi {_PRINT_BATCH_MAX} dokumente për printim.")
+    db_company = config_cache.company(db)
+    if not db_company:
+        raise HTTPException(status_code=400, detail="Company not found")
+
+    model = models.Invoice if kind == "invoice" else models.Offer
+    docs = db.query(model).options(
+        joinedload(model.client), selectinload(model.items)
+    ).filter(model.id.in_(ids)).all()
+    found_by_id = {doc.id: doc for doc in docs}
+    missing_ids = [doc_id for doc_id in ids if doc_id not in found_by_id]
+    if missing_ids:
+        label = "Faturat" if kind == "invoice" else "Ofertat"
+        raise HTTPException(status_code=404, detail=f"{label} nuk u gjetën: {', '.join(map(str, missing_ids))}")
+
+    documents = [(found_by_id[doc_id], found_by_id[doc_id].client) for doc_id in dict.fromkeys(ids)]
+    path, key = pdf_generator.render_batch_cached(kind, documents, db_company, font_size=font_size)
+    filename = "Faturat_print.pdf" if kind == "invoice" else "Ofertat_print.pdf"
+    return _pdf_response(path, key, filename)
+
+@app.post("/invoices/print-batch")
+def print_invoices_batch(req: schemas.BulkPrintRequest, db: Session = Depends(get_db)):
+    """Faturat e zgjedhura në një PDF për printim (çdo faturë nis në faqe të re)."""
+    return _print_batch_response(db, "invoice", req.invoice_ids)
+
+@app.post("/offers/print-batch")
+def print_offers_batch(req: schemas.BulkPrintOfferRequest, db: Session = Depends(get_db)):
+    """Ofertat e zgjedhura në një PDF për printim."""
+    return _print_batch_response(db, "offer", req.offer_ids, req.font_size or None)
 
 @app.get("/invoices/{invoice_id}/pdf")
-def get_invoice_pdf(invoice_id: int, db: Session = Depends(get_db)):
+def get_invoice_pdf(invoice_id: int, if_none_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
     db_invoice = db.query(models.Invoice).filter(models.Invoice.id == invoice_id).first()
     if not db_invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
-    
-    # Check if PDF already exists
-    if db_invoice.pdf_path:
-        if db_invoice.pdf_path.startswith(('http://', 'https://')):
-            from fastapi.responses import RedirectResponse
-            return RedirectResponse(db_invoice.pdf_path)
-        elif os.path.exists(db_invoice.pdf_path):
-            return FileResponse(
-                db_invoice.pdf_path,
-                media_type='application/pdf',
-                filename=os.path.basename(db_invoice.pdf_path),
-                headers={"Content-Disposition": f'inline; filename="{os.path.basename(db_invoice.pdf_path)}"'}
-            )
 
-    db_company = db.query(models.Company).first()
+    db_company = config_cache.company(db)
     db_client = db.query(models.Client).filter(models.Client.id == db_invoice.client_id).first()
-    
-    pdf_path = pdf_generator.generate_invoice_pdf(db_invoice, db_company, db_client)
-    db_invoice.pdf_path = pdf_path
-    db.commit()
-    
-    return FileResponse(
-        pdf_path,
-        media_type='application/pdf',
-        filename=os.path.basename(pdf_path),
-        headers={"Content-Disposition": f'inline; filename="{os.path.basename(pdf_path)}"'}
-    )
+
+    location, key = _document_pdf("invoice", db_invoice, db_company, db_client)
+    return _pdf_response(location, key, pdf_generator.document_filename("invoice", db_invoice), if_none_match)
 @app.get("/clients", response_model=List[schemas.Client])
-def get_clients(db: Session = Depends(get_db)):
-    return db.query(models.Client).order_by(models.Client.name).all()
+async def get_clients(
+    request: Request,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    etag = await _collection_etag_async(request, db, select(*http_cache.stamp_columns(models.Client)))
+    if http_cache.matches(if_none_match, etag):
+        return http_cache.not_modified(etag)
+    http_cache.apply_headers(response, etag)
+    return (await db.scalars(select(models.Client).order_by(models.Client.name))).all()
 
 @app.post("/clients", response_model=schemas.Client)
 def create_client(client: schemas.ClientCreate, db: Session = Depends(get_db)):
-    db_client = models.Client(**client.dict())
-    db.add(db_client)
+    db_client = _create_client_impl(client, db)
     db.commit()
     db.refresh(db_client)
     return db_client
 
+def _create_client_impl(client: schemas.ClientCreate, db: Session):
+    db_client = models.Client(**client.dict())
+    db.add(db_client)
+    db.flush()
+    return db_client
+
 @app.put("/clients/{client_id}", response_model=schemas.Client)
 def update_client(client_id: int, client: schemas.ClientCreate, db: Session = Depends(get_db)):
+    db_client = _update_client_impl(client_id, client, db)
+    db.commit()
+    db.refresh(db_client)
+    return db_client
+
+def _update_client_impl(client_id: int, client: schemas.ClientCreate, db: Session):
     db_client = db.query(models.Client).filter(models.Client.id == client_id).first()
     if not db_client:
         raise HTTPException(status_code=404, detail="Client not found")
     for key, value in client.dict().items():
         setattr(db_client, key, value)
-    db.commit()
-    db.refresh(db_client)
+    db.flush()
     return db_client
 
 @app.delete("/clients/{client_id}")
 def delete_client(client_id: int, db: Session = Depends(get_db)):
+    _delete_client_impl(client_id, db)
+    db.commit()
+    return {"message": "Client deleted"}
+
+def _delete_client_impl(client_id: int, db: Session):
     db_client = db.query(models.Client).filter(models.Client.id == client_id).first()
     if not db_client:
         raise HTTPException(status_code=404, detail="Client not found")
     db.delete(db_client)
+    db.flush()
+
+# --- DELTA SYNC (PWA offline) ---
+_SYNC_LOADERS = {
+    "invoices": (models.Invoice, lambda inv: _serialize_invoice(inv, {"client", "items"})),
+    "offers": (models.Offer, lambda off: _serialize_offer(off, {"client", "items"})),
+    "clients": (models.Client, _serialize_client),
+}
+
+@app.get("/sync/changes")
+def get_sync_changes(
+    since: Optional[int] = Query(None, ge=0),
+    limit: int = Query(500, ge=1, le=2000),
+    db: Session = Depends(get_db)
+):
+    """
+    Kthen vetëm rreshtat e krijuar/ndryshuar/fshirë pas token-it `since`.
+    `reset: true` do të thotë që klienti duhet të rifreskojë koleksionet e plota
+    (hyrja e parë ose token më i vjetër se regjistri i ruajtur).
+    """
+    result = {entity: {"upserted": [], "deleted": []} for entity in sync_log.ENTITIES}
+    if since is None or since < sync_log.pruned_before(db):
+        return {"token": sync_log.current_token(db), "has_more": False, "reset": True, **result}
+
+    latest, token, has_more = sync_log.read_changes(db, since, limit)
+    for entity, (model, serialize) in _SYNC_LOADERS.items():
+        upsert_ids = [entity_id for (ent, entity_id), op in latest.items() if ent == entity and op == sync_log.UPSERT]
+        deleted_ids = {entity_id for (ent, entity_id), op in latest.items() if ent == entity and op == sync_log.DELETE}
+        if upsert_ids:
+            query = db.query(model).filter(model.id.in_(upsert_ids))
+            if hasattr(model, "items"):
+                query = query.options(selectinload(model.client), selectinload(model.items))
+            rows = query.all()
+            result[entity]["upserted"] = [serialize(row) for row in rows]
+            # I fshirë pas ndryshimit (p.sh. bulk delete në një batch tjetër)
+            deleted_ids |= set(upsert_ids) - {row.id for row in rows}
+        result[entity]["deleted"] = sorted(deleted_ids)
+    return {"token": token, "has_more": has_more, "reset": False, **result}
+
+# --- BATCH (rilojtja e radhës offline në një transaksion) ---
+_BATCH_MAX_OPERATIONS = 200
+
+_BATCH_HANDLERS = {
+    ("invoices", "create"): lambda db, _id, data: _create_invoice_impl(schemas.InvoiceCreate(**data), db).id,
+    ("invoices", "update"): lambda db, _id, data: _update_invoice_impl(_id, schemas.InvoiceCreate(**data), db).id,
+    ("invoices", "status"): lambda db, _id, data: _update_invoice_status_impl(_id, schemas.StatusUpdate(**data).status, db).id,
+    ("invoices", "delete"): lambda db, _id, data: _delete_invoice_impl(_id, db),
+    ("offers", "create"): lambda db, _id, data: _create_offer_impl(schemas.OfferCreate(**data), db).id,
+    ("offers", "update"): lambda db, _id, data: _update_offer_impl(_id, schemas.OfferCreate(**data), db).id,
+    ("offers", "delete"): lambda db, _id, data: _delete_offer_impl(_id, db),
+    ("clients", "create"): lambda db, _id, data: _create_client_impl(schemas.ClientCreate(**data), db).id,
+    ("clients", "update"): lambda db, _id, data: _update_client_impl(_id, schemas.ClientCreate(**data), db).id,
+    ("clients", "delete"): lambda db, _id, data: _delete_client_impl(_id, db),
+}
+
+def _resolve_batch_id(value, id_map: dict):
+    """ID reale (int ose string numerik) ose ID e përkohshme e krijuar më herët në të njëjtin batch."""
+    if value is None or isinstance(value, int):
+        return value
+    if value in id_map:
+        return id_map[value]
+    if str(value).isdigit():
+        return int(value)
+    raise HTTPException(status_code=400, detail=f"ID e përkohshme e panjohur: {value}")
+
+def _apply_batch_operation(db: Session, op: schemas.BatchOperation, id_map: dict):
+    handler = _BATCH_HANDLERS.get((op.entity, op.op))
+    if handler is None:
+        raise HTTPException(status_code=400, detail=f"Operacion i panjohur: {op.op} {op.entity}")
+    target_id = _resolve_batch_id(op.id, id_map)
+    if op.op != "create" and target_id is None:
+        raise HTTPException(status_code=400, detail="Mungon id")
+    data = dict(op.data or {})
+    if "client_id" in data:
+        data["client_id"] = _resolve_batch_id(data["client_id"], id_map)
+    try:
+        entity_id = handler(db, target_id, data)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return target_id if op.op == "delete" else entity_id
+
+@app.post("/batch")
+def apply_batch(req: schemas.BatchRequest, db: Session = Depends(get_db)):
+    """
+    Aplikon të gjitha operacionet e radhës offline në një transaksion të vetëm:
+    ose kalojnë të gjitha, ose asnjë (rollback dhe 4xx me indeksin e operacionit që dështoi).
+    ID-të e përkohshme (`temp_id`) mund të përdoren si `id` ose `data.client_id` në operacionet pasuese.
+    Operacionet me `idempotency_key` të parë më parë nuk aplikohen sërish.
+    """
+    if len(req.operations) > _BATCH_MAX_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"Maksimumi {_BATCH_MAX_OPERATIONS} operacione për batch.")
+
+    id_map: dict = {}
+    results = []
+    for index, op in enumerate(req.operations):
+        try:
+            seen = None
+            if op.idempotency_key:
+                seen = db.query(models.IdempotencyKey).filter(models.IdempotencyKey.key == op.idempotency_key).first()
+            if seen:
+                entity_id, applied = seen.entity_id, False
+            else:
+                entity_id, applied = _apply_batch_operation(db, op, id_map), True
+                if op.idempotency_key:
+                    db.add(models.IdempotencyKey(key=op.idempotency_key, entity=op.entity, entity_id=entity_id))
+                    db.flush()
+        except HTTPException as e:
+            db.rollback()
+            raise HTTPException(status_code=e.status_code, detail=f"Operacioni #{index} ({op.op} {op.entity}): {e.detail}")
+        except IntegrityError as e:
+            db.rollback()
+            raise HTTPException(status_code=409, detail=f"Operacioni #{index} ({op.op} {op.entity}): konflikt në DB ({e.orig})")
+        if op.temp_id and entity_id is not None:
+            id_map[op.temp_id] = entity_id
+        results.append({"index": index, "op": op.op, "entity": op.entity, "id": entity_id, "applied": applied})
+
     db.commit()
-    return {"message": "Client deleted"}
+
+    # Gjendja përfundimtare e rreshtave të prekur (p.sh. numri i faturës pas zgjidhjes së konfliktit)
+    touched = defaultdict(set)
+    for result in results:
+        if result["op"] != "delete" and result["id"] is not None:
+            touched[result["entity"]].add(result["id"])
+    documents = {}
+    for entity, ids in touched.items():
+        model, serialize = _SYNC_LOADERS[entity]
+        query = db.query(model).filter(model.id.in_(ids))
+        if hasattr(model, "items"):
+            query = query.options(selectinload(model.client), selectinload(model.items))
+        documents.update({(entity, row.id): serialize(row) for row in query.all()})
+    for result in results:
+        result["data"] = documents.get((result["entity"], result["id"]))
+    return {"results": results, "id_map": id_map}
+
+# --- SEARCH ---
+def _search_hit(entity: str, row, score: int) -> dict:
+    if entity == "clients":
+        details = [row.unique_number, row.email, row.phone]
+        return {"type": "client", "id": row.id, "score": score, "title": row.name,
+                "subtitle": " · ".join(d for d in details if d), "date": None, "total": None, "status": None}
+    client_name = row.client.name if row.client else None
+    if entity == "invoices":
+        return {"type": "invoice", "id": row.id, "score": score, "title": row.invoice_number,
+                "subtitle": client_name, "date": str(row.date), "total": float(row.total or 0), "status": row.status}
+    return {"type": "offer", "id": row.id, "score": score, "title": row.offer_number,
+            "subtitle": row.subject or client_name, "date": str(row.date), "total": float(row.total or 0), "status": None}
+
+@app.get("/search")
+def search_all(
+    q: str = Query(..., min_length=1),
+    types: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """
+    Kërkim i renditur në fatura, oferta dhe klientë (numri, fushat e klientit, subjekti, artikujt).
+    `types=invoices,clients` kufizon llojet.
+    """
+    entities = pagination.parse_include(types, set(search_index.ENTITIES), set(search_index.ENTITIES))
+    ranked = search_index.search(db, q, entities or search_index.ENTITIES, limit)
+    ids = defaultdict(list)
+    for entity, entity_id, _ in ranked:
+        ids[entity].append(entity_id)
+    loaded = {}
+    for entity, entity_ids in ids.items():
+        model = search_index.SOURCES[entity][0]
+        query = db.query(model).filter(model.id.in_(entity_ids))
+        if hasattr(model, "client"):
+            query = query.options(joinedload(model.client))
+        loaded.update({(entity, row.id): row for row in query.all()})
+    results = [
+        _search_hit(entity, loaded[(entity, entity_id)], score)
+        for entity, entity_id, score in ranked if (entity, entity_id) in loaded
+    ]
+    return {"query": q, "results": results}
 
 # --- CONTRACTS ---
 @app.get("/contracts", response_model=List[schemas.Contract])
 def get_contracts(
+    response: Response,
     search: Optional[str] = None,
     date_from: Optional[date] = None,
     date_to: Optional[date] = None,
+    limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_LIMIT),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
+    cursor_values = pagination.decode_cursor(cursor, (date, int)) if cursor else None
+    if cursor and not limit:
+        limit = pagination.DEFAULT_LIMIT
     query = db.query(models.Contract)
     if date_from:
         query = query.filter(models.Contract.signing_date >= date_from)
@@ -727,13 +1230,18 @@ def get_contracts(
                 models.Contract.residence.ilike(term)
             )
         )
-    return query.order_by(models.Contract.signing_date.desc(), models.Contract.id.desc()).all()
+    if cursor_values:
+        query = query.filter(pagination.keyset_after([models.Contract.signing_date, models.Contract.id], cursor_values))
+    query = query.order_by(models.Contract.signing_date.desc(), models.Contract.id.desc())
+    contracts, next_cursor = pagination.fetch_page(query, limit, lambda c: [c.signing_date, c.id])
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    return contracts
 
 
 @app.get("/contracts/years")
 def get_contract_years(db: Session = Depends(get_db)):
-    years = db.query(extract('year', models.Contract.signing_date).label("year")).distinct().order_by(extract('year', models.Contract.signing_date).desc()).all()
-    result = [str(int(y.year)) for y in years if y.year is not None]
+    result = [str(y) for y in rollups.years(db, "contract")]
     if not result:
         result = [str(date.today().year)]
     return {"years": result}
@@ -783,174 +1291,203 @@ def delete_contract(contract_id: int, db: Session = Depends(get_db)):
     return {"message": "Contract deleted"}
 
 @app.get("/contracts/{contract_id}/pdf")
-def get_contract_pdf(contract_id: int, db: Session = Depends(get_db)):
+def get_contract_pdf(contract_id: int, if_none_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
     db_contract = db.query(models.Contract).filter(models.Contract.id == contract_id).first()
     if not db_contract:
         raise HTTPException(status_code=404, detail="Contract not found")
-    if db_contract.pdf_path and os.path.exists(db_contract.pdf_path):
-        return FileResponse(
-            db_contract.pdf_path,
-            media_type='application/pdf',
-            filename=os.path.basename(db_contract.pdf_path),
-            headers={"Content-Disposition": f'inline; filename="{os.path.basename(db_contract.pdf_path)}"'}
+    db_company = config_cache.company(db)
+    location, key = _document_pdf("contract", db_contract, db_company)
+    return _pdf_response(location, key, pdf_generator.document_filename("contract", db_contract), if_none_match)
+
+# --- OFFERS ---
+# Numri rendor i ofertës nga "OFERTA NR.XX" ose "OF-YYYY-XXX" (si në desktop app)
+def _serialize_offer(off, include: set) -> dict:
+    offer_dict = {
+        "id": off.id,
+        "offer_number": off.offer_number,
+        "date": str(off.date),
+        "client_id": off.client_id,
+        "subject": off.subject,
+        "description": off.description,
+        "subtotal": float(off.subtotal or 0),
+        "vat_percentage": float(off.vat_percentage or 0),
+        "vat_amount": float(off.vat_amount or 0),
+        "total": float(off.total or 0),
+        "save_timestamp": _iso(off.save_timestamp),
+        "created_at": _iso(off.created_at),
+        "updated_at": _iso(off.updated_at),
+    }
+    if "client" in include:
+        offer_dict["client"] = _serialize_client(off.client) if off.client else None
+    if "items" in include:
+        offer_dict["items"] = [{
+            "id": item.id,
+            "offer_id": item.offer_id,
+            "description": item.description,
+            "unit": item.unit,
+            "quantity": float(item.quantity or 0),
+            "unit_price": float(item.unit_price or 0),
+            "subtotal": float(item.subtotal or 0),
+            "row_type": item.row_type,
+            "custom_attributes": item.custom_attributes,
+            "order_index": item.order_index or 0
+        } for item in off.items]
+    return offer_dict
+
+def _filter_offers(query, search=None, date_from=None, date_to=None, client_id=None):
+    if client_id:
+        query = query.filter(models.Offer.client_id == client_id)
+    if date_from:
+        query = query.filter(models.Offer.date >= date_from)
+    if date_to:
+        query = query.filter(models.Offer.date <= date_to)
+    if search:
+        query = query.filter(_search_filter(models.Offer, search))
+    return query
+
+def _offer_stream_response(search, date_from, date_to, include_set):
+    def build_query(session: Session):
+        query = session.query(models.Offer).options(
+            joinedload(models.Offer.client) if "client" in include_set else noload(models.Offer.client),
+            noload(models.Offer.items)
         )
-    db_company = db.query(models.Company).first()
-    pdf_path = pdf_generator.generate_contract_pdf(db_contract, db_company)
-    db_contract.pdf_path = pdf_path
-    db.commit()
-    return FileResponse(
-        pdf_path,
-        media_type='application/pdf',
-        filename=os.path.basename(pdf_path),
-        headers={"Content-Disposition": f'inline; filename="{os.path.basename(pdf_path)}"'}
+        query = _filter_offers(query, search, date_from, date_to)
+        return query.order_by(models.Offer.seq_no.desc(), models.Offer.id.desc())
+    return StreamingResponse(
+        _stream_documents(build_query, models.OfferItem, models.OfferItem.offer_id, _serialize_offer, include_set),
+        media_type=NDJSON_MEDIA_TYPE
     )
 
-# --- OFFERS ---
 @app.get("/offers", response_model=List[schemas.Offer])
-def get_offers(
+async def get_offers(
+    request: Request,
     search: str = None,
     date_from: date = None,
     date_to: date = None,
+    limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_LIMIT),
+    cursor: Optional[str] = None,
+    include: Optional[str] = None,
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    include_set = pagination.parse_include(include, {"client", "items"}, {"client", "items"})
+    stamp_stmt = _filter_offers(select(*http_cache.stamp_columns(models.Offer)), search, date_from, date_to)
+    etag = await _collection_etag_async(request, db, stamp_stmt, _include_stamps(include_set, models.OfferItem))
+    if http_cache.matches(if_none_match, etag):
+        return http_cache.not_modified(etag)
+    if _wants_ndjson(accept) and not limit and not cursor:
+        return http_cache.apply_headers(_offer_stream_response(search, date_from, date_to, include_set), etag)
+    cursor_values = pagination.decode_cursor(cursor, (pagination.nullable(int), int)) if cursor else None
+    if cursor and not limit:
+        limit = pagination.DEFAULT_LIMIT
+    stmt = select(models.Offer).options(*_relation_options(models.Offer, include_set))
+    stmt = _filter_offers(stmt, search, date_from, date_to)
+    if cursor_values:
+        # Numrat pa formatin NR.X (seq_no NULL) renditen të fundit, pas NR.0; cursor-i e mban NULL-in
+        stmt = stmt.filter(pagination.keyset_after_nullable(models.Offer.seq_no, models.Offer.id, cursor_values))
+    
+    # Sort by offer number sequence (like desktop app) – indeks mbi seq_no
+    stmt = stmt.order_by(models.Offer.seq_no.desc(), models.Offer.id.desc())
+    offers, next_cursor = await pagination.fetch_page_async(db, stmt, limit, lambda off: [off.seq_no, off.id])
+
+    # Një serializues për çdo faqe (edhe të fundit), që forma e listës të mos ndryshojë;
+    # relacionet e papërfshira hiqen nga përgjigja
+    content = [_serialize_offer(off, include_set) for off in offers]
+    headers = {pagination.NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return http_cache.apply_headers(JSONResponse(content=content, headers=headers), etag)
+
+@app.get("/offers/stream")
+def stream_offers(
+    search: str = None,
+    date_from: date = None,
+    date_to: date = None,
+    include: Optional[str] = None,
+):
+    """Eksport NDJSON i ofertave (një dokument JSON për rresht)."""
+    include_set = pagination.parse_include(include, {"client", "items"}, {"client", "items"})
+    return _offer_stream_response(search, date_from, date_to, include_set)
+
+@app.get("/offers/export.zip")
+def export_offers_zip(
+    search: str = None,
+    date_from: date = None,
+    date_to: date = None,
+    client_id: int = None,
     db: Session = Depends(get_db)
 ):
-    query = db.query(models.Offer).options(
-        joinedload(models.Offer.client),
-        joinedload(models.Offer.items)
-    )
-    
-    if date_from:
-        query = query.filter(models.Offer.date >= date_from)
-    if date_to:
-        query = query.filter(models.Offer.date <= date_to)
-    if search:
-        query = query.outerjoin(models.Client).filter(
-            or_(
-                models.Offer.offer_number.ilike(f"%{search}%"),
-                models.Client.name.ilike(f"%{search}%"),
-                models.Offer.subject.ilike(f"%{search}%")
-            )
-        )
-    
-    # Sort by offer number sequence (like desktop app)
-    # Extract number from "OFERTA NR.XX" or "OF-YYYY-XXX" format and sort by it
-    return query.order_by(
-        text("""
-            CAST(
-                CASE 
-                    WHEN offers.offer_number LIKE 'OFERTA NR.%' 
-                    THEN CAST(SUBSTRING_INDEX(offers.offer_number, '.', -1) AS UNSIGNED)
-                    WHEN offers.offer_number LIKE 'OF-%-%' 
-                    THEN CAST(SUBSTRING_INDEX(offers.offer_number, '-', -1) AS UNSIGNED)
-                    ELSE 0
-                END AS UNSIGNED
-            ) DESC
-        """),
-        models.Offer.id.desc()
-    ).all()
+    """PDF-të e ofertave të filtruara në një ZIP."""
+    query = _filter_offers(db.query(models.Offer.id), search, date_from, date_to, client_id)
+    ids = [row.id for row in query.order_by(models.Offer.date, models.Offer.id)]
+    return _zip_export_response("offer", ids, "Ofertat", date_from, date_to)
 
 @app.get("/offers/next-number")
 def get_next_offer_number(db: Session = Depends(get_db)):
-    # Get the last offer to find max sequence number
-    # Format: "OFERTA NR.XX" where XX is sequential number
-    last_offer = db.query(models.Offer).order_by(models.Offer.id.desc()).first()
-    
-    if last_offer:
-        try:
-            # Try to extract number from "OFERTA NR.XX" format
-            offer_num = last_offer.offer_number.upper()
-            if "NR." in offer_num:
-                # Extract number after "NR."
-                num_part = offer_num.split("NR.")[-1].strip()
-                next_seq = int(num_part) + 1
-                return {"next_number": f"OFERTA NR.{next_seq}"}
-            # Try old format "OF-YYYY-XXX"
-            elif "-" in offer_num:
-                parts = offer_num.split("-")
-                if len(parts) >= 3:
-                    num_part = parts[-1].strip()
-                    next_seq = int(num_part) + 1
-                    return {"next_number": f"OFERTA NR.{next_seq}"}
-        except (ValueError, IndexError):
-            pass
-    
-    # Default: first offer
-    return {"next_number": "OFERTA NR.1"}
+    # Format: "OFERTA NR.XX" – numërim i vazhdueshëm (jo për vit)
+    next_seq = sequences.peek(db, "offer", sequences.NO_YEAR)
+    return {"next_number": f"OFERTA NR.{next_seq}"}
 
 @app.get("/offers/years")
 def get_offer_years(db: Session = Depends(get_db)):
-    years = db.query(extract('year', models.Offer.date).label("year")).distinct().order_by(extract('year', models.Offer.date).desc()).all()
-    result = [str(y.year) for y in years if y.year]
+    result = [str(y) for y in rollups.years(db, "offer")]
     if not result:
         result = [str(date.today().year)]
     return {"years": result}
 
-@app.post("/offers", response_model=schemas.Offer)
-def create_offer(offer: schemas.OfferCreate, db: Session = Depends(get_db)):
-    def normalize_custom_attributes(value):
-        if value is None:
-            return None
-        if isinstance(value, (dict, list)):
-            return json.dumps(value, ensure_ascii=False)
-        return value
-    
-    # Check for duplicate within the same year
-    from datetime import date as dt_date
-    year = offer.date.year
-    year_start = dt_date(year, 1, 1)
-    year_end = dt_date(year + 1, 1, 1)
-    
-    existing = db.query(models.Offer).filter(
-        models.Offer.offer_number == offer.offer_number,
-        models.Offer.date >= year_start,
-        models.Offer.date < year_end
-    ).first()
-    if existing:
-        raise HTTPException(status_code=400, detail=f"Oferta me numrin '{offer.offer_number}' ekziston për vitin {year}!")
+def _normalize_custom_attributes(value):
+    if value is None:
+        return None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
 
-    db_offer = models.Offer(**offer.dict(exclude={'items'}))
-    db.add(db_offer)
-    db.commit()
-    db.refresh(db_offer)
-    
+def _offer_item_rows(offer: schemas.OfferCreate) -> list:
+    rows = []
     for idx, item in enumerate(offer.items):
         item_data = item.dict()
-        item_data["custom_attributes"] = normalize_custom_attributes(item_data.get("custom_attributes"))
+        item_data["custom_attributes"] = _normalize_custom_attributes(item_data.get("custom_attributes"))
         # Set order_index if not provided
         if "order_index" not in item_data or item_data["order_index"] is None:
             item_data["order_index"] = idx
-        db_item = models.OfferItem(**item_data, offer_id=db_offer.id)
-        db.add(db_item)
-    
+        rows.append(item_data)
+    return rows
+
+@app.post("/offers", response_model=schemas.Offer)
+def create_offer(offer: schemas.OfferCreate, db: Session = Depends(get_db)):
+    db_offer = _create_offer_impl(offer, db)
     db.commit()
     db.refresh(db_offer)
     return db_offer
 
+def _create_offer_impl(offer: schemas.OfferCreate, db: Session):
+    """Krijon ofertën brenda transaksionit aktual (flush, pa commit)."""
+    # Check for duplicate within the same year
+    year = offer.date.year
+    if sequences.is_taken(db, "offer", year, offer.offer_number):
+        raise HTTPException(status_code=400, detail=f"Oferta me numrin '{offer.offer_number}' ekziston për vitin {year}!")
+
+    db_offer = models.Offer(**offer.dict(exclude={'items'}))
+    db_offer.offer_number = sequences.allocate(db, "offer", sequences.NO_YEAR, offer.offer_number)
+    # Oferta dhe artikujt në një flush të vetëm
+    db_offer.items = [models.OfferItem(**item_data) for item_data in _offer_item_rows(offer)]
+    return sequences.flush_new(db, db_offer, "offer", sequences.NO_YEAR)
+
 @app.put("/offers/{offer_id}", response_model=schemas.Offer)
 def update_offer(offer_id: int, offer: schemas.OfferCreate, db: Session = Depends(get_db)):
-    def normalize_custom_attributes(value):
-        if value is None:
-            return None
-        if isinstance(value, (dict, list)):
-            return json.dumps(value, ensure_ascii=False)
-        return value
-    
+    db_offer = _update_offer_impl(offer_id, offer, db)
+    db.commit()
+    db.refresh(db_offer)
+    return db_offer
+
+def _update_offer_impl(offer_id: int, offer: schemas.OfferCreate, db: Session):
     db_offer = db.query(models.Offer).filter(models.Offer.id == offer_id).first()
     if not db_offer:
         raise HTTPException(status_code=404, detail="Offer not found")
     
-    # Check for duplicate if number changed (within same year)
-    from datetime import date as dt_date
-    if db_offer.offer_number != offer.offer_number:
+    # Check for duplicate if number or year changed (within same year)
+    if db_offer.offer_number != offer.offer_number or db_offer.date.year != offer.date.year:
         year = offer.date.year
-        year_start = dt_date(year, 1, 1)
-        year_end = dt_date(year + 1, 1, 1)
-        
-        existing = db.query(models.Offer).filter(
-            models.Offer.offer_number == offer.offer_number,
-            models.Offer.date >= year_start,
-            models.Offer.date < year_end
-        ).first()
-        if existing:
+        if sequences.is_taken(db, "offer", year, offer.offer_number, exclude_id=offer_id):
             raise HTTPException(status_code=400, detail=f"Oferta me numrin '{offer.offer_number}' ekziston për vitin {year}!")
 
     for key, value in offer.dict(exclude={'items'}).items():
@@ -960,44 +1497,44 @@ def update_offer(offer_id: int, offer: schemas.OfferCreate, db: Session = Depend
     db_offer.pdf_path = None
     
     db.query(models.OfferItem).filter(models.OfferItem.offer_id == offer_id).delete()
-    for idx, item in enumerate(offer.items):
-        item_data = item.dict()
-        item_data["custom_attributes"] = normalize_custom_attributes(item_data.get("custom_attributes"))
-        # Set order_index if not provided
-        if "order_index" not in item_data or item_data["order_index"] is None:
-            item_data["order_index"] = idx
-        db_item = models.OfferItem(**item_data, offer_id=offer_id)
-        db.add(db_item)
-    
-    db.commit()
-    db.refresh(db_offer)
+    for item_data in _offer_item_rows(offer):
+        db.add(models.OfferItem(**item_data, offer_id=offer_id))
+    db.flush()
     return db_offer
 
 @app.get("/offers/{offer_id}", response_model=schemas.Offer)
-def get_offer(offer_id: int, db: Session = Depends(get_db)):
-    db_offer = db.query(models.Offer).options(
-        joinedload(models.Offer.client),
-        joinedload(models.Offer.items)
-    ).filter(models.Offer.id == offer_id).first()
+async def get_offer(offer_id: int, db: AsyncSession = Depends(database.get_async_db)):
+    db_offer = await db.scalar(
+        select(models.Offer)
+        .options(selectinload(models.Offer.client), selectinload(models.Offer.items))
+        .filter(models.Offer.id == offer_id)
+    )
     if not db_offer:
         raise HTTPException(status_code=404, detail="Offer not found")
     return db_offer
 
 @app.delete("/offers/{offer_id}")
 def delete_offer(offer_id: int, db: Session = Depends(get_db)):
+    _delete_offer_impl(offer_id, db)
+    db.commit()
+    return {"message": "Offer deleted"}
+
+def _delete_offer_impl(offer_id: int, db: Session):
     db_offer = db.query(models.Offer).filter(models.Offer.id == offer_id).first()
     if not db_offer:
         raise HTTPException(status_code=404, detail="Offer not found")
     db.delete(db_offer)
-    db.commit()
-    return {"message": "Offer deleted"}
+    db.flush()
 
 @app.post("/offers/bulk-delete")
 def bulk_delete_offers(req: schemas.BulkDeleteOfferRequest, db: Session = Depends(get_db)):
     if not req.offer_ids:
         return {"deleted": 0}
+    buckets = rollups.buckets_of(db, models.Offer, req.offer_ids)
     db.query(models.OfferItem).filter(models.OfferItem.offer_id.in_(req.offer_ids)).delete(synchronize_session=False)
     deleted = db.query(models.Offer).filter(models.Offer.id.in_(req.offer_ids)).delete(synchronize_session=False)
+    rollups.refresh(db.connection(), buckets)
+    sync_log.record(db, "offers", req.offer_ids)
     db.commit()
     return {"deleted": deleted}
 
@@ -1006,7 +1543,7 @@ def bulk_email_offers(req: schemas.BulkEmailOfferRequest, db: Session = Depends(
     if not req.offer_ids:
         return {"success": 0, "failed": 0, "errors": []}
     
-    db_company = db.query(models.Company).first()
+    db_company = config_cache.company(db)
     if not db_company:
         raise HTTPException(status_code=400, detail="Company not found")
     
@@ -1021,155 +1558,206 @@ def bulk_email_offers(req: schemas.BulkEmailOfferRequest, db: Session = Depends(
 
     ordered_offers = [found_by_id[off_id] for off_id in req.offer_ids]
 
-    dest_email = req.override_email
-    if not dest_email:
-        emails = {off.client.email for off in ordered_offers if off.client and off.client.email}
-        if len(emails) == 1:
-            dest_email = next(iter(emails))
-        else:
-            raise HTTPException(status_code=400, detail="Zgjidhni një email për dërgimin e ofertave.")
-
-    pdf_paths = []
-    for off in ordered_offers:
-        pdf_path = off.pdf_path
-        if not pdf_path or not os.path.exists(pdf_path):
-            pdf_path = pdf_generator.generate_offer_pdf(off, db_company, off.client)
-            off.pdf_path = pdf_path
-            db.commit()
-        pdf_paths.append(pdf_path)
+    return _send_bulk_email(db, "offer", ordered_offers, db_company, req.override_email)
 
-    email_service = WebEmailService()
-    ok, msg = email_service.send_bulk_documents(ordered_offers, db_company, dest_email, pdf_paths, is_offer=True)
-    if not ok:
-        raise HTTPException(status_code=500, detail=msg)
+# --- RENDER JOBS (PDF në sfond, klienti pyet statusin) ---
+def _render_job_url(job: models.RenderJob) -> Optional[str]:
+    if job.status != "done":
+        return None
+    key = os.path.basename(job.pdf_path or "")[:-len(".pdf")]
+    # PDF-të nga cache-i kanë URL të pandryshueshme sipas përmbajtjes
+    if _PDF_KEY_RE.match(key) and job.pdf_path == pdf_generator.cache_path(key):
+        return f"/pdf/{key}.pdf"
+    return f"/render-jobs/{job.id}/pdf"
 
-    return {"success": len(ordered_offers), "failed": 0, "errors": []}
+def _render_job_payload(job: models.RenderJob) -> dict:
+    return {
+        "id": job.id,
+        "doc_type": job.doc_type,
+        "doc_id": job.doc_id,
+        "font_size": job.font_size,
+        "status": job.status,
+        "error": job.error,
+        "url": _render_job_url(job),
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
+
+@app.post("/render-jobs", status_code=202)
+def create_render_job(req: schemas.RenderJobCreate, response: Response, db: Session = Depends(get_db)):
+    model = render_queue.DOCUMENTS.get(req.doc_type)
+    if model is None:
+        raise HTTPException(status_code=400, detail=f"doc_type i panjohur: {req.doc_type}")
+    doc = db.query(model).filter(model.id == req.doc_id).first()
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+    job = render_queue.enqueue(db, req.doc_type, doc, req.font_size)
+    response.headers["Location"] = f"/render-jobs/{job.id}"
+    return _render_job_payload(job)
+
+def _get_render_job(db: Session, job_id: int) -> models.RenderJob:
+    job = db.query(models.RenderJob).filter(models.RenderJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Render job not found")
+    return job
+
+@app.get("/render-jobs/{job_id}")
+def get_render_job(job_id: int, db: Session = Depends(get_db)):
+    return _render_job_payload(_get_render_job(db, job_id))
+
+@app.get("/render-jobs/{job_id}/pdf")
+def get_render_job_pdf(job_id: int, db: Session = Depends(get_db)):
+    job = _get_render_job(db, job_id)
+    if job.status != "done" or not job.pdf_path:
+        raise HTTPException(status_code=409, detail="PDF nuk është gati ende.")
+    if job.pdf_path.startswith(('http://', 'https://')):
+        from fastapi.responses import RedirectResponse
+        return RedirectResponse(job.pdf_path)
+    if not os.path.exists(job.pdf_path):
+        raise HTTPException(status_code=410, detail="PDF nuk ekziston më; krijoni një punë të re.")
+    filename = os.path.basename(job.pdf_path)
+    return FileResponse(
+        job.pdf_path,
+        media_type='application/pdf',
+        filename=filename,
+        headers={"Content-Disposition": f'inline; filename="{filename}"'}
+    )
 
 # --- DASHBOARD ---
+# Statistikat e dashboard-it: 30s në memorie, fshihen pas çdo shkrimi në faturat/ofertat/klientët
+_stats_cache = ttl_cache.TTLCache(ttl=30)
+sync_log.subscribe(_stats_cache.invalidate)
+
 @app.get("/dashboard/stats")
-def get_stats(db: Session = Depends(get_db)):
-    from datetime import datetime, timedelta
-    
-    now = datetime.now()
-    first_day_current_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+async def get_stats(db: AsyncSession = Depends(database.get_async_db)):
+    today = date.today()
+    # Query-t agregate janë të njëjta me ato sync: run_sync i ekzekuton mbi lidhjen async
+    return await _stats_cache.get_or_set_async(today, lambda: db.run_sync(_compute_stats, today))
+
+def _compute_stats(db: Session, today: date):
+    """Një query me agregim kushtor për numrat + një UNION për aktivitetin e fundit."""
+    from datetime import timedelta
+
+    first_day_current_month = today.replace(day=1)
     first_day_prev_month = (first_day_current_month - timedelta(days=1)).replace(day=1)
-    
-    total_invoices = db.query(func.count(models.Invoice.id)).scalar()
-    total_offers = db.query(func.count(models.Offer.id)).scalar()
-    total_revenue = db.query(func.sum(models.Invoice.total)).scalar() or 0
-    total_vat = db.query(func.sum(models.Invoice.vat_amount)).scalar() or 0
-    total_clients = db.query(func.count(models.Client.id)).scalar()
-    
-    # Monthly Stats
-    current_month_revenue = db.query(func.sum(models.Invoice.total)).filter(models.Invoice.date >= first_day_current_month).scalar() or 0
-    prev_month_revenue = db.query(func.sum(models.Invoice.total)).filter(models.Invoice.date >= first_day_prev_month, models.Invoice.date < first_day_current_month).scalar() or 0
-    current_month_invoices = db.query(func.count(models.Invoice.id)).filter(models.Invoice.date >= first_day_current_month).scalar() or 0
-    
+    first_day_year = date(today.year, 1, 1)
+    first_day_next_year = date(today.year + 1, 1, 1)
+
+    inv = models.Invoice
+    in_month = inv.date >= first_day_current_month
+    in_prev_month = and_(inv.date >= first_day_prev_month, inv.date < first_day_current_month)
+    in_year = and_(inv.date >= first_day_year, inv.date < first_day_next_year)
+
+    def sum_if(condition, column):
+        return func.coalesce(func.sum(case((condition, column), else_=0)), 0)
+
+    row = db.query(
+        func.count(inv.id).label("total_invoices"),
+        func.coalesce(func.sum(inv.total), 0).label("total_revenue"),
+        func.coalesce(func.sum(inv.vat_amount), 0).label("total_vat"),
+        sum_if(in_month, inv.total).label("current_month_revenue"),
+        sum_if(in_prev_month, inv.total).label("prev_month_revenue"),
+        sum_if(in_month, 1).label("month_invoices"),
+        sum_if(inv.status == 'paid', 1).label("paid_count"),
+        sum_if(inv.status != 'paid', 1).label("unpaid_count"),
+        sum_if(in_year, inv.total).label("year_revenue"),
+        sum_if(in_year, inv.vat_amount).label("year_vat"),
+        select(func.count(models.Offer.id)).correlate(None).scalar_subquery().label("total_offers"),
+        select(func.count(models.Client.id)).correlate(None).scalar_subquery().label("total_clients"),
+    ).one()
+
+    current_month_revenue = float(row.current_month_revenue)
+    prev_month_revenue = float(row.prev_month_revenue)
+
     # Growth calculation
     growth = 0
     if prev_month_revenue > 0:
         growth = ((current_month_revenue - prev_month_revenue) / prev_month_revenue) * 100
     elif current_month_revenue > 0:
         growth = 100
-        
-    # Status counts
-    paid_count = db.query(func.count(models.Invoice.id)).filter(
-        models.Invoice.status == 'paid'
-    ).scalar() or 0
-    unpaid_count = db.query(func.count(models.Invoice.id)).filter(
-        models.Invoice.status != 'paid'
-    ).scalar() or 0
-
-    # Year stats
-    current_year = now.year
-    year_revenue = db.query(func.sum(models.Invoice.total)).filter(
-        extract('year', models.Invoice.date) == current_year
-    ).scalar() or 0
-    year_vat = db.query(func.sum(models.Invoice.vat_amount)).filter(
-        extract('year', models.Invoice.date) == current_year
-    ).scalar() or 0
-
-    # Recent Activity (simplified)
-    recent_invoices = db.query(models.Invoice).order_by(models.Invoice.created_at.desc()).limit(3).all()
-    recent_offers = db.query(models.Offer).order_by(models.Offer.created_at.desc()).limit(2).all()
+
+    # Recent Activity: 3 faturat + 2 ofertat e fundit në një round trip
+    recent_invoices = select(
+        literal("invoice").label("type"), inv.id, inv.status,
+        inv.invoice_number.label("number"), inv.total.label("amount"),
+        inv.created_at, inv.date, models.Client.name.label("client"),
+    ).outerjoin(models.Client, inv.client_id == models.Client.id).order_by(inv.created_at.desc()).limit(3).subquery()
+    off = models.Offer
+    recent_offers = select(
+        literal("offer").label("type"), off.id, null().label("status"),
+        off.offer_number.label("number"), off.total.label("amount"),
+        off.created_at, off.date, models.Client.name.label("client"),
+    ).outerjoin(models.Client, off.client_id == models.Client.id).order_by(off.created_at.desc()).limit(2).subquery()
+    recent = db.execute(union_all(select(recent_invoices), select(recent_offers))).all()
 
     activity = []
-    for inv in recent_invoices:
-        client_name = (inv.client.name if inv.client else None) or "Klient"
-        activity.append({
-            "type": "invoice",
-            "id": inv.id,
-            "status": getattr(inv, 'status', None),
-            "number": inv.invoice_number,
-            "amount": float(inv.total),
-            "date": (inv.created_at or inv.date).isoformat() if inv.created_at or inv.date else "",
-            "client": client_name
-        })
-    for off in recent_offers:
-        client_name = (off.client.name if off.client else None) or "Klient"
+    for item in recent:
+        when = item.created_at or item.date
         activity.append({
-            "type": "offer",
-            "id": off.id,
-            "status": None,
-            "number": off.offer_number,
-            "amount": float(off.total),
-            "date": (off.created_at or off.date).isoformat() if off.created_at or off.date else "",
-            "client": client_name
+            "type": item.type,
+            "id": item.id,
+            "status": item.status,
+            "number": item.number,
+            "amount": float(item.amount or 0),
+            "date": when.isoformat() if when else "",
+            "client": item.client or "Klient"
         })
 
     # Sort activity by date
     activity.sort(key=lambda x: x['date'], reverse=True)
 
     return {
-        "total_invoices": total_invoices,
-        "total_offers": total_offers,
-        "total_revenue": float(total_revenue),
-        "total_vat": float(total_vat),
-        "total_clients": total_clients,
-        "current_month_revenue": float(current_month_revenue),
-        "month_invoices": current_month_invoices,
+        "total_invoices": row.total_invoices,
+        "total_offers": row.total_offers,
+        "total_revenue": float(row.total_revenue),
+        "total_vat": float(row.total_vat),
+        "total_clients": row.total_clients,
+        "current_month_revenue": current_month_revenue,
+        "month_invoices": int(row.month_invoices),
         "growth": round(growth, 1),
-        "paid_count": paid_count,
-        "unpaid_count": unpaid_count,
-        "year_revenue": round(float(year_revenue), 2),
-        "year_vat": round(float(year_vat), 2),
+        "paid_count": int(row.paid_count),
+        "unpaid_count": int(row.unpaid_count),
+        "year_revenue": round(float(row.year_revenue), 2),
+        "year_vat": round(float(row.year_vat), 2),
         "recent_activity": activity[:5]
     }
 
 @app.get("/dashboard/monthly")
 def get_monthly_stats(db: Session = Depends(get_db)):
-    from calendar import monthrange
-    from datetime import date, datetime
+    from datetime import datetime
     now = datetime.now()
     month_names = ['Jan','Shk','Mar','Pri','Maj','Qer','Kor','Gus','Sht','Tet','Nën','Dhj']
-    result = []
+    months = []
     for i in range(11, -1, -1):
         m = now.month - i
         y = now.year
         while m <= 0:
             m += 12
             y -= 1
-        _, last = monthrange(y, m)
-        start = date(y, m, 1)
-        end = date(y, m, last)
-        revenue = db.query(func.sum(models.Invoice.total)).filter(
-            models.Invoice.date >= start,
-            models.Invoice.date <= end
-        ).scalar() or 0
-        count = db.query(func.count(models.Invoice.id)).filter(
-            models.Invoice.date >= start,
-            models.Invoice.date <= end
-        ).scalar() or 0
+        months.append((y, m))
+    # 12 rreshta nga monthly_rollups në vend të 24 queries mbi faturat
+    rows = rollups.monthly(db, "invoice", months[0], months[-1])
+    result = []
+    for y, m in months:
+        row = rows.get((y, m))
         result.append({
             "month": month_names[m - 1],
-            "revenue": round(float(revenue), 2),
-            "count": count
+            "revenue": round(float(row.revenue), 2) if row else 0.0,
+            "count": row.doc_count if row else 0
         })
     return result
 
 # --- COMPANY ---
 @app.get("/company", response_model=schemas.Company)
-def get_company(db: Session = Depends(get_db)):
+def get_company(
+    request: Request,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    etag = _collection_etag(request, db.query(*http_cache.stamp_columns(models.Company)))
+    if http_cache.matches(if_none_match, etag):
+        return http_cache.not_modified(etag)
     db_company = db.query(models.Company).first()
     if db_company is None:
         # Krijo kompani të zbrazët në hyrjen e parë – përdoruesi mund ta plotësojë nga Cilësimet
@@ -1182,6 +1770,8 @@ def get_company(db: Session = Depends(get_db)):
         db.add(db_company)
         db.commit()
         db.refresh(db_company)
+    else:
+        http_cache.apply_headers(response, etag)
     return db_company
 
 @app.put("/company", response_model=schemas.Company)
@@ -1199,8 +1789,8 @@ def update_company(company_update: schemas.CompanyUpdate, db: Session = Depends(
     db.refresh(db_company)
     return db_company
 
-@app.post("/company/logo", response_model=schemas.Company)
-def upload_company_logo(file: UploadFile = File(...), db: Session = Depends(get_db)):
+def _upload_logo(file: UploadFile, db: Session, attr: str, basename: str):
+    """Ruan logon e normalizuar (PNG) dhe llogarit menjëherë ikonat që varen prej saj."""
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="Lejohen vetëm imazhe për logo.")
 
@@ -1208,96 +1798,83 @@ def upload_company_logo(file: UploadFile = File(...), db: Session = Depends(get_
     if db_company is None:
         raise HTTPException(status_code=404, detail="Company not found")
 
+    try:
+        data = logo_variants.normalize_upload(file.file.read())
+    except Exception:
+        raise HTTPException(status_code=400, detail="Imazhi i logos nuk mund të lexohet.")
+
     upload_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
     os.makedirs(upload_dir, exist_ok=True)
+    filename = f"{basename}.png"
+    with open(os.path.join(upload_dir, filename), "wb") as buffer:
+        buffer.write(data)
 
-    ext = os.path.splitext(file.filename or "")[1].lower() or ".png"
-    filename = f"company_logo{ext}"
-    file_path = os.path.join(upload_dir, filename)
-
-    with open(file_path, "wb") as buffer:
-        buffer.write(file.file.read())
-
-    db_company.logo_path = os.path.join("uploads", filename).replace("\\", "/")
+    setattr(db_company, attr, os.path.join("uploads", filename).replace("\\", "/"))
     db.commit()
     db.refresh(db_company)
+    try:
+        logo_variants.generate_all(db_company, logo_variants.names_for(attr))
+    except Exception as e:
+        import logging
+        logging.warning(f"Logo variants not generated: {e}")
     return db_company
 
+@app.post("/company/logo", response_model=schemas.Company)
+def upload_company_logo(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    return _upload_logo(file, db, "logo_path", "company_logo")
+
 @app.post("/company/logo-light", response_model=schemas.Company)
 def upload_company_logo_light(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    if not file.content_type or not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="Lejohen vetëm imazhe për logo.")
-    db_company = db.query(models.Company).first()
-    if db_company is None:
-        raise HTTPException(status_code=404, detail="Company not found")
-    upload_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
-    os.makedirs(upload_dir, exist_ok=True)
-    ext = os.path.splitext(file.filename or "")[1].lower() or ".png"
-    filename = f"company_logo_light{ext}"
-    file_path = os.path.join(upload_dir, filename)
-    with open(file_path, "wb") as buffer:
-        buffer.write(file.file.read())
-    db_company.logo_light_path = os.path.join("uploads", filename).replace("\\", "/")
-    db.commit()
-    db.refresh(db_company)
-    return db_company
+    return _upload_logo(file, db, "logo_light_path", "company_logo_light")
 
 @app.post("/company/logo-dark", response_model=schemas.Company)
 def upload_company_logo_dark(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    if not file.content_type or not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="Lejohen vetëm imazhe për logo.")
-
-    db_company = db.query(models.Company).first()
-    if db_company is None:
-        raise HTTPException(status_code=404, detail="Company not found")
-
-    upload_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
-    os.makedirs(upload_dir, exist_ok=True)
+    return _upload_logo(file, db, "logo_dark_path", "company_logo_dark")
 
-    ext = os.path.splitext(file.filename or "")[1].lower() or ".png"
-    filename = f"company_logo_dark{ext}"
-    file_path = os.path.join(upload_dir, filename)
+ICON_MAX_AGE = "public, max-age=86400"
+ICON_IMMUTABLE = "public, max-age=31536000, immutable"
 
-    with open(file_path, "wb") as buffer:
-        buffer.write(file.file.read())
-
-    db_company.logo_dark_path = os.path.join("uploads", filename).replace("\\", "/")
-    db.commit()
-    db.refresh(db_company)
-    return db_company
+def _icon_response(db: Session, name: str, v: Optional[str], if_none_match: Optional[str]):
+    """
+    Varianti i ikonës nga disku me ETag = çelësi i përmbajtjes.
+    URL-të me ?v= të barabartë me çelësin aktual (nga manifest-i) ruhen 1 vit; të tjerat 1 ditë.
+    None kur kompania nuk ka logo (thirrësi kthen ikonën default).
+    """
+    try:
+        variant = logo_variants.get(config_cache.company(db), name)
+    except Exception as e:
+        import logging
+        logging.warning(f"Icon {name} unavailable: {e}")
+        return None
+    if variant is None:
+        return None
+    etag = f'"{variant.key}"'
+    headers = {"ETag": etag, "Cache-Control": ICON_IMMUTABLE if v == variant.key else ICON_MAX_AGE}
+    if http_cache.matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(variant.path, media_type="image/png", headers=headers)
 
 @app.get("/logo.png")
-def get_logo_icon(db: Session = Depends(get_db), size: int = 512):
+def get_logo_icon(
+    db: Session = Depends(get_db),
+    size: int = 512,
+    v: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+):
     """
     Kthen logo-n e kompanisë të optimizuar për PWA.
-    Konverton dhe resize-on logo-n në madhësi të specifikuar (default 512x512).
+    192 dhe 512 shërbehen nga variantet e llogaritura (logo_variants); madhësitë e tjera renderohen sipas kërkesës.
     """
-    from datetime import datetime
     from io import BytesIO
     from PIL import Image as PILImage, ImageDraw, ImageFont
-    import tempfile
-    
-    print(f"[DEBUG] Fetching logo.png at {datetime.now()}, size={size}")
-
-    company = db.query(models.Company).first()
-    logo_path = None
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-
-    # Prefero logo_light_path për display, pastaj logo_path si fallback
-    for attr in ['logo_light_path', 'logo_path']:
-        val = getattr(company, attr, None) if company else None
-        if val:
-            full_path = os.path.join(base_dir, val.replace("\\", "/").lstrip("/"))
-            if os.path.exists(full_path):
-                logo_path = full_path
-                break
 
-    # Fallback: try to serve from frontend public folder
-    if not logo_path:
-        frontend_public = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "public", "icon-512.png")
-        if os.path.exists(frontend_public):
-            logo_path = frontend_public
-    
+    if size in (192, 512):
+        response = _icon_response(db, f"icon-{size}", v, if_none_match)
+        if response is not None:
+            return response
+
+    company = config_cache.company(db)
+    logo_path = logo_variants.source_path(company, "icon-512")
     if logo_path:
         try:
             data = _get_logo_bytes(logo_path, size)
@@ -1360,108 +1937,38 @@ def get_logo_icon(db: Session = Depends(get_db), size: int = 512):
         return JSONResponse({"error": "Icon not found"}, status_code=404)
 
 @app.get("/logo-dark.png")
-def get_logo_dark_icon(db: Session = Depends(get_db)):
+def get_logo_dark_icon(
+    db: Session = Depends(get_db),
+    v: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+):
     """Kthen logon dark të kompanisë (publike, pa auth)."""
-    from io import BytesIO
-    from PIL import Image as PILImage
-
-    company = db.query(models.Company).first()
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    logo_path = None
-
-    # Provo vetëm dark logo; fallback tek logo_path (PDF) - jo logo_light_path
-    for path_attr in ['logo_dark_path', 'logo_path']:
-        attr = getattr(company, path_attr, None) if company else None
-        if attr:
-            full = os.path.join(base_dir, attr.replace("\\", "/").lstrip("/"))
-            if os.path.exists(full):
-                logo_path = full
-                break
-
-    if logo_path:
-        try:
-            data = _get_logo_bytes(logo_path, 512)
-            return Response(content=data, media_type="image/png",
-                            headers={"Cache-Control": "public, max-age=3600"})
-        except Exception:
-            return FileResponse(logo_path, media_type="image/png")
-
+    # Vetëm dark logo; fallback tek logo_path (PDF) - jo logo_light_path
+    response = _icon_response(db, "dark-512", v, if_none_match)
+    if response is not None:
+        return response
     return JSONResponse({"error": "Dark logo not found"}, status_code=404)
 
 @app.get("/apple-touch-icon.png")
-def get_apple_touch_icon(db: Session = Depends(get_db)):
+def get_apple_touch_icon(
+    db: Session = Depends(get_db),
+    v: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+):
     """
     Kthen apple-touch-icon të optimizuar për iOS (180x180).
     iOS kërkon background të bardhë dhe madhësi saktësisht 180x180.
     """
-    from datetime import datetime
     from io import BytesIO
     from PIL import Image as PILImage, ImageDraw, ImageFont
     
     size = 180  # iOS kërkon saktësisht 180x180
-    print(f"[DEBUG] Fetching apple-touch-icon.png at {datetime.now()}")
-    
-    company = db.query(models.Company).first()
-    logo_path = None
-    
-    if company and company.logo_path:
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        full_path = os.path.join(base_dir, company.logo_path.replace("\\", "/").lstrip("/"))
-        if os.path.exists(full_path):
-            logo_path = full_path
-    
-    # Fallback: try to serve from frontend public folder
-    if not logo_path:
-        frontend_public = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "public", "icon-512.png")
-        if os.path.exists(frontend_public):
-            logo_path = frontend_public
-    
-    if logo_path:
-        try:
-            # Hap logo-n me PIL
-            img = PILImage.open(logo_path)
-            
-            # Konverto në RGBA nëse nuk është
-            if img.mode != 'RGBA':
-                img = img.convert('RGBA')
-            
-            # Krijon një background të bardhë (iOS kërkon background të bardhë, jo transparent)
-            background = PILImage.new('RGB', (size, size), (255, 255, 255))
-            
-            # Llogarit dimensionet për të mbajtur aspect ratio dhe të përshtatet brenda
-            # Lëmë pak padding (10%) për të shmangur që logoja të prekë skajet
-            max_size = int(size * 0.8)
-            img.thumbnail((max_size, max_size), PILImage.Resampling.LANCZOS)
-            
-            # Vendos logo-n në qendër të background-it
-            x_offset = (size - img.width) // 2
-            y_offset = (size - img.height) // 2
-            
-            # Nëse logoja ka transparency, përdor mask
-            if img.mode == 'RGBA':
-                background.paste(img, (x_offset, y_offset), img)
-            else:
-                background.paste(img, (x_offset, y_offset))
-            
-            # Ruaj në buffer
-            buffer = BytesIO()
-            background.save(buffer, format='PNG', optimize=True)
-            buffer.seek(0)
-            
-            return Response(
-                content=buffer.getvalue(),
-                media_type="image/png",
-                headers={
-                    "Cache-Control": "no-cache, no-store, must-revalidate, max-age=0",
-                    "Pragma": "no-cache",
-                    "Expires": "0"
-                }
-            )
-        except Exception as e:
-            print(f"[ERROR] Error processing apple-touch-icon: {e}")
-            # Nëse ka gabim, krijo default
-            pass
-    
+    response = _icon_response(db, "apple-180", v, if_none_match)
+    if response is not None:
+        return response
+
+    company = config_cache.company(db)
+
     # Fallback: Krijon një logo default me emrin e kompanisë
     try:
         company_name = company.name if company and company.name else "HOLKOS"
@@ -1508,9 +2015,7 @@ def get_apple_touch_icon(db: Session = Depends(get_db)):
             content=buffer.getvalue(),
             media_type="image/png",
             headers={
-                "Cache-Control": "no-cache, no-store, must-revalidate, max-age=0",
-                "Pragma": "no-cache",
-                "Expires": "0"
+                "Cache-Control": "public, max-age=3600"
             }
         )
     except Exception as e:
@@ -1520,20 +2025,21 @@ def get_apple_touch_icon(db: Session = Depends(get_db)):
 # --- SETTINGS ---
 @app.get("/settings/feature-payment-status")
 def get_feature_payment_status(db: Session = Depends(get_db)):
-    setting = db.query(models.Setting).filter(models.Setting.setting_key == "feature_payment_status").first()
-    enabled = True if not setting else (setting.setting_value == "true")
-    return {"enabled": enabled}
+    return {"enabled": config_cache.get(db).flag("feature_payment_status", True)}
 
 @app.get("/manifest.webmanifest")
 def get_manifest(db: Session = Depends(get_db)):
-    from datetime import datetime
-    print(f"[DEBUG] Fetching manifest.webmanifest at {datetime.now()}")
-    
-    # Përdorim rrugën tonë të rregullt /logo.png që është më e stabilmja për Safari
-    # Shtojmë një timestamp të thjeshtë për të shmangur cache probleme
-    import time
-    timestamp = int(time.time() / 60)  # Ndryshon çdo minutë
-    
+    # Përdorim rrugën tonë të rregullt /logo.png që është më e stabilmja për Safari;
+    # v = çelësi i përmbajtjes së ikonës: ndryshon vetëm kur ndryshon logoja
+    company = config_cache.company(db)
+
+    def icon_version(name):
+        try:
+            variant = logo_variants.get(company, name)
+        except Exception:
+            variant = None
+        return variant.key if variant else "0"
+
     return JSONResponse(
         {
             "name": "Holkos Fatura",
@@ -1547,13 +2053,13 @@ def get_manifest(db: Session = Depends(get_db)):
             "theme_color": "#111827",
             "icons": [
                 {
-                    "src": f"/logo.png?size=192&v={timestamp}",
+                    "src": f"/logo.png?size=192&v={icon_version('icon-192')}",
                     "sizes": "192x192",
                     "type": "image/png",
                     "purpose": "any"
                 },
                 {
-                    "src": f"/logo.png?size=512&v={timestamp}",
+                    "src": f"/logo.png?size=512&v={icon_version('icon-512')}",
                     "sizes": "512x512",
                     "type": "image/png",
                     "purpose": "any maskable"
@@ -1582,9 +2088,7 @@ def update_feature_payment_status(payload: dict, db: Session = Depends(get_db)):
 
 @app.get("/settings/navbar-combined")
 def get_navbar_combined(db: Session = Depends(get_db)):
-    setting = db.query(models.Setting).filter(models.Setting.setting_key == "navbar_combined").first()
-    combined = True if not setting else (setting.setting_value == "true")
-    return {"combined": combined}
+    return {"combined": config_cache.get(db).flag("navbar_combined", True)}
 
 
 @app.put("/settings/navbar-combined")
@@ -1602,9 +2106,13 @@ def update_navbar_combined(payload: dict, db: Session = Depends(get_db)):
 
 
 # --- RAPORTI MUJOR I FATURAVE (automatizim end-of-month) ---
-def _get_setting(db: Session, key: str, default: str = "") -> str:
-    s = db.query(models.Setting).filter(models.Setting.setting_key == key).first()
-    return s.setting_value if s and s.setting_value is not None else default
+def _monthly_report_settings(db: Session) -> dict:
+    config = config_cache.get(db)
+    return {
+        "enabled": config.flag("monthly_report_enabled", False),
+        "invoices_email": config.setting("monthly_report_invoices_email"),
+        "status_email": config.setting("monthly_report_status_email"),
+    }
 
 
 def _set_setting(db: Session, key: str, value: str):
@@ -1619,11 +2127,7 @@ def _set_setting(db: Session, key: str, value: str):
 @app.get("/settings/monthly-report")
 def get_monthly_report(db: Session = Depends(get_db)):
     """Cilësimet e raportit mujor: a është aktiv + dy adresat e email-it."""
-    return {
-        "enabled": _get_setting(db, "monthly_report_enabled", "false") == "true",
-        "invoices_email": _get_setting(db, "monthly_report_invoices_email", ""),
-        "status_email": _get_setting(db, "monthly_report_status_email", ""),
-    }
+    return _monthly_report_settings(db)
 
 
 @app.put("/settings/monthly-report")
@@ -1635,16 +2139,21 @@ def update_monthly_report(payload: dict, db: Session = Depends(get_db)):
     if "status_email" in payload:
         _set_setting(db, "monthly_report_status_email", (payload.get("status_email") or "").strip())
     db.commit()
-    return {
-        "enabled": _get_setting(db, "monthly_report_enabled", "false") == "true",
-        "invoices_email": _get_setting(db, "monthly_report_invoices_email", ""),
-        "status_email": _get_setting(db, "monthly_report_status_email", ""),
-    }
+    return _monthly_report_settings(db)
 
 
 # --- TEMPLATES ---
 @app.get("/templates", response_model=List[schemas.Template])
-def get_templates(db: Session = Depends(get_db)):
+def get_templates(
+    request: Request,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    etag = _collection_etag(request, db.query(*http_cache.stamp_columns(models.Template)))
+    if http_cache.matches(if_none_match, etag):
+        return http_cache.not_modified(etag)
+    http_cache.apply_headers(response, etag)
     return db.query(models.Template).order_by(models.Template.is_default.desc(), models.Template.name).all()
 
 @app.put("/templates/{template_id}/default", response_model=schemas.Template)
@@ -1737,7 +2246,7 @@ def preview_offer_pdf_get(preview_id: str, font_size: str = Query(None), db: Ses
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid offer data: {str(e)}")
     
-    db_company = db.query(models.Company).first()
+    db_company = config_cache.company(db)
     db_client = db.query(models.Client).filter(models.Client.id == offer.client_id).first()
     
     if not db_client:
@@ -1753,7 +2262,7 @@ def preview_offer_pdf_get(preview_id: str, font_size: str = Query(None), db: Ses
 def preview_offer_pdf(offer: schemas.OfferCreate, font_size: str = Query(None), db: Session = Depends(get_db)):
     """Gjeneron PDF për preview pa e ruajtur ofertën në database"""
     
-    db_company = db.query(models.Company).first()
+    db_company = config_cache.company(db)
     db_client = db.query(models.Client).filter(models.Client.id == offer.client_id).first()
     
     if not db_client:
@@ -1766,83 +2275,151 @@ def preview_offer_pdf(offer: schemas.OfferCreate, font_size: str = Query(None),
     return FileResponse(pdf_path, media_type='application/pdf', filename=f"Preview_{temp_offer.offer_number.replace(' ', '_')}.pdf", content_disposition_type='inline')
 
 @app.get("/offers/{offer_id}/pdf")
-def get_offer_pdf(offer_id: int, font_size: str = None, db: Session = Depends(get_db)):
+def get_offer_pdf(offer_id: int, font_size: str = None, if_none_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
     db_offer = db.query(models.Offer).filter(models.Offer.id == offer_id).first()
     if not db_offer:
         raise HTTPException(status_code=404, detail="Offer not found")
-    
-    # Check if PDF already exists
-    if db_offer.pdf_path:
-        if db_offer.pdf_path.startswith(('http://', 'https://')):
-            from fastapi.responses import RedirectResponse
-            return RedirectResponse(db_offer.pdf_path)
-        elif os.path.exists(db_offer.pdf_path):
-            return FileResponse(
-                db_offer.pdf_path, 
-                media_type='application/pdf', 
-                filename=os.path.basename(db_offer.pdf_path), 
-                content_disposition_type='inline'
-            )
 
-    db_company = db.query(models.Company).first()
+    db_company = config_cache.company(db)
     db_client = db.query(models.Client).filter(models.Client.id == db_offer.client_id).first()
-    
-    pdf_path = pdf_generator.generate_offer_pdf(db_offer, db_company, db_client, manual_font_size=font_size)
-    
-    # Only save path if it's not a custom font size preview
-    if not font_size:
-        db_offer.pdf_path = pdf_path
-        db.commit()
-    
-    return FileResponse(pdf_path, media_type='application/pdf', filename=os.path.basename(pdf_path), content_disposition_type='inline')
 
-@app.post("/invoices/{invoice_id}/email")
+    # Çdo madhësi fonti ka variantin e vet në cache; pdf_path ruan vetëm atë standard
+    location, key = _document_pdf("offer", db_offer, db_company, db_client, font_size=font_size)
+    return _pdf_response(location, key, pdf_generator.document_filename("offer", db_offer), if_none_match)
+
+@app.post("/invoices/{invoice_id}/email", status_code=202)
 def email_invoice(invoice_id: int, payload: Optional[schemas.EmailRequest] = Body(None), db: Session = Depends(get_db)):
-    db_invoice = db.query(models.Invoice).filter(models.Invoice.id == invoice_id).first()
-    if not db_invoice:
-        raise HTTPException(status_code=404, detail="Invoice not found")
-    
-    db_company = db.query(models.Company).first()
-    db_client = db.query(models.Client).filter(models.Client.id == db_invoice.client_id).first()
-    
-    dest_email = (payload and payload.dest_email) or None
-    if not dest_email:
-        dest_email = db_client.email if db_client else None
-    if not dest_email:
-        raise HTTPException(status_code=400, detail="Klienti nuk ka adresë email-i.")
-        
-    pdf_path = pdf_generator.generate_invoice_pdf(db_invoice, db_company, db_client)
-    
-    success, message = email_service.send_document(db_invoice, db_company, dest_email, pdf_path, is_offer=False)
-    
-    if not success:
-        raise HTTPException(status_code=500, detail=message)
-        
-    return {"message": message}
+    """Email-i futet në radhë (email_outbox) dhe dërgohet në sfond; statusi: GET /email-outbox/{id}."""
+    message = _enqueue_email(db, "invoice", invoice_id, payload and payload.dest_email)
+    return {"message": "Email-i u fut në radhë për dërgim.", **_outbox_payload(message)}
 
-@app.post("/offers/{offer_id}/email")
+@app.post("/offers/{offer_id}/email", status_code=202)
 def email_offer(offer_id: int, payload: Optional[schemas.EmailRequest] = Body(None), db: Session = Depends(get_db)):
-    db_offer = db.query(models.Offer).filter(models.Offer.id == offer_id).first()
-    if not db_offer:
-        raise HTTPException(status_code=404, detail="Offer not found")
-    
-    db_company = db.query(models.Company).first()
-    db_client = db.query(models.Client).filter(models.Client.id == db_offer.client_id).first()
-    
-    dest_email = (payload and payload.dest_email) or None
+    """Email-i futet në radhë (email_outbox) dhe dërgohet në sfond; statusi: GET /email-outbox/{id}."""
+    message = _enqueue_email(db, "offer", offer_id, payload and payload.dest_email)
+    return {"message": "Email-i u fut në radhë për dërgim.", **_outbox_payload(message)}
+
+# --- PROFILET E KËRKESAVE (profiler.py) ---
+def _profile_payload(profile: models.RequestProfile) -> dict:
+    return {
+        "id": profile.id,
+        "method": profile.method,
+        "path": profile.path,
+        "route": profile.route,
+        "status_code": profile.status_code,
+        "duration_ms": profile.duration_ms,
+        "sample_count": profile.sample_count,
+        "query_count": profile.query_count,
+        "query_ms": profile.query_ms,
+        "created_at": profile.created_at,
+        "speedscope_url": f"/debug/profiles/{profile.id}/speedscope.json",
+    }
+
+def _get_profile(db: Session, profile_id: str) -> models.RequestProfile:
+    profile = db.get(models.RequestProfile, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profili nuk u gjet.")
+    return profile
+
+@app.get("/debug/profiles")
+def list_profiles(limit: int = Query(20, ge=1, le=profiler.PROFILE_KEEP), db: Session = Depends(get_db)):
+    """Profilet më të fundit (pa mostrat); kërkesat profilizohen me `X-Profile: 1` ose `?profile=1`."""
+    query = db.query(models.RequestProfile).options(
+        defer(models.RequestProfile.speedscope), defer(models.RequestProfile.queries)
+    ).order_by(models.RequestProfile.created_at.desc(), models.RequestProfile.id)
+    return [_profile_payload(p) for p in query.limit(limit)]
+
+@app.get("/debug/profiles/{profile_id}")
+def get_profile(profile_id: str, db: Session = Depends(get_db)):
+    """Të dhënat e profilit dhe query-t SQL me fillimin dhe kohëzgjatjen e tyre (ms)."""
+    profile = _get_profile(db, profile_id)
+    return {**_profile_payload(profile), "queries": json.loads(profile.queries or "[]")}
+
+@app.get("/debug/profiles/{profile_id}/speedscope.json")
+def get_profile_speedscope(profile_id: str, db: Session = Depends(get_db)):
+    """Mostrat në formatin speedscope – hapet te https://www.speedscope.app."""
+    profile = _get_profile(db, profile_id)
+    return Response(
+        content=profile.speedscope,
+        media_type="application/json",
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile.id}.speedscope.json"'},
+    )
+
+# --- EMAIL OUTBOX (dërgimi në sfond me ripërpjekje) ---
+def _outbox_payload(message: models.OutboxEmail) -> dict:
+    return {
+        "id": message.id,
+        "doc_type": message.doc_type,
+        "doc_id": message.doc_id,
+        "dest_email": message.dest_email,
+        "status": message.status,
+        "attempts": message.attempts,
+        "next_attempt_at": message.next_attempt_at,
+        "error": message.error,
+        "created_at": message.created_at,
+        "sent_at": message.sent_at,
+    }
+
+def _enqueue_email(db: Session, doc_type: str, doc_id: int, dest_email: Optional[str] = None) -> models.OutboxEmail:
+    """Validimi bëhet menjëherë (dokumenti, marrësi, SMTP); renderimi dhe dërgimi në sfond."""
+    if doc_type not in email_outbox.DOCUMENTS:
+        raise HTTPException(status_code=400, detail=f"doc_type i panjohur: {doc_type}")
+    model = render_queue.DOCUMENTS[doc_type]
+    doc = db.query(model).filter(model.id == doc_id).first()
+    if not doc:
+        raise HTTPException(status_code=404, detail="Invoice not found" if doc_type == "invoice" else "Offer not found")
     if not dest_email:
+        db_client = db.query(models.Client).filter(models.Client.id == doc.client_id).first()
         dest_email = db_client.email if db_client else None
     if not dest_email:
         raise HTTPException(status_code=400, detail="Klienti nuk ka adresë email-i.")
-        
-    pdf_path = pdf_generator.generate_offer_pdf(db_offer, db_company, db_client, manual_font_size=None)
-    
-    success, message = email_service.send_document(db_offer, db_company, dest_email, pdf_path, is_offer=True)
-    
-    if not success:
-        raise HTTPException(status_code=500, detail=message)
-        
-    return {"message": message}
+    db_company = config_cache.company(db)
+    if not db_company or not db_company.smtp_user or not db_company.smtp_password:
+        raise HTTPException(status_code=400, detail="Cilësimet e email-it (SMTP) nuk janë konfiguruar në Cilësimet.")
+    return email_outbox.enqueue(db, doc_type, doc_id, dest_email)
+
+def _get_outbox_email(db: Session, message_id: int) -> models.OutboxEmail:
+    message = db.query(models.OutboxEmail).filter(models.OutboxEmail.id == message_id).first()
+    if not message:
+        raise HTTPException(status_code=404, detail="Email not found")
+    return message
+
+@app.post("/email-outbox", status_code=202)
+def create_outbox_email(req: schemas.OutboxEmailCreate, response: Response, db: Session = Depends(get_db)):
+    message = _enqueue_email(db, req.doc_type, req.doc_id, req.dest_email)
+    response.headers["Location"] = f"/email-outbox/{message.id}"
+    return _outbox_payload(message)
+
+@app.get("/email-outbox")
+def list_outbox_emails(
+    status: Optional[str] = None,
+    doc_type: Optional[str] = None,
+    doc_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=pagination.MAX_LIMIT),
+    db: Session = Depends(get_db)
+):
+    """Email-et më të fundit, opsionalisht sipas statusit ose dokumentit."""
+    query = db.query(models.OutboxEmail)
+    if status:
+        query = query.filter(models.OutboxEmail.status == status)
+    if doc_type:
+        query = query.filter(models.OutboxEmail.doc_type == doc_type)
+    if doc_id is not None:
+        query = query.filter(models.OutboxEmail.doc_id == doc_id)
+    return [_outbox_payload(m) for m in query.order_by(models.OutboxEmail.id.desc()).limit(limit)]
+
+@app.get("/email-outbox/{message_id}")
+def get_outbox_email(message_id: int, db: Session = Depends(get_db)):
+    return _outbox_payload(_get_outbox_email(db, message_id))
+
+@app.post("/email-outbox/{message_id}/retry")
+def retry_outbox_email(message_id: int, db: Session = Depends(get_db)):
+    message = _get_outbox_email(db, message_id)
+    if message.status == "sent":
+        raise HTTPException(status_code=409, detail="Email-i është dërguar tashmë.")
+    if message.status == "sending" and not email_outbox.is_stale(message):
+        raise HTTPException(status_code=409, detail="Email-i po dërgohet.")
+    return _outbox_payload(email_outbox.retry(db, message))
 
 if __name__ == "__main__":
     import uvicorn
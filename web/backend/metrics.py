@@ -0,0 +1,256 @@
+"""Metrika të procesit: GET /metrics (formati tekst i Prometheus) dhe header-i Server-Timing.
+
+MetricsMiddleware mat çdo kërkesë HTTP sipas shabllonit të rrugës (p.sh. /invoices/{invoice_id},
+jo id-ja konkrete). Eventet before/after_cursor_execute të engine-ve numërojnë query-t dhe kohën
+në DB; `timer()` mat renderimet e PDF-ve dhe dërgimet SMTP. Matjet e kërkesës aktuale mbahen në
+një ContextVar (kalon edhe te thread-et e endpoint-eve sync), ndaj shkojnë edhe te Server-Timing.
+Vlerat janë për proces: në Vercel/me disa workers çdo instancë raporton vetëm veten.
+"""
+import hmac
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+RENDER_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def _label_text(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, labels: tuple = ()):
+        self.name, self.doc, self.labels = name, doc, labels
+        self._lock = threading.Lock()
+        self._values: dict = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_label_text(self.labels, key)} {_number(value)}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.doc, self.labels, self.buckets = name, doc, labels, buckets
+        self._lock = threading.Lock()
+        # çelësi i etiketave -> [numrat sipas bucket-it (jo kumulativë), shuma, numri]
+        self._values: dict = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][idx] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="{}"'.format(_number(bound))
+                yield f"{self.name}_bucket{_label_text(self.labels, key, le)} {cumulative}"
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_label_text(self.labels, key, le)} {count}"
+            yield f"{self.name}_sum{_label_text(self.labels, key)} {_number(total)}"
+            yield f"{self.name}_count{_label_text(self.labels, key)} {count}"
+
+
+REQUESTS = Counter("http_requests_total", "Kërkesat HTTP sipas rrugës dhe statusit.", ("method", "route", "status"))
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Kohëzgjatja e kërkesave HTTP.", ("method", "route"))
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries", "Query-t në DB për kërkesë.", ("method", "route"), QUERY_COUNT_BUCKETS
+)
+REQUEST_DB_SECONDS = Histogram("http_request_db_seconds", "Koha në DB për kërkesë.", ("method", "route"))
+DB_QUERIES = Counter("db_queries_total", "Të gjitha query-t (edhe jashtë kërkesave: radha, outbox).")
+DB_SECONDS = Counter("db_query_seconds_total", "Koha totale e query-ve.")
+PDF_RENDER_SECONDS = Histogram("pdf_render_seconds", "Renderimi i një PDF-je (cache miss).", ("kind",), RENDER_BUCKETS)
+RENDER_JOB_SECONDS = Histogram(
+    "render_job_seconds", "Punët e render_queue nga marrja te përfundimi.", ("doc_type", "status"), RENDER_BUCKETS
+)
+SMTP_SEND_SECONDS = Histogram("smtp_send_seconds", "Dërgimi i një mesazhi SMTP.", ("result",), RENDER_BUCKETS)
+
+REGISTRY = (
+    REQUESTS, REQUEST_SECONDS, REQUEST_DB_QUERIES, REQUEST_DB_SECONDS, DB_QUERIES, DB_SECONDS,
+    PDF_RENDER_SECONDS, RENDER_JOB_SECONDS, SMTP_SEND_SECONDS,
+)
+
+
+def render_text() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.doc}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+def authorized(token: str | None, verify) -> bool:
+    """METRICS_TOKEN (për scraper-in) ose një token i vlefshëm përdoruesi (`verify`)."""
+    if not token:
+        return False
+    if METRICS_TOKEN and hmac.compare_digest(token.encode("utf-8"), METRICS_TOKEN.encode("utf-8")):
+        return True
+    return bool(verify(token))
+
+
+# --- MATJET E KËRKESËS AKTUALE ---
+class RequestStats:
+    __slots__ = ("started", "db_queries", "db_seconds", "segments", "statements")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.segments: dict = {}
+        # Lista vetëm kur kërkesa profilizohet (profiler.py): (fillimi, kohëzgjatja, SQL)
+        self.statements = None
+
+    def add(self, name: str, seconds: float):
+        self.segments[name] = self.segments.get(name, 0.0) + seconds
+
+
+_current: ContextVar = ContextVar("request_metrics", default=None)
+
+
+def current_stats():
+    """Matjet e kërkesës aktuale (None jashtë MetricsMiddleware)."""
+    return _current.get()
+
+
+@contextmanager
+def timer(histogram: Histogram, segment: str, **labels):
+    """
+    Mat bllokun te `histogram` dhe te segmenti `segment` i Server-Timing të kërkesës aktuale.
+    Për histogramet me etiketën `result`, një exception e regjistron si result="error".
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if "result" in histogram.labels:
+            labels["result"] = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        histogram.observe(elapsed, **labels)
+        stats = _current.get()
+        if stats is not None:
+            stats.add(segment, elapsed)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    DB_QUERIES.inc()
+    DB_SECONDS.inc(elapsed)
+    stats = _current.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_seconds += elapsed
+        if stats.statements is not None:
+            stats.statements.append((started - stats.started, elapsed, statement))
+
+
+def install(*engines):
+    """Regjistron eventet e cursor-it te engine-t (për AsyncEngine: te sync_engine i tij)."""
+    for engine in engines:
+        if engine is None:
+            continue
+        engine = getattr(engine, "sync_engine", engine)
+        if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def server_timing(stats: RequestStats, total: float) -> str:
+    parts = [f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.db_queries} queries"']
+    parts += [f"{name};dur={seconds * 1000:.1f}" for name, seconds in stats.segments.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI: kohëzgjatja, statusi dhe query-t e çdo kërkese. Server-Timing shtohet kur
+    nis përgjigja; për përgjigjet në rrjedhë histogrami përfshin edhe dërgimin e trupit.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(stats, time.perf_counter() - started).encode("latin-1")))
+                headers.append((b"timing-allow-origin", b"*"))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - started
+            # Router-i vendos scope["route"]; shablloni mban kardinalitetin e etiketave të vogël
+            route = getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+            method = scope["method"]
+            REQUESTS.inc(method=method, route=route, status=status[0])
+            REQUEST_SECONDS.observe(elapsed, method=method, route=route)
+            REQUEST_DB_QUERIES.observe(stats.db_queries, method=method, route=route)
+            REQUEST_DB_SECONDS.observe(stats.db_seconds, method=method, route=route)
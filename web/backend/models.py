@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, DECIMAL, DateTime, Date, ForeignKey, Enum, Boolean
+from sqlalchemy import Column, Integer, String, Text, DECIMAL, DateTime, Date, ForeignKey, Enum, Boolean, UniqueConstraint, Index
+from sqlalchemy.dialects.mysql import LONGTEXT
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -60,9 +61,15 @@ class Invoice(Base):
     status = Column(String(20), default='paid')
     pdf_path = Column(String(500))
     save_timestamp = Column(DateTime)
+    # Pjesët e numrit 'FATURA NR.12/A' (12, 'A') – plotësohen nga sequences.py në çdo shkrim
+    doc_year = Column(Integer)
+    seq_no = Column(Integer, index=True)
+    seq_suffix = Column(String(20), nullable=False, default='')
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
+    __table_args__ = (UniqueConstraint("doc_year", "seq_no", "seq_suffix", name="uq_invoices_year_seq"),)
+
     client = relationship("Client")
     items = relationship("InvoiceItem", back_populates="invoice", cascade="all, delete-orphan")
 
@@ -93,9 +100,14 @@ class Offer(Base):
     total = Column(DECIMAL(10, 2), default=0.00)
     pdf_path = Column(String(500))
     save_timestamp = Column(DateTime)
+    doc_year = Column(Integer)
+    seq_no = Column(Integer, index=True)
+    seq_suffix = Column(String(20), nullable=False, default='')
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
+    __table_args__ = (UniqueConstraint("doc_year", "seq_no", "seq_suffix", name="uq_offers_year_seq"),)
+
     client = relationship("Client")
     items = relationship("OfferItem", back_populates="offer", cascade="all, delete-orphan", order_by="OfferItem.order_index")
 
@@ -141,3 +153,116 @@ class Setting(Base):
     setting_value = Column(Text)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class ChangeLog(Base):
+    """Regjistri i ndryshimeve për delta sync të PWA-së (id = token-i i sinkronizimit)."""
+    __tablename__ = "change_log"
+    id = Column(Integer, primary_key=True, index=True)
+    entity = Column(String(30), nullable=False)   # invoices | offers | clients
+    entity_id = Column(Integer, nullable=False)
+    op = Column(String(10), nullable=False)       # upsert | delete
+    changed_at = Column(DateTime, server_default=func.now(), index=True)
+
+
+class IdempotencyKey(Base):
+    """Çelësat e operacioneve të aplikuara nga /batch (rilojtja e radhës offline nuk dyfishon)."""
+    __tablename__ = "idempotency_keys"
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String(100), unique=True, nullable=False)
+    entity = Column(String(30), nullable=False)
+    entity_id = Column(Integer)
+    created_at = Column(DateTime, server_default=func.now())
+
+
+class MonthlyRollup(Base):
+    """Agregatet mujore për invoice/offer/contract (mbahen nga rollups.py)."""
+    __tablename__ = "monthly_rollups"
+    __table_args__ = (UniqueConstraint("doc_type", "year", "month", name="uq_monthly_rollups_bucket"),)
+    id = Column(Integer, primary_key=True, index=True)
+    doc_type = Column(String(20), nullable=False)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    doc_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(DECIMAL(14, 2), nullable=False, default=0)
+    vat = Column(DECIMAL(14, 2), nullable=False, default=0)
+    paid_count = Column(Integer, nullable=False, default=0)
+    unpaid_count = Column(Integer, nullable=False, default=0)
+    unpaid_revenue = Column(DECIMAL(14, 2), nullable=False, default=0)
+
+
+class DocumentSequence(Base):
+    """Numri i radhës për (doc_type, year, device_prefix); alokohet me SELECT ... FOR UPDATE."""
+    __tablename__ = "document_sequences"
+    __table_args__ = (UniqueConstraint("doc_type", "year", "device_prefix", name="uq_document_sequences_key"),)
+    id = Column(Integer, primary_key=True, index=True)
+    doc_type = Column(String(20), nullable=False)
+    year = Column(Integer, nullable=False)
+    device_prefix = Column(String(20), nullable=False, default="")
+    next_value = Column(Integer, nullable=False, default=1)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class RenderJob(Base):
+    """Punë renderimi PDF në sfond (POST /render-jobs); ruhet që të rifillojë pas restartit."""
+    __tablename__ = "render_jobs"
+    __table_args__ = (Index("ix_render_jobs_doc", "doc_type", "doc_id"),)
+    id = Column(Integer, primary_key=True, index=True)
+    doc_type = Column(String(20), nullable=False)   # invoice | offer | contract
+    doc_id = Column(Integer, nullable=False)
+    font_size = Column(String(10))                  # vetëm për ofertat (si ?font_size=)
+    status = Column(String(10), nullable=False, default="queued")  # queued | running | done | failed
+    pdf_path = Column(String(500))
+    error = Column(Text)
+    created_at = Column(DateTime, server_default=func.now())
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+
+class OutboxEmail(Base):
+    """Email në radhë për dërgim në sfond (email_outbox.py); nuk humbet pas një restarti."""
+    __tablename__ = "email_outbox"
+    __table_args__ = (Index("ix_email_outbox_due", "status", "next_attempt_at"),)
+    id = Column(Integer, primary_key=True, index=True)
+    doc_type = Column(String(20), nullable=False)   # invoice | offer
+    doc_id = Column(Integer, nullable=False)
+    dest_email = Column(String(255), nullable=False)
+    status = Column(String(10), nullable=False, default="queued")  # queued | sending | sent | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime)
+    error = Column(Text)
+    created_at = Column(DateTime, server_default=func.now())
+    started_at = Column(DateTime)
+    sent_at = Column(DateTime)
+
+
+class RequestProfile(Base):
+    """Profili i një kërkese (profiler.py): mostrat në formatin speedscope dhe query-t SQL."""
+    __tablename__ = "request_profiles"
+    id = Column(String(32), primary_key=True)
+    method = Column(String(10), nullable=False)
+    path = Column(String(500), nullable=False)
+    route = Column(String(255))
+    status_code = Column(Integer)
+    duration_ms = Column(Integer)
+    sample_count = Column(Integer)
+    query_count = Column(Integer)
+    query_ms = Column(Integer)
+    speedscope = Column(Text().with_variant(LONGTEXT(), "mysql"), nullable=False)
+    queries = Column(Text().with_variant(LONGTEXT(), "mysql"))  # JSON: [{offset_ms, duration_ms, statement}]
+    created_at = Column(DateTime, server_default=func.now())
+
+
+class SearchToken(Base):
+    """Indeksi i kërkimit: një fjalë e normalizuar për dokument/klient (mbahet nga search_index.py)."""
+    __tablename__ = "search_tokens"
+    __table_args__ = (
+        # Mbulon kërkimin me prefiks pa lexuar tabelën
+        Index("ix_search_tokens_token", "token", "entity", "entity_id", "weight"),
+        Index("ix_search_tokens_entity", "entity", "entity_id"),
+    )
+    id = Column(Integer, primary_key=True)
+    entity = Column(String(20), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    token = Column(String(64), nullable=False)
+    weight = Column(Integer, nullable=False, default=1)
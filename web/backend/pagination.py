@@ -0,0 +1,88 @@
+"""Keyset pagination: cursor-a opak dhe zgjedhja e fushave (include=items,client)."""
+import base64
+import json
+from datetime import date
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: list) -> str:
+    """Kodon vlerat e rreshtit të fundit (p.sh. [date, id]) në një cursor URL-safe."""
+    raw = json.dumps([v.isoformat() if isinstance(v, date) else v for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, types: tuple) -> list:
+    """Dekodon cursor-in dhe konverton vlerat sipas `types` (date ose int)."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError("cursor length")
+        return [date.fromisoformat(v) if t is date else t(v) for v, t in zip(values, types)]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor i pavlefshëm.")
+
+
+def nullable(convert):
+    """Tip për `decode_cursor` që lejon edhe null (p.sh. seq_no i ofertave pa numër NR.X)."""
+    return lambda value: None if value is None else convert(value)
+
+
+def parse_include(include: str | None, allowed: set, default: set) -> set:
+    """`None` → default (sjellja e vjetër); `""` → asnjë relacion; përndryshe lista e zgjedhur."""
+    if include is None:
+        return set(default)
+    requested = {part.strip().lower() for part in include.split(",") if part.strip()}
+    unknown = requested - allowed
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"include i panjohur: {', '.join(sorted(unknown))}")
+    return requested
+
+
+def keyset_after(columns: list, values: list):
+    """Kushti `(c1, c2, ...) < (v1, v2, ...)` për renditje DESC në të gjitha kolonat."""
+    clauses = []
+    for idx, (col, val) in enumerate(zip(columns, values)):
+        equal_prefix = [c == v for c, v in zip(columns[:idx], values[:idx])]
+        clauses.append(and_(*equal_prefix, col < val))
+    return or_(*clauses)
+
+
+def keyset_after_nullable(column, id_column, values: list):
+    """
+    Si `keyset_after([column, id_column], values)` kur `column` mund të jetë NULL.
+    Pret renditjen `column DESC, id DESC` me NULL-et në fund (si në MySQL dhe SQLite).
+    """
+    value, last_id = values
+    if value is None:
+        return and_(column.is_(None), id_column < last_id)
+    return or_(column < value, and_(column == value, id_column < last_id), column.is_(None))
+
+
+def fetch_page(query, limit: int | None, key_of):
+    """Ekzekuton query me limit+1; kthen (rreshtat, next_cursor ose None)."""
+    if not limit:
+        return query.all(), None
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(key_of(rows[-1]))
+
+
+async def fetch_page_async(db, stmt, limit: int | None, key_of, scalars: bool = True):
+    """Si `fetch_page`, për një select() të ekzekutuar me AsyncSession (scalars=False: rreshta Core)."""
+    if limit:
+        stmt = stmt.limit(limit + 1)
+    result = await db.execute(stmt)
+    rows = (result.scalars() if scalars else result).all()
+    if not limit or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(key_of(rows[-1]))
@@ -0,0 +1,141 @@
+"""Renderimi paraprak i PDF-ve pas ruajtjes së faturave dhe ofertave (opt-in: PDF_PRERENDER=1).
+
+Pas commit-it që krijon/ndryshon një dokument, PDF-ja futet në radhën e renderimit
+(render_queue) pas PRERENDER_DELAY sekondash. Çdo ndryshim i ri i të njëjtit dokument
+brenda kësaj kohe e anulon planifikimin e mëparshëm (debounce), kështu renderohet vetëm
+versioni i fundit dhe PDF-ja zakonisht është gati kur përdoruesi hap "Shiko PDF".
+"""
+import logging
+import os
+import threading
+
+from sqlalchemy import event, inspect
+
+import database
+import models
+import render_queue
+
+ENABLED = os.getenv("PDF_PRERENDER", "").lower() in ("1", "true", "yes")
+PRERENDER_DELAY = float(os.getenv("PRERENDER_DELAY", "2"))
+_PENDING_KEY = "prerender_pending"
+
+# Modeli -> (doc_type, FK drejt dokumentit për artikujt ose None)
+SOURCES = {
+    models.Invoice: ("invoice", None),
+    models.Offer: ("offer", None),
+    models.InvoiceItem: ("invoice", "invoice_id"),
+    models.OfferItem: ("offer", "offer_id"),
+}
+# Ndryshime që nuk duken në PDF (p.sh. vetë pdf_path pas renderimit) nuk planifikojnë renderim
+_IGNORED_ATTRS = {"pdf_path", "updated_at", "status", "save_timestamp"}
+
+_lock = threading.Lock()
+_timers: dict = {}
+
+
+def _changes_pdf(obj) -> bool:
+    state = inspect(obj)
+    return any(
+        attr.history.has_changes()
+        for attr in state.attrs
+        if attr.key not in _IGNORED_ATTRS and attr.key in state.mapper.column_attrs
+    )
+
+
+def _document_key(obj, spec):
+    doc_type, fk = spec
+    doc_id = getattr(obj, fk) if fk else obj.id
+    return (doc_type, doc_id) if doc_id is not None else None
+
+
+def _after_flush(session, flush_context):
+    pending = session.info.setdefault(_PENDING_KEY, {})
+    for obj in session.new:
+        spec = SOURCES.get(type(obj))
+        if spec and _document_key(obj, spec):
+            pending[_document_key(obj, spec)] = True
+    for obj in session.dirty:
+        spec = SOURCES.get(type(obj))
+        if spec and _document_key(obj, spec) and _changes_pdf(obj):
+            pending[_document_key(obj, spec)] = True
+    removed = []
+    for obj in session.deleted:
+        spec = SOURCES.get(type(obj))
+        if spec and _document_key(obj, spec):
+            # Artikulli i fshirë ndryshon dokumentin; dokumenti i fshirë anulon renderimin
+            if spec[1] is None:
+                removed.append(_document_key(obj, spec))
+            else:
+                pending[_document_key(obj, spec)] = True
+    for key in removed:
+        pending[key] = False
+
+
+def _after_commit(session):
+    for key, render in session.info.pop(_PENDING_KEY, {}).items():
+        if render:
+            schedule(*key)
+        else:
+            cancel(*key)
+
+
+def _after_transaction_end(session, transaction):
+    # Vetëm transaksioni kryesor: rollback-u i një savepoint-i (p.sh. konflikt numri te
+    # sequences.flush_new) nuk fshin dokumentet e ruajtura më parë në të njëjtin transaksion
+    if transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
+
+
+def _fire(doc_type: str, doc_id: int, timer):
+    with _lock:
+        # Një ndryshim më i ri e ka zëvendësuar këtë timer
+        if _timers.get((doc_type, doc_id)) is not timer:
+            return
+        del _timers[(doc_type, doc_id)]
+    model = render_queue.DOCUMENTS[doc_type]
+    db = database.SessionLocal()
+    try:
+        doc = db.query(model).filter(model.id == doc_id).first()
+        if doc is not None:
+            render_queue.enqueue(db, doc_type, doc)
+    except Exception as e:
+        db.rollback()
+        logging.warning(f"Prerender {doc_type} {doc_id} skipped: {e}")
+    finally:
+        db.close()
+
+
+def schedule(doc_type: str, doc_id: int, delay: float | None = None):
+    """Planifikon renderimin; një thirrje e re për të njëjtin dokument anulon të mëparshmen."""
+    timer = threading.Timer(PRERENDER_DELAY if delay is None else delay, lambda: _fire(doc_type, doc_id, timer))
+    timer.daemon = True
+    with _lock:
+        previous = _timers.get((doc_type, doc_id))
+        _timers[(doc_type, doc_id)] = timer
+    if previous is not None:
+        previous.cancel()
+    timer.start()
+
+
+def cancel(doc_type: str, doc_id: int):
+    with _lock:
+        timer = _timers.pop((doc_type, doc_id), None)
+    if timer is not None:
+        timer.cancel()
+
+
+def shutdown():
+    with _lock:
+        timers = list(_timers.values())
+        _timers.clear()
+    for timer in timers:
+        timer.cancel()
+
+
+def install(session_factory):
+    """Regjistron listener-at vetëm kur PDF_PRERENDER është aktiv."""
+    if not ENABLED:
+        return
+    for name, fn in (("after_flush", _after_flush), ("after_commit", _after_commit), ("after_transaction_end", _after_transaction_end)):
+        if not event.contains(session_factory, name, fn):
+            event.listen(session_factory, name, fn)
@@ -0,0 +1,248 @@
+"""Profilizimi sipas kërkesës për diagnostikim (vetëm me token të vlefshëm).
+
+Një kërkesë me header-in `X-Profile: 1` ose `?profile=1` ekzekutohet me një sampler në thread
+të veçantë: çdo PROFILE_INTERVAL_MS lexohen stack-et e thread-eve (sys._current_frames) dhe
+ruhen ato të thread-it të event loop-it dhe të thread-eve ku u pa funksioni i endpoint-it.
+Rezultati ruhet te request_profiles: mostrat në formatin speedscope (https://www.speedscope.app)
+plus query-t SQL me kohët e tyre (nga metrics.py). Përgjigja mban `X-Profile-Id`; profili
+lexohet nga GET /debug/profiles/{id}. Pa flamurin, middleware-i vetëm kontrollon header-at.
+Vetëm një kërkesë profilizohet njëherësh; të tjerat me flamur ekzekutohen normalisht.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+
+import database
+import metrics
+import models
+
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "1") != "0"
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "2")) / 1000
+PROFILE_KEEP = 50
+MAX_SAMPLES = 200_000
+MAX_STATEMENTS = 2000
+STATEMENT_MAX_LENGTH = 4000
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+
+def _package_dir(name: str):
+    try:
+        module = __import__(name)
+    except ImportError:
+        return None
+    return os.path.dirname(os.path.abspath(module.__file__)) + os.sep
+
+
+# Mostrat pa asnjë frame nga këto direktori janë thread-e në pritje (select, queue.get)
+APP_DIRS = tuple(
+    path for path in [os.path.dirname(os.path.abspath(__file__)) + os.sep]
+    + [_package_dir(name) for name in ("fastapi", "starlette", "pydantic", "sqlalchemy", "reportlab", "PIL")]
+    if path
+)
+
+_busy = threading.Lock()
+
+
+class Sampler(threading.Thread):
+    """Lexon stack-et e të gjitha thread-eve çdo `interval` sekonda deri te `stop()`."""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        super().__init__(name="profiler", daemon=True)
+        self.interval = interval
+        self.samples = []  # (thread_id, pesha në sekonda, stack nga rrënja te gjethja)
+        self._stopped = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stopped.wait(self.interval) and len(self.samples) < MAX_SAMPLES:
+            now = time.perf_counter()
+            weight, last = now - last, now
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                stack.reverse()
+                self.samples.append((thread_id, weight, tuple(stack)))
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def requested(scope) -> bool:
+    """Flamuri i profilizimit: `X-Profile: 1` ose `profile=1` në query string."""
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            return value.strip() in (b"1", b"true")
+    query = scope.get("query_string", b"")
+    return b"profile=" in query and any(part in (b"profile=1", b"profile=true") for part in query.split(b"&"))
+
+
+def _bearer_token(scope):
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            auth_header = value.decode("latin-1")
+            return auth_header[7:].strip() if auth_header.startswith("Bearer ") else None
+    return None
+
+
+def _is_app_frame(frame) -> bool:
+    return frame[1].startswith(APP_DIRS)
+
+
+def speedscope(samples, request_threads: dict, name: str) -> dict:
+    """Mostrat e thread-eve të kërkesës si dokument speedscope ('sampled', milisekonda)."""
+    frames, frame_index = [], {}
+    profiles = []
+    for thread_id, thread_name in request_threads.items():
+        stacks, weights = [], []
+        for sample_thread, weight, stack in samples:
+            if sample_thread != thread_id or not any(_is_app_frame(frame) for frame in stack):
+                continue
+            indexes = []
+            for frame in stack:
+                idx = frame_index.get(frame)
+                if idx is None:
+                    idx = frame_index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                indexes.append(idx)
+            stacks.append(indexes)
+            weights.append(round(weight * 1000, 3))
+        if stacks:
+            profiles.append({
+                "type": "sampled",
+                "name": thread_name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(sum(weights), 3),
+                "samples": stacks,
+                "weights": weights,
+            })
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "holkos-fatura profiler",
+        "activeProfileIndex": 0,
+        "shared": {"frames": frames},
+        "profiles": profiles,
+    }
+
+
+def _request_threads(samples, loop_thread: int, endpoint) -> dict:
+    """Thread-i i event loop-it + thread-et ku u pa kodi i endpoint-it (endpoint-et sync)."""
+    code = getattr(endpoint, "__code__", None)
+    target = (code.co_name, code.co_filename, code.co_firstlineno) if code else None
+    thread_ids = {loop_thread}
+    if target is not None:
+        thread_ids.update(thread_id for thread_id, _, stack in samples if target in stack)
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    return {thread_id: ("event-loop" if thread_id == loop_thread else names.get(thread_id, str(thread_id)))
+            for thread_id in sorted(thread_ids, key=lambda t: t != loop_thread)}
+
+
+def store(profile_id: str, scope, status_code: int, duration: float, samples, loop_thread: int, statements) -> None:
+    """Ruajtja në request_profiles (thirret në threadpool pasi përgjigja është dërguar)."""
+    route = getattr(scope.get("route"), "path", None)
+    name = f"{scope['method']} {scope.get('path', '')}"
+    document = speedscope(samples, _request_threads(samples, loop_thread, scope.get("endpoint")), name)
+    queries = [
+        {"offset_ms": round(offset * 1000, 3), "duration_ms": round(elapsed * 1000, 3),
+         "statement": statement[:STATEMENT_MAX_LENGTH]}
+        for offset, elapsed, statement in (statements or [])[:MAX_STATEMENTS]
+    ]
+    db = database.SessionLocal()
+    try:
+        db.add(models.RequestProfile(
+            id=profile_id,
+            method=scope["method"],
+            path=scope.get("path", "")[:500],
+            route=route,
+            status_code=status_code,
+            duration_ms=round(duration * 1000),
+            sample_count=sum(len(profile["samples"]) for profile in document["profiles"]),
+            query_count=len(statements or []),
+            query_ms=round(sum(elapsed for _, elapsed, _ in (statements or [])) * 1000),
+            speedscope=json.dumps(document, separators=(",", ":")),
+            queries=json.dumps(queries, ensure_ascii=False),
+        ))
+        db.flush()
+        _prune(db)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logging.warning(f"Request profile {profile_id} not stored: {e}")
+    finally:
+        db.close()
+
+
+def _prune(db, keep: int = PROFILE_KEEP) -> int:
+    """Mban vetëm `keep` profilet më të fundit."""
+    profile_model = models.RequestProfile
+    cutoff = db.query(profile_model.created_at).order_by(
+        profile_model.created_at.desc()
+    ).offset(keep - 1).limit(1).scalar()
+    if cutoff is None:
+        return 0
+    return db.query(profile_model).filter(profile_model.created_at < cutoff).delete(synchronize_session=False)
+
+
+class ProfilerMiddleware:
+    """
+    Middleware ASGI: pa flamur kalon kërkesën direkt. Me flamur dhe token të vlefshëm,
+    ekzekuton kërkesën nën Sampler dhe shton `X-Profile-Id` te përgjigja.
+    """
+
+    def __init__(self, app, verify_token):
+        self.app = app
+        self.verify_token = verify_token
+
+    async def __call__(self, scope, receive, send):
+        if not PROFILER_ENABLED or scope["type"] != "http" or not requested(scope):
+            await self.app(scope, receive, send)
+            return
+        token = _bearer_token(scope)
+        if not token or not self.verify_token(token) or not _busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        from starlette.concurrency import run_in_threadpool
+
+        profile_id = uuid.uuid4().hex
+        stats = metrics.current_stats()
+        if stats is not None:
+            stats.statements = []
+        status = [500]
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (PROFILE_ID_HEADER, profile_id.encode("ascii"))]}
+            await send(message)
+
+        sampler = Sampler()
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.stop()
+            duration = time.perf_counter() - started
+            statements = stats.statements if stats is not None else None
+            if stats is not None:
+                stats.statements = None
+            try:
+                await run_in_threadpool(
+                    store, profile_id, scope, status[0], duration, sampler.samples, threading.get_ident(), statements
+                )
+            finally:
+                _busy.release()
@@ -0,0 +1,283 @@
+"""Radha e renderimit të PDF-ve: punët (render_jobs) ekzekutohen jashtë kërkesës HTTP.
+
+ReportLab është CPU-bound dhe e mban GIL-in, prandaj renderimi bëhet në një ProcessPoolExecutor
+(RENDER_WORKERS procese, default 2). POST /render-jobs kthen menjëherë 202; klienti pyet
+GET /render-jobs/{id} dhe shkarkon PDF-në nga `url` kur statusi bëhet 'done'.
+Punët ruhen në DB: ato që mbetën pa përfunduar pas një restarti rinisen në startup.
+Ku procese nuk lejohen (p.sh. Vercel) ose RENDER_WORKERS=0, përdoret një thread i vetëm.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from functools import partial
+from itertools import islice
+
+import database
+import metrics
+import models
+
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+# Punë 'running' më të vjetra se kaq konsiderohen të braktisura (procesi ra)
+STALE_AFTER = timedelta(minutes=10)
+PENDING = ("queued", "running")
+
+DOCUMENTS = {
+    "invoice": models.Invoice,
+    "offer": models.Offer,
+    "contract": models.Contract,
+}
+
+_lock = threading.Lock()
+_pool = None
+_generator = None
+
+
+def _executor():
+    global _pool
+    with _lock:
+        if _pool is None and RENDER_WORKERS > 0:
+            try:
+                # spawn: procesi i ri nuk trashëgon thread-et dhe lidhjet DB të serverit
+                _pool = ProcessPoolExecutor(
+                    max_workers=RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn")
+                )
+            except (OSError, ImportError, NotImplementedError) as e:
+                logging.warning(f"Render process pool unavailable, using a thread: {e}")
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="render")
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _lock:
+        _pool = None
+
+
+def shutdown():
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _pdf_generator():
+    global _generator
+    if _generator is None:
+        from services.pdf_generator import WebPDFGenerator
+        _generator = WebPDFGenerator()
+    return _generator
+
+
+def _render_args(db, doc_type: str, doc):
+    import config_cache
+    return doc_type, doc, config_cache.company(db), None if doc_type == "contract" else doc.client
+
+
+def known_location(doc, font_size=None):
+    """pdf_path i ruajtur i dokumentit; vlen vetëm për variantin pa font_size."""
+    return None if font_size else doc.pdf_path
+
+
+def cached_pdf(db, doc_type: str, doc, font_size=None) -> str | None:
+    """Rruga ose URL-ja e PDF-së nëse ky variant i dokumentit është tashmë gati (pa renderuar)."""
+    generator = _pdf_generator()
+    key = generator.fingerprint(*_render_args(db, doc_type, doc), font_size=font_size)
+    url = generator.blob_location(key, known_location(doc, font_size))
+    if url:
+        return url
+    path = generator.cache_path(key)
+    return path if os.path.exists(path) else None
+
+
+def render_document(db, doc_type: str, doc, font_size=None) -> str:
+    """Renderon (ose merr nga cache-i) një dokument të ngarkuar; kthen rrugën ose URL-në."""
+    location, _ = _pdf_generator().render_cached(
+        *_render_args(db, doc_type, doc), font_size=font_size, known=known_location(doc, font_size)
+    )
+    return location
+
+
+def render_attachment(db, doc_type: str, doc, font_size=None):
+    """(emri i skedarit, rruga lokale në cache) – për bashkëngjitjet e email-it, edhe kur PDF-ja ruhet në Blob."""
+    generator = _pdf_generator()
+    _, key = generator.render_cached(*_render_args(db, doc_type, doc), font_size=font_size)
+    return generator.document_filename(doc_type, doc), generator.cache_path(key)
+
+
+def _run_job(job_id: int):
+    """Ekzekutohet në procesin punëtor. Kthen (pdf_path, updated_at e dokumentit) ose None."""
+    job_model = models.RenderJob
+    db = database.SessionLocal()
+    try:
+        # Merr punën vetëm nëse askush tjetër nuk e ka marrë (disa instanca të API-së)
+        claimed = db.query(job_model).filter(
+            job_model.id == job_id, job_model.status == "queued"
+        ).update({"status": "running", "started_at": datetime.now()}, synchronize_session=False)
+        db.commit()
+        if not claimed:
+            return None
+        job = db.get(job_model, job_id)
+        doc = db.get(DOCUMENTS[job.doc_type], job.doc_id)
+        if doc is None:
+            raise LookupError(f"{job.doc_type} {job.doc_id} nuk ekziston më")
+        rendered_at = doc.updated_at
+        return render_document(db, job.doc_type, doc, job.font_size), rendered_at
+    finally:
+        db.close()
+
+
+def _render_by_id(doc_type: str, doc_id: int):
+    """Procesi punëtor: (emri i skedarit, rruga ose URL) e PDF-së, nga cache-i ose e renderuar."""
+    db = database.SessionLocal()
+    try:
+        doc = db.get(DOCUMENTS[doc_type], doc_id)
+        if doc is None:
+            raise LookupError(f"{doc_type} {doc_id} nuk ekziston më")
+        return _pdf_generator().document_filename(doc_type, doc), render_document(db, doc_type, doc)
+    finally:
+        db.close()
+
+
+def render_many(doc_type: str, ids):
+    """
+    Renderon dokumentet paralelisht në pool; jep (doc_id, rezultati, gabimi) sipas radhës së përfundimit.
+    Në pool mbahen njëkohësisht vetëm disa dokumente, që punët e tjera (POST /render-jobs) të mos presin.
+    """
+    pool = _executor()
+    window = max(RENDER_WORKERS, 1) * 2
+    remaining = iter(ids)
+    pending = {}
+
+    def fill():
+        for doc_id in islice(remaining, window - len(pending)):
+            pending[pool.submit(_render_by_id, doc_type, doc_id)] = doc_id
+
+    try:
+        fill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                doc_id = pending.pop(future)
+                error = future.exception()
+                yield doc_id, None if error else future.result(), error
+            fill()
+    finally:
+        # Klienti u shkëput: mos rendero pjesën e mbetur
+        for future in pending:
+            future.cancel()
+
+
+def _submit(job_id: int):
+    try:
+        future = _executor().submit(_run_job, job_id)
+    except (BrokenProcessPool, RuntimeError):
+        _reset_pool()
+        future = _executor().submit(_run_job, job_id)
+    future.add_done_callback(partial(_finish, job_id))
+
+
+def _finish(job_id: int, future):
+    """Callback në procesin e API-së: ruan rezultatin te puna dhe te dokumenti."""
+    if future.cancelled():
+        return
+    db = database.SessionLocal()
+    try:
+        job = db.get(models.RenderJob, job_id)
+        error = future.exception()
+        if job is None or (error is None and future.result() is None):
+            return
+        if job.started_at is not None:
+            metrics.RENDER_JOB_SECONDS.observe(
+                (datetime.now() - job.started_at).total_seconds(),
+                doc_type=job.doc_type, status="failed" if error is not None else "done",
+            )
+        if error is not None:
+            if isinstance(error, BrokenProcessPool):
+                _reset_pool()
+            job.status = "failed"
+            job.error = str(error)[:1000] or type(error).__name__
+            job.finished_at = datetime.now()
+            db.commit()
+            return
+        pdf_path, rendered_at = future.result()
+        if not job.font_size:
+            doc = db.get(DOCUMENTS[job.doc_type], job.doc_id)
+            if doc is not None and doc.updated_at != rendered_at:
+                # Dokumenti u ndryshua gjatë renderimit: PDF-ja është e vjetër, rendero sërish
+                job.status = "queued"
+                job.started_at = None
+                db.commit()
+                _submit(job_id)
+                return
+            if doc is not None:
+                doc.pdf_path = pdf_path
+        job.status = "done"
+        job.pdf_path = pdf_path
+        job.finished_at = datetime.now()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logging.warning(f"Render job {job_id} finish failed: {e}")
+    finally:
+        db.close()
+
+
+def enqueue(db, doc_type: str, doc, font_size=None):
+    """
+    Krijon (ose ripërdor) punën për dokumentin dhe bën commit.
+    - ky variant është tashmë në cache: puna kthehet menjëherë 'done';
+    - një punë e njëjtë është ende në radhë: kthehet ajo.
+    """
+    job_model = models.RenderJob
+    font_size = font_size or None
+    if doc_type != "offer":
+        font_size = None
+    existing = db.query(job_model).filter(
+        job_model.doc_type == doc_type,
+        job_model.doc_id == doc.id,
+        job_model.font_size.is_(None) if font_size is None else job_model.font_size == font_size,
+        job_model.status.in_(PENDING),
+    ).order_by(job_model.id.desc()).first()
+    if existing is not None:
+        return existing
+    ready = cached_pdf(db, doc_type, doc, font_size)
+    job = job_model(
+        doc_type=doc_type, doc_id=doc.id, font_size=font_size,
+        status="done" if ready else "queued", pdf_path=ready,
+        finished_at=datetime.now() if ready else None,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    if not ready:
+        _submit(job.id)
+    return job
+
+
+def resume_pending(db) -> int:
+    """Startup: rifut në radhë punët 'queued' dhe ato 'running' që kanë ngecur."""
+    job_model = models.RenderJob
+    stale = datetime.now() - STALE_AFTER
+    db.query(job_model).filter(
+        job_model.status == "running", job_model.started_at < stale
+    ).update({"status": "queued", "started_at": None}, synchronize_session=False)
+    db.commit()
+    ids = [row.id for row in db.query(job_model.id).filter(job_model.status == "queued")]
+    for job_id in ids:
+        _submit(job_id)
+    return len(ids)
+
+
+def prune(db, days: int = 7) -> int:
+    """Fshin punët e përfunduara më të vjetra se `days` ditë."""
+    job_model = models.RenderJob
+    return db.query(job_model).filter(
+        job_model.status.in_(("done", "failed")),
+        job_model.finished_at < datetime.now() - timedelta(days=days),
+    ).delete(synchronize_session=False)
@@ -0,0 +1,187 @@
+"""Rollup mujor (monthly_rollups): numri, të ardhurat, TVSH dhe ndarja paid/unpaid për muaj dhe lloj dokumenti.
+
+Pas çdo flush-i (listener after_flush, në të njëjtin transaksion) muajt e prekur rillogariten
+nga rreshtat burim: një agregat mbi faturat/ofertat/kontratat e atij muaji që mbishkruan rreshtin.
+I njëjti rifreskim bëhet edhe nga desktop-i (models/monthly_rollup.py, MonthlyRollup.refresh),
+kështu të dy anët shkruajnë të njëjtat vlera dhe një rresht i gabuar ndreqet te shkrimi i radhës.
+Rindërtimi i plotë: `python rollups.py`.
+"""
+from datetime import date
+
+from sqlalchemy import event, extract, func, case, inspect, select
+
+import models
+
+# Modeli -> (doc_type, kolona e datës, kolona e shumës, kolona e TVSH-së, ka status pagese)
+SOURCES = {
+    models.Invoice: ("invoice", "date", "total", "vat_amount", True),
+    models.Offer: ("offer", "date", "total", "vat_amount", False),
+    models.Contract: ("contract", "signing_date", None, None, False),
+}
+DOC_TYPES = {spec[0]: (model, spec) for model, spec in SOURCES.items()}
+FIELDS = ("doc_count", "revenue", "vat", "paid_count", "unpaid_count", "unpaid_revenue")
+
+
+def _aggregates(model, spec) -> list:
+    """Kolonat e FIELDS si agregate SQL; njëlloj si te desktop-i (status NULL nuk është as paid as unpaid)."""
+    _, _, amount_col, vat_col, has_status = spec
+    zero = func.coalesce(func.sum(0), 0)
+    amount = func.coalesce(func.sum(getattr(model, amount_col)), 0) if amount_col else zero
+    vat = func.coalesce(func.sum(getattr(model, vat_col)), 0) if vat_col else zero
+    if not has_status:
+        return [func.count(model.id), amount, vat, zero, zero, zero]
+    unpaid = (model.status.isnot(None)) & (model.status != 'paid')
+    return [
+        func.count(model.id), amount, vat,
+        func.coalesce(func.sum(case((model.status == 'paid', 1), else_=0)), 0),
+        func.coalesce(func.sum(case((unpaid, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((unpaid, getattr(model, amount_col)), else_=0)), 0),
+    ]
+
+
+def _bucket(spec, doc_date):
+    return (spec[0], doc_date.year, doc_date.month) if isinstance(doc_date, date) else None
+
+
+def _dates(obj, spec) -> list:
+    """Data aktuale dhe ajo para flush-it (nga historia e atributit), nëse ndryshon."""
+    state = inspect(obj).attrs[spec[1]]
+    before = state.history.non_added()
+    return [getattr(obj, spec[1]), before[0] if before else state.loaded_value]
+
+
+def _touched_buckets(session) -> set:
+    buckets = set()
+    for obj in session.new:
+        spec = SOURCES.get(type(obj))
+        if spec:
+            buckets.add(_bucket(spec, getattr(obj, spec[1])))
+    for obj in session.dirty:
+        spec = SOURCES.get(type(obj))
+        if spec and session.is_modified(obj, include_collections=False):
+            buckets.update(_bucket(spec, value) for value in _dates(obj, spec))
+    for obj in session.deleted:
+        spec = SOURCES.get(type(obj))
+        if spec:
+            buckets.update(_bucket(spec, value) for value in _dates(obj, spec))
+    buckets.discard(None)
+    return buckets
+
+
+def _after_flush(session, flush_context):
+    buckets = _touched_buckets(session)
+    if buckets:
+        refresh(session.connection(), buckets)
+
+
+def _upsert_statement(dialect_name, table, row):
+    if dialect_name == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table).values(**row)
+        return stmt.on_duplicate_key_update(**{f: stmt.inserted[f] for f in FIELDS})
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(**row)
+        return stmt.on_conflict_do_update(
+            index_elements=["doc_type", "year", "month"],
+            set_={f: stmt.excluded[f] for f in FIELDS},
+        )
+    return None
+
+
+def _write(connection, row: dict):
+    """INSERT ... ON DUPLICATE KEY UPDATE me vlerat e rillogaritura (jo delta)."""
+    table = models.MonthlyRollup.__table__
+    stmt = _upsert_statement(connection.dialect.name, table, row)
+    if stmt is not None:
+        connection.execute(stmt)
+        return
+    bucket = (table.c.doc_type == row["doc_type"]) & (table.c.year == row["year"]) & (table.c.month == row["month"])
+    if not connection.execute(table.update().where(bucket).values(**{f: row[f] for f in FIELDS})).rowcount:
+        connection.execute(table.insert().values(**row))
+
+
+def refresh(connection, buckets) -> None:
+    """Rillogarit muajt `buckets` = {(doc_type, year, month)} nga rreshtat burim dhe i mbishkruan."""
+    for doc_type, year, month in sorted(buckets):
+        model, spec = DOC_TYPES[doc_type]
+        doc_date = getattr(model, spec[1])
+        start = date(year, month, 1)
+        end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+        values = connection.execute(
+            select(*_aggregates(model, spec)).where(doc_date >= start, doc_date < end)
+        ).one()
+        _write(connection, {"doc_type": doc_type, "year": year, "month": month,
+                            **{f: (v or 0) for f, v in zip(FIELDS, values)}})
+
+
+def install(session_factory):
+    """Regjistron listener-in after_flush mbi sessionmaker-in e aplikacionit."""
+    if not event.contains(session_factory, "after_flush", _after_flush):
+        event.listen(session_factory, "after_flush", _after_flush)
+
+
+def buckets_of(session, model, ids) -> set:
+    """Muajt e dokumenteve `ids`; për bulk delete (query.delete()) merren para fshirjes, `refresh` pas saj."""
+    spec = SOURCES[model]
+    ids = [i for i in ids if i is not None]
+    if not ids:
+        return set()
+    doc_date = getattr(model, spec[1])
+    rows = session.query(doc_date).filter(model.id.in_(ids), doc_date.isnot(None)).distinct().all()
+    return {_bucket(spec, row[0]) for row in rows} - {None}
+
+
+def rebuild(session) -> int:
+    """Rindërton të gjithë tabelën nga faturat, ofertat dhe kontratat (një GROUP BY për secilën)."""
+    table = models.MonthlyRollup.__table__
+    session.execute(table.delete())
+    inserted = 0
+    for model, spec in SOURCES.items():
+        doc_date = getattr(model, spec[1])
+        year, month = extract('year', doc_date), extract('month', doc_date)
+        rows = session.execute(
+            select(year, month, *_aggregates(model, spec)).where(doc_date.isnot(None)).group_by(year, month)
+        ).all()
+        values = [
+            {"doc_type": spec[0], "year": int(r[0]), "month": int(r[1]),
+             **{f: (v or 0) for f, v in zip(FIELDS, r[2:])}}
+            for r in rows
+        ]
+        if values:
+            session.execute(table.insert(), values)
+            inserted += len(values)
+    return inserted
+
+
+def monthly(session, doc_type: str, first: tuple, last: tuple) -> dict:
+    """{(year, month): MonthlyRollup} për muajt nga `first` deri `last` (përfshirë)."""
+    rollup = models.MonthlyRollup
+    period = rollup.year * 100 + rollup.month
+    rows = session.query(rollup).filter(
+        rollup.doc_type == doc_type,
+        period >= first[0] * 100 + first[1],
+        period <= last[0] * 100 + last[1],
+    ).all()
+    return {(r.year, r.month): r for r in rows}
+
+
+def years(session, doc_type: str) -> list:
+    """Vitet (zbritës) që kanë të paktën një dokument të këtij lloji."""
+    rollup = models.MonthlyRollup
+    rows = session.query(rollup.year).filter(
+        rollup.doc_type == doc_type, rollup.doc_count > 0
+    ).distinct().order_by(rollup.year.desc()).all()
+    return [r.year for r in rows]
+
+
+if __name__ == "__main__":
+    import database
+
+    db = database.SessionLocal()
+    try:
+        count = rebuild(db)
+        db.commit()
+        print(f"monthly_rollups rebuilt: {count} rows.")
+    finally:
+        db.close()
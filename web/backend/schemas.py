@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import List, Optional, Any
+from typing import List, Optional, Any, Union
 from datetime import date, datetime
 from decimal import Decimal
 
@@ -212,6 +212,36 @@ class BulkEmailOfferRequest(BaseModel):
     offer_ids: List[int]
     override_email: Optional[EmailStr] = None
 
+class BulkPrintRequest(BaseModel):
+    invoice_ids: List[int]
+
+class BulkPrintOfferRequest(BaseModel):
+    offer_ids: List[int]
+    font_size: Optional[str] = None
+
+# Batch (rilojtja e radhës offline në një transaksion)
+class BatchOperation(BaseModel):
+    op: str  # create | update | delete | status
+    entity: str  # invoices | offers | clients
+    id: Optional[Union[int, str]] = None  # ID reale ose e përkohshme (p.sh. "temp-abc")
+    temp_id: Optional[str] = None  # ID e përkohshme që merr rreshti i krijuar
+    idempotency_key: Optional[str] = None
+    data: Optional[dict] = None
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+
+# Renderimi i PDF-ve në sfond
+class RenderJobCreate(BaseModel):
+    doc_type: str  # invoice | offer | contract
+    doc_id: int
+    font_size: Optional[str] = None  # vetëm për ofertat
+
+class OutboxEmailCreate(BaseModel):
+    doc_type: str  # invoice | offer
+    doc_id: int
+    dest_email: Optional[EmailStr] = None  # mungon: email-i i klientit
+
 class StatusUpdate(BaseModel):
     status: str
 
@@ -0,0 +1,172 @@
+"""Indeksi i kërkimit: tabelë tokenash (search_tokens) për faturat, ofertat dhe klientët.
+
+TiDB nuk ka indekse FULLTEXT, prandaj indeksi mbahet nga aplikacioni: çdo fjalë e normalizuar
+(pa diakritikë, lowercase) ruhet si rresht me peshë sipas fushës. Kërkimi bëhet me prefiks
+(`token LIKE 'abc%'`) mbi indeksin (token) dhe renditet sipas shumës së peshave.
+Indeksi përditësohet brenda transaksionit nga sync_log (edhe për bulk delete).
+Rindërtimi i plotë: `python search_index.py`.
+"""
+import re
+import unicodedata
+from collections import defaultdict
+
+from sqlalchemy import func, literal, select, union_all
+
+import models
+import sync_log
+
+TOKEN_LENGTH = 64
+# Fjalë që i ka çdo numër dokumenti – nuk ndihmojnë në kërkim
+STOPWORDS = {"fatura", "oferta", "nr"}
+_SPLIT_RE = re.compile(r"[^0-9a-z]+")
+
+# entity -> (modeli, [(kolona, pesha, compact)], (modeli i artikujve, FK, pesha) ose None)
+# compact: indekso edhe vlerën pa hapësira/shenja (p.sh. telefoni 044123456)
+SOURCES = {
+    "invoices": (
+        models.Invoice,
+        [("invoice_number", 8, False)],
+        (models.InvoiceItem, "invoice_id", 2),
+    ),
+    "offers": (
+        models.Offer,
+        [("offer_number", 8, False), ("subject", 4, False), ("description", 1, False)],
+        (models.OfferItem, "offer_id", 2),
+    ),
+    "clients": (
+        models.Client,
+        [("name", 6, False), ("unique_number", 8, True), ("email", 3, False), ("phone", 3, True), ("address", 1, False)],
+        None,
+    ),
+}
+ENTITIES = tuple(SOURCES)
+_BATCH = 500
+
+
+def normalize(text) -> str:
+    """'Shërbim Çelësi' -> 'sherbim celesi'."""
+    decomposed = unicodedata.normalize("NFKD", str(text or ""))
+    return decomposed.encode("ascii", "ignore").decode("ascii").lower()
+
+
+def tokenize(text) -> list:
+    return [t[:TOKEN_LENGTH] for t in _SPLIT_RE.split(normalize(text)) if t and t not in STOPWORDS]
+
+
+def _field_tokens(tokens: dict, text, weight: int, compact: bool):
+    words = tokenize(text)
+    if compact and len(words) > 1:
+        words.append("".join(words)[:TOKEN_LENGTH])
+    for word in words:
+        if tokens.get(word, 0) < weight:
+            tokens[word] = weight
+
+
+def _load_tokens(connection, entity: str, ids: list) -> dict:
+    """{entity_id: {token: weight}} nga gjendja aktuale në DB (pas flush-it)."""
+    model, fields, items = SOURCES[entity]
+    columns = [getattr(model, name) for name, _, _ in fields]
+    result = defaultdict(dict)
+    for row in connection.execute(select(model.id, *columns).where(model.id.in_(ids))):
+        tokens = result[row[0]]
+        for (name, weight, compact), value in zip(fields, row[1:]):
+            _field_tokens(tokens, value, weight, compact)
+    if items:
+        item_model, fk, weight = items
+        fk_col = getattr(item_model, fk)
+        for parent_id, description in connection.execute(
+            select(fk_col, item_model.description).where(fk_col.in_(list(result)))
+        ):
+            _field_tokens(result[parent_id], description, weight, False)
+    return result
+
+
+def _reindex(connection, entity: str, ids: list):
+    table = models.SearchToken.__table__
+    for start in range(0, len(ids), _BATCH):
+        chunk = ids[start:start + _BATCH]
+        connection.execute(table.delete().where(table.c.entity == entity, table.c.entity_id.in_(chunk)))
+        rows = [
+            {"entity": entity, "entity_id": entity_id, "token": token, "weight": weight}
+            for entity_id, tokens in _load_tokens(connection, entity, chunk).items()
+            for token, weight in tokens.items()
+        ]
+        if rows:
+            connection.execute(table.insert(), rows)
+
+
+def _on_changes(session, changes: dict):
+    by_entity = defaultdict(list)
+    for (entity, entity_id), _op in changes.items():
+        if entity in SOURCES:
+            by_entity[entity].append(entity_id)
+    connection = session.connection()
+    for entity, ids in by_entity.items():
+        # Rreshtat e fshirë nuk gjenden më, kështu mbeten vetëm pa tokena
+        _reindex(connection, entity, ids)
+
+
+def install():
+    """Indeksi ndjek çdo ndryshim që regjistron sync_log (flush dhe bulk delete)."""
+    sync_log.on_changes(_on_changes)
+
+
+def rebuild(session) -> int:
+    """Rindërton të gjithë indeksin; kthen numrin e tokenave."""
+    connection = session.connection()
+    table = models.SearchToken.__table__
+    connection.execute(table.delete())
+    for entity, (model, _, _) in SOURCES.items():
+        ids = [row[0] for row in connection.execute(select(model.id))]
+        _reindex(connection, entity, ids)
+    return connection.execute(select(func.count()).select_from(table)).scalar()
+
+
+def _ranked(terms: list, entities):
+    """(entity, entity_id, score) për dokumentet që përmbajnë të gjitha fjalët (si prefiks)."""
+    token = models.SearchToken
+    per_term = [
+        select(token.entity, token.entity_id, literal(i).label("term"), func.max(token.weight).label("weight"))
+        .where(token.token.like(term + "%"), token.entity.in_(entities))
+        .group_by(token.entity, token.entity_id)
+        for i, term in enumerate(terms)
+    ]
+    matched = (per_term[0] if len(per_term) == 1 else union_all(*per_term)).subquery()
+    return select(
+        matched.c.entity, matched.c.entity_id, func.sum(matched.c.weight).label("score")
+    ).group_by(matched.c.entity, matched.c.entity_id).having(func.count() == len(terms))
+
+
+def matching_ids(query: str, entity: str):
+    """Subquery me id-të që përputhen (për `Model.id.in_(...)`); None nëse kërkimi s'ka fjalë."""
+    terms = tokenize(query)
+    if not terms:
+        return None
+    ranked = _ranked(terms, [entity]).subquery()
+    return select(ranked.c.entity_id)
+
+
+def search(session, query: str, entities=ENTITIES, limit: int = 20) -> list:
+    """[(entity, entity_id, score)] të renditura sipas peshës."""
+    terms = tokenize(query)
+    if not terms:
+        return []
+    ranked = _ranked(terms, list(entities)).subquery()
+    rows = session.execute(
+        select(ranked.c.entity, ranked.c.entity_id, ranked.c.score)
+        .order_by(ranked.c.score.desc(), ranked.c.entity_id.desc())
+        .limit(limit)
+    ).all()
+    return [(row.entity, row.entity_id, int(row.score)) for row in rows]
+
+
+if __name__ == "__main__":
+    import database
+
+    db = database.SessionLocal()
+    try:
+        count = rebuild(db)
+        db.commit()
+        print(f"search_tokens rebuilt: {count} tokens.")
+    finally:
+        db.close()
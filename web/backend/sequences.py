@@ -0,0 +1,189 @@
+"""Numërimi i dokumenteve: një rresht për (doc_type, year, device_prefix) në document_sequences.
+
+Alokimi bëhet me `SELECT ... FOR UPDATE` brenda transaksionit që krijon dokumentin,
+prandaj dy krijime njëkohësisht (nga pajisje të ndryshme) nuk marrin të njëjtin numër
+dhe asnjë dokument i ruajtur nuk rinumërohet.
+"""
+import re
+from datetime import date
+
+from sqlalchemy import event, func
+from sqlalchemy.exc import IntegrityError
+
+import models
+
+# Ofertat numërohen pa u rinisur çdo vit (si më parë)
+NO_YEAR = 0
+
+# Desktop-i ka kopjen e vet të parserit (utils/doc_number.py, ndërtohet veç); tests/test_doc_number.py
+# kontrollon që të dy japin të njëjtat seq_no/seq_suffix për indeksin UNIQUE
+_NUMBER_RE = re.compile(r'NR\.(\d+)', re.IGNORECASE)
+
+# doc_type -> (modeli, kolona e numrit, numërim vjetor)
+DOCUMENTS = {
+    "invoice": (models.Invoice, "invoice_number", True),
+    "offer": (models.Offer, "offer_number", False),
+}
+
+
+# Formati i vjetër i ofertave: OF-2024-007
+_LEGACY_OFFER_RE = re.compile(r'^OF-\d+-(\d+)$', re.IGNORECASE)
+SUFFIX_LENGTH = 20
+MAX_CONFLICT_RETRIES = 5
+
+
+def parse_number(number: str | None):
+    """'FATURA NR.12/A' -> (12, 'A'); (None, '') nëse numri nuk ka formatin NR.X."""
+    match = _NUMBER_RE.search(number or "")
+    if not match:
+        return None, ""
+    suffix = number[match.end():].strip()
+    return int(match.group(1)), suffix.lstrip("/")[:SUFFIX_LENGTH]
+
+
+def seq_columns(number: str | None):
+    """(seq_no, seq_suffix) që ruhen në rresht; përfshin edhe formatin e vjetër OF-YYYY-XXX."""
+    value, suffix = parse_number(number)
+    if value is None:
+        legacy = _LEGACY_OFFER_RE.match((number or "").strip())
+        if legacy:
+            return int(legacy.group(1)), ""
+    return value, suffix
+
+
+def sequence_year(doc_type: str, doc_date: date) -> int:
+    return doc_date.year if DOCUMENTS[doc_type][2] else NO_YEAR
+
+
+def _fill_seq_columns(mapper, connection, target):
+    number_col = DOCUMENTS["invoice" if isinstance(target, models.Invoice) else "offer"][1]
+    target.doc_year = target.date.year if target.date else None
+    target.seq_no, target.seq_suffix = seq_columns(getattr(target, number_col))
+
+
+def install():
+    """doc_year/seq_no/seq_suffix llogariten para çdo INSERT/UPDATE të faturave dhe ofertave."""
+    for model, _, _ in DOCUMENTS.values():
+        for name in ("before_insert", "before_update"):
+            if not event.contains(model, name, _fill_seq_columns):
+                event.listen(model, name, _fill_seq_columns)
+
+
+def _scan_max(db, doc_type: str, year: int, device_prefix: str) -> int:
+    """Vlera fillestare e sekuencës: numri më i madh ekzistues (vetëm kur rreshti krijohet)."""
+    model = DOCUMENTS[doc_type][0]
+    query = db.query(func.max(model.seq_no)).filter(model.seq_suffix == device_prefix)
+    if year != NO_YEAR:
+        query = query.filter(model.doc_year == year)
+    return query.scalar() or 0
+
+
+def _locked_row(db, doc_type: str, year: int, device_prefix: str):
+    seq = models.DocumentSequence
+    return db.query(seq).filter(
+        seq.doc_type == doc_type, seq.year == year, seq.device_prefix == device_prefix
+    ).with_for_update().first()
+
+
+def _sequence_row(db, doc_type: str, year: int, device_prefix: str):
+    """Rreshti i sekuencës, i bllokuar deri në fund të transaksionit; krijohet nëse mungon."""
+    row = _locked_row(db, doc_type, year, device_prefix)
+    if row is not None:
+        return row
+    start = _scan_max(db, doc_type, year, device_prefix) + 1
+    try:
+        with db.begin_nested():
+            db.add(models.DocumentSequence(doc_type=doc_type, year=year, device_prefix=device_prefix, next_value=start))
+    except IntegrityError:
+        # Një transaksion tjetër e krijoi ndërkohë
+        pass
+    return _locked_row(db, doc_type, year, device_prefix)
+
+
+def is_taken(db, doc_type: str, year: int, number: str, exclude_id: int | None = None) -> bool:
+    """A ekziston dokument me këtë numër në vitin `year` (NO_YEAR = në çdo vit)? Kërkim me indeks."""
+    model, number_col, _ = DOCUMENTS[doc_type]
+    seq_no, suffix = seq_columns(number)
+    query = db.query(model.id)
+    if seq_no is None:
+        query = query.filter(getattr(model, number_col) == number)
+    else:
+        query = query.filter(model.seq_no == seq_no, model.seq_suffix == suffix)
+    if year != NO_YEAR:
+        query = query.filter(model.doc_year == year)
+    if exclude_id is not None:
+        query = query.filter(model.id != exclude_id)
+    return query.first() is not None
+
+
+def peek(db, doc_type: str, year: int, device_prefix: str = "") -> int:
+    """Numri i radhës pa e rezervuar (për formularin); pa lock."""
+    seq = models.DocumentSequence
+    row = db.query(seq.next_value).filter(
+        seq.doc_type == doc_type, seq.year == year, seq.device_prefix == device_prefix
+    ).first()
+    if row is not None:
+        return row.next_value
+    return _scan_max(db, doc_type, year, device_prefix) + 1
+
+
+def _with_value(number: str, value: int) -> str:
+    """Zëvendëson vetëm shifrat pas 'NR.' (prefiksi dhe prapashtesa mbeten si janë)."""
+    return _NUMBER_RE.sub(f"NR.{value}", number, count=1)
+
+
+def _next_free(db, doc_type: str, year: int, requested: str, row) -> str:
+    """Numri i parë i lirë nga next_value (nën lock-un e rreshtit) – kapërcen numrat e zënë nga desktop-i."""
+    value = row.next_value
+    while is_taken(db, doc_type, year, _with_value(requested, value)):
+        value += 1
+    row.next_value = value + 1
+    return _with_value(requested, value)
+
+
+def allocate(db, doc_type: str, year: int, requested: str) -> str:
+    """
+    Kthen numrin përfundimtar për dokumentin e ri.
+    - numri i kërkuar është >= next_value dhe i lirë: pranohet, sekuenca kalon pas tij;
+    - përndryshe merr next_value, duke kapërcyer numrat e zënë (p.sh. nga desktop-i).
+    Një numër nën next_value konsiderohet gjithmonë i zënë: is_taken lexon snapshot-in e
+    transaksionit (REPEATABLE READ) dhe nuk e sheh numrin që një transaksion tjetër sapo e mori;
+    vetëm rreshti i bllokuar i sekuencës është burim i sigurt për numrat nën këtë kufi.
+    Numrat pa formatin NR.X ruhen ashtu siç janë.
+    """
+    value, device_prefix = parse_number(requested)
+    if value is None:
+        return requested
+    row = _sequence_row(db, doc_type, year, device_prefix)
+    if value >= row.next_value and not is_taken(db, doc_type, year, requested):
+        row.next_value = value + 1
+        return requested
+    return _next_free(db, doc_type, year, requested, row)
+
+
+def _is_number_conflict(error: IntegrityError) -> bool:
+    message = str(error.orig)
+    return "_year_seq" in message or "seq_no" in message
+
+
+def flush_new(db, doc, doc_type: str, year: int):
+    """
+    Shton dokumentin e ri (numri nga `allocate`) dhe bën flush në një savepoint. Nëse indeksi
+    unik (doc_year, seq_no, seq_suffix) e refuzon numrin – e shkroi ndërkohë dikush që nuk kalon
+    nga sekuenca, p.sh. desktop-i – merr numrin e radhës dhe provon sërish.
+    """
+    number_col = DOCUMENTS[doc_type][1]
+    for attempt in range(MAX_CONFLICT_RETRIES):
+        try:
+            with db.begin_nested():
+                db.add(doc)
+                db.flush()
+            return doc
+        except IntegrityError as e:
+            number = getattr(doc, number_col)
+            value, device_prefix = parse_number(number)
+            if value is None or attempt == MAX_CONFLICT_RETRIES - 1 or not _is_number_conflict(e):
+                raise
+            row = _sequence_row(db, doc_type, year, device_prefix)
+            row.next_value = max(row.next_value, value + 1)
+            setattr(doc, number_col, _next_free(db, doc_type, year, number, row))
@@ -1,32 +1,36 @@
 import smtplib
 import os
 import ssl
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from services import mime_stream
+import metrics
 
 
-class WebEmailService:
-    @staticmethod
-    def send_document(document, company, dest_email, pdf_path, is_offer=False):
-        """Dërgon faturën ose ofertën me email (SMTP nga Cilësimet)"""
-        if not dest_email:
-            return False, "Adresa e email-it marrës nuk është caktuar."
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "3"))
 
-        if not company or not company.smtp_user or not company.smtp_password:
-            return False, "Cilësimet e email-it (SMTP) nuk janë konfiguruar në Cilësimet."
-            
-        doc_type = "Ofertë" if is_offer else "Faturë"
-        doc_number = document.offer_number if is_offer else document.invoice_number
-        
-        try:
-            msg = MIMEMultipart()
-            msg['From'] = f"{company.name} <{company.smtp_user}>"
-            msg['To'] = dest_email
-            msg['Subject'] = f"{doc_type} e re: {doc_number} - {company.name}"
 
-            body = f"""
+def _connect(company):
+    """Lidhje SMTP e hapur (TLS) dhe e autentikuar me kredencialet e kompanisë."""
+    context = ssl.create_default_context()
+    port = int(company.smtp_port or 587)
+    if port == 465:
+        server = smtplib.SMTP_SSL(company.smtp_server or "smtp.gmail.com", 465, context=context, timeout=15)
+    else:
+        server = smtplib.SMTP(company.smtp_server or "smtp.gmail.com", port, timeout=15)
+        server.starttls(context=context)
+    server.login(company.smtp_user, company.smtp_password)
+    return server
+
+
+def _document_message(document, company, dest_email, pdf_path, is_offer=False, filename=None):
+    """Mesazhi i një dokumenti si skedar spool (shih mime_stream); thirrësi e mbyll."""
+    doc_type = "Ofertë" if is_offer else "Faturë"
+    doc_number = document.offer_number if is_offer else document.invoice_number
+    subject = f"{doc_type} e re: {doc_number} - {company.name}"
+
+    body = f"""
 I/E dashur klient,
 
 Ju lutem gjeni të bashkëngjitur {doc_type.lower()}n tuaj të re me numër {doc_number}.
@@ -42,40 +46,129 @@ Me respekt,
 {company.name}
 {company.phone or ''}
 """
-            msg.attach(MIMEText(body, 'plain'))
-
-            if pdf_path and os.path.exists(pdf_path):
-                with open(pdf_path, "rb") as attachment:
-                    part = MIMEBase("application", "octet-stream")
-                    part.set_payload(attachment.read())
-                encoders.encode_base64(part)
-                part.add_header("Content-Disposition", f"attachment; filename= {os.path.basename(pdf_path)}")
-                msg.attach(part)
-
-            text = msg.as_string()
-            context = ssl.create_default_context()
-            
+    return mime_stream.spool_message(
+        company.name, company.smtp_user, dest_email, subject, body, [(pdf_path, filename)]
+    )
+
+
+def _bulk_message(documents, company, dest_email, pdf_paths, is_offer=False, filenames=None):
+    doc_type = "Oferta" if is_offer else "Faturat"
+    lines = [
+        f"{doc.offer_number if is_offer else doc.invoice_number} - {doc.date.strftime('%d.%m.%Y')}"
+        for doc in documents
+    ]
+    names = filenames or [None] * len(pdf_paths or [])
+    return mime_stream.spool_message(
+        company.name, company.smtp_user, dest_email, f"{doc_type} - {company.name}",
+        "\n".join(lines), list(zip(pdf_paths or [], names))
+    )
+
+
+class SMTPPool:
+    """
+    Disa lidhje SMTP të autentikuara që ripërdoren për shumë mesazhe (një handshake/login
+    për lidhje, jo për email). Më së shumti `size` mesazhe dërgohen njëkohësisht.
+    """
+
+    def __init__(self, company, size=SMTP_POOL_SIZE):
+        self.company = company
+        self.size = max(1, size)
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+
+    def send(self, dest_email, spool):
+        """Dërgon mesazhin (skedar spool nga mime_stream) përmes një lidhjeje të lirë."""
+        with self._slots, metrics.timer(metrics.SMTP_SEND_SECONDS, "smtp", result="ok"):
+            try:
+                server = self._idle.get_nowait()
+            except queue.Empty:
+                server = _connect(self.company)
+            try:
+                self._send_on(server, dest_email, spool)
+            except smtplib.SMTPServerDisconnected:
+                # Serveri e mbylli lidhjen e papunë: provo njëherë me lidhje të re
+                self._send_on(_connect(self.company), dest_email, spool)
+
+    def _send_on(self, server, dest_email, spool):
+        """Një dërgim mbi `server`; pas tij lidhja kthehet te `_idle` ose mbyllet, kurrë nuk humbet."""
+        try:
+            mime_stream.send_spooled(server, self.company.smtp_user, dest_email, spool)
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            # Serveri u përgjigj (p.sh. marrësi u refuzua) dhe send_spooled bëri RSET:
+            # lidhja mbetet e përdorshme, përveç kur serveri e mbylli (421)
+            self._release(server)
+            raise
+        except Exception:
+            # Gjendja e sesionit e panjohur (p.sh. në mes të DATA): pa QUIT, që të mos presim timeout-in
+            server.close()
+            raise
+        self._idle.put(server)
+
+    def _release(self, server):
+        # _reset i mime_stream e mbyll lidhjen pas 421: ajo nuk kthehet te pool-i
+        if getattr(server, "sock", None) is not None:
+            self._idle.put(server)
+
+    def close(self):
+        while True:
             try:
-                port = int(company.smtp_port or 587)
-                if port == 465:
-                    server = smtplib.SMTP_SSL(company.smtp_server or "smtp.gmail.com", 465, context=context, timeout=15)
-                else:
-                    server = smtplib.SMTP(company.smtp_server or "smtp.gmail.com", port, timeout=15)
-                    server.starttls(context=context)
-                
-                server.login(company.smtp_user, company.smtp_password)
-                server.sendmail(company.smtp_user, dest_email, text)
+                server = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            _close(server)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _send_spool(company, dest_email, spool):
+    """Një mesazh me lidhje të re; spool-i mbyllet në çdo rast."""
+    with spool:
+        try:
+            with metrics.timer(metrics.SMTP_SEND_SECONDS, "smtp", result="ok"):
+                server = _connect(company)
+                mime_stream.send_spooled(server, company.smtp_user, dest_email, spool)
                 server.quit()
-                return True, "Email u dërgua me sukses!"
-            except Exception as e:
-                return False, f"Gabim SMTP: {str(e)}"
+            return True, "Email u dërgua me sukses!"
+        except Exception as e:
+            return False, f"Gabim SMTP: {str(e)}"
 
+
+def _close(server):
+    try:
+        server.quit()
+    except Exception:
+        server.close()
+
+
+class WebEmailService:
+    @staticmethod
+    def send_document(document, company, dest_email, pdf_path, is_offer=False, filename=None):
+        """Dërgon faturën ose ofertën me email (SMTP nga Cilësimet)"""
+        if not dest_email:
+            return False, "Adresa e email-it marrës nuk është caktuar."
+
+        if not company or not company.smtp_user or not company.smtp_password:
+            return False, "Cilësimet e email-it (SMTP) nuk janë konfiguruar në Cilësimet."
+            
+        try:
+            spool = _document_message(document, company, dest_email, pdf_path, is_offer, filename)
         except Exception as e:
             return False, f"Gabim gjatë përgatitjes: {str(e)}"
+        return _send_spool(company, dest_email, spool)
+
+    @staticmethod
+    def send_with_pool(pool, document, company, dest_email, pdf_path, is_offer=False, filename=None):
+        """Si send_document, por përmes një SMTPPool; gabimet SMTP ngrihen (thirrësi vendos për ripërpjekjen)."""
+        with _document_message(document, company, dest_email, pdf_path, is_offer, filename) as spool:
+            pool.send(dest_email, spool)
 
     @staticmethod
-    def send_bulk_documents(documents, company, dest_email, pdf_paths, is_offer=False):
-        """Dërgon disa fatura ose oferta me një email të vetëm"""
+    def send_bulk_documents(documents, company, dest_email, pdf_paths, is_offer=False, filenames=None):
+        """Dërgon disa fatura ose oferta me një email të vetëm (filenames: emrat e bashkëngjitjeve)"""
         if not dest_email:
             return False, "Adresa e email-it marrës nuk është caktuar."
 
@@ -83,45 +176,33 @@ Me respekt,
             return False, "Cilësimet e email-it (SMTP) nuk janë konfiguruar në Cilësimet."
 
         try:
-            msg = MIMEMultipart()
-            msg['From'] = f"{company.name} <{company.smtp_user}>"
-            msg['To'] = dest_email
-            doc_type = "Oferta" if is_offer else "Faturat"
-            msg['Subject'] = f"{doc_type} - {company.name}"
-
-            lines = [
-                f"{doc.offer_number if is_offer else doc.invoice_number} - {doc.date.strftime('%d.%m.%Y')}"
-                for doc in documents
-            ]
-            body = "\n".join(lines)
-            msg.attach(MIMEText(body, 'plain'))
-
-            for pdf_path in (pdf_paths or []):
-                if pdf_path and os.path.exists(pdf_path):
-                    with open(pdf_path, "rb") as attachment:
-                        part = MIMEBase("application", "octet-stream")
-                        part.set_payload(attachment.read())
-                    encoders.encode_base64(part)
-                    part.add_header("Content-Disposition", f"attachment; filename= {os.path.basename(pdf_path)}")
-                    msg.attach(part)
-
-            text = msg.as_string()
-            context = ssl.create_default_context()
+            spool = _bulk_message(documents, company, dest_email, pdf_paths, is_offer, filenames)
+        except Exception as e:
+            return False, f"Gabim gjatë përgatitjes: {str(e)}"
+        return _send_spool(company, dest_email, spool)
+
+    @staticmethod
+    def send_bulk_per_recipient(groups, company, is_offer=False):
+        """
+        Një email për çdo marrës, përmes një SMTPPool të përbashkët.
+        groups: [(dest_email, documents, pdf_paths, filenames)] → [(dest_email, ok, mesazhi)] në të njëjtën radhë.
+        """
+        if not company or not company.smtp_user or not company.smtp_password:
+            return [(group[0], False, "Cilësimet e email-it (SMTP) nuk janë konfiguruar në Cilësimet.") for group in groups]
 
+        def send_one(pool, group):
+            dest_email, documents, pdf_paths, filenames = group
             try:
-                port = int(company.smtp_port or 587)
-                if port == 465:
-                    server = smtplib.SMTP_SSL(company.smtp_server or "smtp.gmail.com", 465, context=context, timeout=15)
-                else:
-                    server = smtplib.SMTP(company.smtp_server or "smtp.gmail.com", port, timeout=15)
-                    server.starttls(context=context)
-
-                server.login(company.smtp_user, company.smtp_password)
-                server.sendmail(company.smtp_user, dest_email, text)
-                server.quit()
-                return True, "Email u dërgua me sukses!"
+                spool = _bulk_message(documents, company, dest_email, pdf_paths, is_offer, filenames)
             except Exception as e:
-                return False, f"Gabim SMTP: {str(e)}"
-
-        except Exception as e:
-            return False, f"Gabim gjatë përgatitjes: {str(e)}"
+                return dest_email, False, f"Gabim gjatë përgatitjes: {str(e)}"
+            with spool:
+                try:
+                    pool.send(dest_email, spool)
+                    return dest_email, True, "Email u dërgua me sukses!"
+                except Exception as e:
+                    return dest_email, False, f"Gabim SMTP: {str(e)}"
+
+        with SMTPPool(company, min(SMTP_POOL_SIZE, len(groups) or 1)) as pool:
+            with ThreadPoolExecutor(max_workers=pool.size, thread_name_prefix="smtp") as executor:
+                return list(executor.map(lambda group: send_one(pool, group), groups))
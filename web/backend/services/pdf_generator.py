@@ -1,6 +1,8 @@
 import os
 import tempfile
 import atexit
+import hashlib
+import threading
 from decimal import Decimal
 from datetime import datetime
 from reportlab.lib.pagesizes import A4
@@ -8,12 +10,13 @@ from reportlab.lib.units import mm
 from reportlab.lib import colors
 from reportlab.platypus import (
     SimpleDocTemplate, Table, TableStyle,
-    Paragraph, Spacer, Image
+    Paragraph, Spacer, Image, PageBreak
 )
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_RIGHT
 from PIL import Image as PILImage, ImageOps
 import json
+import metrics
 try:
     import vercel
 except ImportError:
@@ -25,6 +28,33 @@ EXPORTS_DIR = os.path.join(BASE_DIR, "exports")
 os.makedirs(EXPORTS_DIR, exist_ok=True)
 _LOGO_CACHE = {}  # Cache for processed logo paths: { (original_path, height): (processed_path, width, height) }
 
+# Cache sipas përmbajtjes: exports/cache/ab/<sha256>.pdf (çelësi = gjurma e dokumentit, shih fingerprint)
+CACHE_DIR = os.path.join(EXPORTS_DIR, "cache")
+# Rrite kur ndryshon pamja e PDF-ve, që skedarët e vjetër të mos ripërdoren
+RENDER_VERSION = 1
+# Kolona që nuk shfaqen në PDF: ndryshimi i tyre nuk kërkon renderim të ri
+_NON_RENDERED_COLUMNS = {
+    "id", "pdf_path", "status", "created_at", "updated_at", "save_timestamp",
+    "doc_year", "seq_no", "seq_suffix", "client_id", "invoice_id", "offer_id",
+}
+_COMPANY_PDF_FIELDS = (
+    "name", "address", "phone", "email", "unique_number", "fiscal_number", "account_nib", "logo_path",
+)
+_LOGO_DIGESTS = {}  # { (resolved_path, size, mtime_ns): sha256 }
+_BLOB_URLS = {}  # { çelësi: URL-ja në Blob } – një ngarkim për çelës në proces
+
+
+def _rendered_values(obj) -> dict:
+    """Vlerat e kolonave që ndikojnë në PDF (modele ORM ose objekte të thjeshta)."""
+    table = getattr(obj, "__table__", None)
+    names = [c.key for c in table.columns] if table is not None else sorted(vars(obj))
+    return {
+        name: getattr(obj, name, None)
+        for name in names
+        if name not in _NON_RENDERED_COLUMNS and not name.startswith("_")
+    }
+
+
 class WebPDFGenerator:
     def __init__(self):
         self.styles = getSampleStyleSheet()
@@ -77,14 +107,13 @@ class WebPDFGenerator:
             return date_obj.strftime("%d %m %Y")
         return ""
 
-    def process_logo(self, logo_path, logo_height=32*mm):
-        """Perpunon logon duke hequr pjeset e bardha (me caching dhe optimizim)"""
+    def _resolve_logo(self, logo_path):
+        """Rruga absolute e logos (ose e logos default); None nëse skedari mungon."""
         if not logo_path:
             logo_path = os.path.join(BASE_DIR, "..", "assets", "images", "logo.png")
             if not os.path.exists(logo_path):
-                return None, 0
+                return None
 
-        # Resolve path
         resolved_path = logo_path
         if not os.path.isabs(logo_path):
             candidate = os.path.join(BASE_DIR, logo_path)
@@ -95,7 +124,12 @@ class WebPDFGenerator:
                 if os.path.exists(repo_candidate):
                     resolved_path = repo_candidate
 
-        if not os.path.exists(resolved_path):
+        return resolved_path if os.path.exists(resolved_path) else None
+
+    def process_logo(self, logo_path, logo_height=32*mm):
+        """Perpunon logon duke hequr pjeset e bardha (me caching dhe optimizim)"""
+        resolved_path = self._resolve_logo(logo_path)
+        if not resolved_path:
             return None, 0
 
         # Check Cache
@@ -154,32 +188,195 @@ class WebPDFGenerator:
         os.makedirs(folder_path, exist_ok=True)
         return os.path.join(folder_path, filename)
 
+    def _upload_blob(self, local_path, cloud_path):
+        """Ngarkon skedarin në Vercel Blob nëse token-i ekziston; kthen URL-në ose None."""
+        token = os.environ.get("BLOB_READ_WRITE_TOKEN")
+        if not (token and vercel):
+            return None
+        try:
+            with open(local_path, "rb") as f:
+                return vercel.blob.put(cloud_path, f.read(), token=token).url
+        except Exception as e:
+            print(f"Cloud upload failed: {e}")
+            return None
+
     def _handle_post_generation(self, local_path, doc_type, date_obj, filename):
         """Me ndihmën e këtij funksioni skedarët ngarkohen në Vercel Blob nëse token-i ekziston"""
-        token = os.environ.get("BLOB_READ_WRITE_TOKEN")
-        if token and vercel:
+        url = self._upload_blob(local_path, f"{doc_type}/{date_obj.year}/{date_obj.month:02d}/{filename}")
+        if url is None:
+            return local_path
+        if os.path.exists(local_path):
+            os.remove(local_path)
+        return url
+
+    def _logo_digest(self, logo_path):
+        """sha256 e skedarit të logos (rillogaritet vetëm kur ndryshon madhësia/mtime)."""
+        resolved_path = self._resolve_logo(logo_path)
+        if not resolved_path:
+            return None
+        stat = os.stat(resolved_path)
+        key = (resolved_path, stat.st_size, stat.st_mtime_ns)
+        digest = _LOGO_DIGESTS.get(key)
+        if digest is None:
+            with open(resolved_path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            _LOGO_DIGESTS[key] = digest
+        return digest
+
+    def fingerprint(self, kind, doc, company, client=None, **options):
+        """
+        Çelësi i cache-it: sha256 e gjithçkaje që del në PDF – dokumenti, artikujt, klienti,
+        kompania, skedari i logos dhe opsionet (p.sh. font_size). Dokumente identike → i njëjti çelës.
+        """
+        payload = {
+            "version": RENDER_VERSION,
+            "kind": kind,
+            "doc": _rendered_values(doc),
+            "items": [_rendered_values(item) for item in (getattr(doc, "items", None) or [])],
+            "client": _rendered_values(client) if client is not None else None,
+            "company": {name: getattr(company, name, None) for name in _COMPANY_PDF_FIELDS} if company else None,
+            "logo": self._logo_digest(getattr(company, "logo_path", None)),
+            "options": {key: value for key, value in options.items() if value},
+        }
+        raw = json.dumps(payload, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def cache_path(self, key):
+        return os.path.join(CACHE_DIR, key[:2], f"{key}.pdf")
+
+    def blob_location(self, key, known=None):
+        """URL-ja në Blob për këtë çelës nëse dihet (`known`, p.sh. pdf_path i dokumentit, ose nga ky proces)."""
+        if known and known.startswith(('http://', 'https://')) and f"pdf/{key}" in known:
+            return known
+        return _BLOB_URLS.get(key)
+
+    def render_cached(self, kind, doc, company, client=None, font_size=None, known=None):
+        """
+        (rruga ose URL, çelësi) i PDF-së nga cache-i sipas përmbajtjes; renderon vetëm kur mungon.
+        Variantet (p.sh. madhësi të ndryshme fonti) kanë çelësa të ndryshëm dhe bashkëjetojnë.
+        Me Blob, vendndodhja është gjithmonë URL-ja e Blob-it (edhe kur PDF-ja gjendet lokalisht);
+        `known` (pdf_path i ruajtur) shmang renderimin dhe ngarkimin pas një cold start.
+        """
+        key = self.fingerprint(kind, doc, company, client, font_size=font_size)
+        url = self.blob_location(key, known)
+        if url:
+            return url, key
+        path = self.cache_path(key)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Shkruaj në skedar të përkohshëm: dy renderime njëkohësisht nuk lënë PDF të cunguar
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
             try:
-                cloud_path = f"{doc_type}/{date_obj.year}/{date_obj.month:02d}/{filename}"
-                with open(local_path, "rb") as f:
-                    blob = vercel.blob.put(cloud_path, f.read(), token=token)
-                if os.path.exists(local_path):
-                    os.remove(local_path)
-                return blob.url
-            except Exception as e:
-                print(f"Cloud upload failed: {e}")
-                return local_path
-        return local_path
-
-    def generate_invoice_pdf(self, invoice, company, client):
-        year = invoice.date.year if hasattr(invoice.date, 'year') else datetime.now().year
-        filename = f"Fatura_{invoice.invoice_number.replace(' ', '_')}_{year}.pdf"
-        filepath = self._get_storage_path("faturat", invoice.date, filename)
+                with metrics.timer(metrics.PDF_RENDER_SECONDS, "pdf", kind=kind):
+                    if kind == "invoice":
+                        self.generate_invoice_pdf(doc, company, client, output_path=tmp_path)
+                    elif kind == "offer":
+                        self.generate_offer_pdf(doc, company, client, manual_font_size=font_size, output_path=tmp_path)
+                    else:
+                        self.generate_contract_pdf(doc, company, output_path=tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        url = self._upload_blob(path, f"pdf/{key}.pdf")
+        if url:
+            _BLOB_URLS[key] = url
+        return url or path, key
+
+    def generate_batch_pdf(self, kind, documents, company, output_path, manual_font_size=None):
+        """
+        N fatura ose oferta në një PDF me një build të vetëm: stilet, logoja e përpunuar
+        (një XObject i vetëm në PDF) dhe fontet përdoren për të gjitha; çdo dokument nis në faqe të re.
+        documents: [(dokumenti, klienti)].
+        """
+        story = []
+        for index, (doc, client) in enumerate(documents):
+            if index:
+                story.append(PageBreak())
+            if kind == "invoice":
+                story += self._invoice_story(doc, company, client)
+            else:
+                story += self._offer_story(doc, company, client, manual_font_size)
+        if kind == "invoice":
+            self._invoice_template(output_path).build(
+                story, onFirstPage=self._draw_invoice_signatures, onLaterPages=self._draw_invoice_signatures
+            )
+        else:
+            self._offer_template(output_path).build(story)
+        return output_path
+
+    def render_batch_cached(self, kind, documents, company, font_size=None):
+        """Si render_cached, për PDF-në e përbashkët; çelësi varet nga gjurmët e të gjithë dokumenteve."""
+        fingerprints = [self.fingerprint(kind, doc, company, client, font_size=font_size) for doc, client in documents]
+        key = hashlib.sha256(f"batch|{kind}|{'|'.join(fingerprints)}".encode("utf-8")).hexdigest()
+        path = self.cache_path(key)
+        if os.path.exists(path):
+            return path, key
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with metrics.timer(metrics.PDF_RENDER_SECONDS, "pdf", kind=f"{kind}-batch"):
+                self.generate_batch_pdf(kind, documents, company, tmp_path, manual_font_size=font_size)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return path, key
+
+    def document_filename(self, kind, doc):
+        """Emri i skedarit për shkarkim (i njëjtë me atë që përdor ruajtja sipas datës)."""
+        if kind == "invoice":
+            year = doc.date.year if hasattr(doc.date, 'year') else datetime.now().year
+            return f"Fatura_{doc.invoice_number.replace(' ', '_')}_{year}.pdf"
+        if kind == "offer":
+            return f"Oferta_{doc.offer_number.replace(' ', '_')}.pdf"
+        safe_name = (doc.employee_name or "Kontrate").replace(" ", "_")[:50]
+        return f"Kontrate_{safe_name}_{self._contract_date(doc).year}.pdf"
+
+    def _contract_date(self, contract):
+        from datetime import date as date_type
+        sig_date = contract.signing_date
+        if hasattr(sig_date, 'year'):
+            return sig_date
+        try:
+            return datetime.strptime(str(sig_date), '%Y-%m-%d').date()
+        except Exception:
+            return date_type.today()
 
-        doc = SimpleDocTemplate(
+    def _invoice_template(self, filepath):
+        return SimpleDocTemplate(
             filepath, pagesize=A4,
             leftMargin=15*mm, rightMargin=15*mm, topMargin=12*mm, bottomMargin=42*mm
         )
 
+    def _draw_invoice_signatures(self, canvas, doc):
+        canvas.saveState()
+        page_w, _ = A4
+        y_label = 28*mm
+        y_line  = 20*mm
+        canvas.setFont("Helvetica-Bold", 11)
+        canvas.drawString(25*mm, y_label, "Faturoi")
+        canvas.drawRightString(page_w - 25*mm, y_label, "Pranoi")
+        canvas.setFont("Helvetica", 11)
+        canvas.drawString(25*mm, y_line, "____________________")
+        canvas.drawRightString(page_w - 25*mm, y_line, "____________________")
+        canvas.restoreState()
+
+    def generate_invoice_pdf(self, invoice, company, client, output_path=None):
+        filename = self.document_filename("invoice", invoice)
+        filepath = output_path or self._get_storage_path("faturat", invoice.date, filename)
+
+        doc = self._invoice_template(filepath)
+        doc.build(
+            self._invoice_story(invoice, company, client),
+            onFirstPage=self._draw_invoice_signatures, onLaterPages=self._draw_invoice_signatures
+        )
+        if output_path:
+            return output_path
+        return self._handle_post_generation(filepath, "faturat", invoice.date, filename)
+
+    def _invoice_story(self, invoice, company, client):
+        """Flowable-t e një fature (pa build), që të bashkohen edhe në PDF me shumë fatura."""
         story = []
         
         # Title
@@ -322,33 +519,27 @@ class WebPDFGenerator:
             ("RIGHTPADDING", (0, 0), (-1, -1), 0),
         ]))
         story.append(combined)
+        return story
 
-        def draw_signatures(canvas, doc):
-            canvas.saveState()
-            page_w, _ = A4
-            y_label = 28*mm
-            y_line  = 20*mm
-            canvas.setFont("Helvetica-Bold", 11)
-            canvas.drawString(25*mm, y_label, "Faturoi")
-            canvas.drawRightString(page_w - 25*mm, y_label, "Pranoi")
-            canvas.setFont("Helvetica", 11)
-            canvas.drawString(25*mm, y_line, "____________________")
-            canvas.drawRightString(page_w - 25*mm, y_line, "____________________")
-            canvas.restoreState()
-
-        doc.build(story, onFirstPage=draw_signatures, onLaterPages=draw_signatures)
-        return self._handle_post_generation(filepath, "faturat", invoice.date, filename)
-
-    def generate_offer_pdf(self, offer, company, client, manual_font_size=None):
-        """Gjeneron PDF për një ofertë - identike me desktop app (optimized)"""
-        filename = f"Oferta_{offer.offer_number.replace(' ', '_')}.pdf"
-        filepath = self._get_storage_path("ofertat", offer.date, filename)
-        
-        doc = SimpleDocTemplate(
+    def _offer_template(self, filepath):
+        return SimpleDocTemplate(
             filepath, pagesize=A4,
             leftMargin=15*mm, rightMargin=15*mm, topMargin=12*mm, bottomMargin=12*mm
         )
-        
+
+    def generate_offer_pdf(self, offer, company, client, manual_font_size=None, output_path=None):
+        """Gjeneron PDF për një ofertë - identike me desktop app (optimized)"""
+        filename = self.document_filename("offer", offer)
+        filepath = output_path or self._get_storage_path("ofertat", offer.date, filename)
+
+        doc = self._offer_template(filepath)
+        doc.build(self._offer_story(offer, company, client, manual_font_size))
+        if output_path:
+            return output_path
+        return self._handle_post_generation(filepath, "ofertat", offer.date, filename)
+
+    def _offer_story(self, offer, company, client, manual_font_size=None):
+        """Flowable-t e një oferte (pa build); nënshkrimet janë pjesë e story-t."""
         story = []
         
         # -------------------------------
@@ -654,24 +845,13 @@ class WebPDFGenerator:
             ("RIGHTPADDING", (1, 0), (1, -1), 50), 
         ]))
         story.append(signatures_table)
-        
-        doc.build(story)
-        return self._handle_post_generation(filepath, "ofertat", offer.date, filename)
+        return story
 
-    def generate_contract_pdf(self, contract, company):
+    def generate_contract_pdf(self, contract, company, output_path=None):
         """Kontratë pune – 2 faqe, pjesët në kllapa të vogla dhe të përqendruara."""
-        from datetime import date as date_type
-        sig_date = contract.signing_date
-        if hasattr(sig_date, 'year'):
-            date_for_path = sig_date
-        else:
-            try:
-                date_for_path = datetime.strptime(str(sig_date), '%Y-%m-%d').date()
-            except Exception:
-                date_for_path = date_type.today()
-        safe_name = (contract.employee_name or "Kontrate").replace(" ", "_")[:50]
-        filename = f"Kontrate_{safe_name}_{date_for_path.year}.pdf"
-        filepath = self._get_storage_path("kontratat", date_for_path, filename)
+        date_for_path = self._contract_date(contract)
+        filename = self.document_filename("contract", contract)
+        filepath = output_path or self._get_storage_path("kontratat", date_for_path, filename)
 
         doc = SimpleDocTemplate(
             filepath, pagesize=A4,
@@ -790,4 +970,6 @@ class WebPDFGenerator:
         story.append(sig_table)
 
         doc.build(story)
+        if output_path:
+            return output_path
         return self._handle_post_generation(filepath, "kontratat", date_for_path, filename)
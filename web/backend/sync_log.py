@@ -0,0 +1,193 @@
+"""Change log për delta sync: regjistron insert/update/delete dhe i lexon pas një token-i.
+
+Token-i është id-ja e change_log. Që një klient të mos kalojë mbi një ndryshim ende pa commit
+(id më e vogël, e dukshme vetëm më vonë), rreshtat nuk shkruhen te flush-i: mblidhen në sesion
+dhe futen te before_commit, pas bllokimit të rreshtit `sync_log_clock` te settings. Kështu id-të
+jepen sipas radhës së commit-eve: kur një lexues sheh id-në N, çdo id më e vogël është e dukshme.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, select
+from sqlalchemy.exc import IntegrityError
+
+import models
+
+RETENTION_DAYS = 90
+PRUNED_SETTING_KEY = "sync_log_pruned_before"
+CLOCK_SETTING_KEY = "sync_log_clock"
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+# Modeli -> emri i koleksionit në PWA (Dexie: invoices, offers, clients)
+TRACKED = {
+    models.Invoice: "invoices",
+    models.Offer: "offers",
+    models.Client: "clients",
+}
+# Artikujt ndryshojnë dokumentin prind
+CHILDREN = {
+    models.InvoiceItem: ("invoices", "invoice_id"),
+    models.OfferItem: ("offers", "offer_id"),
+}
+ENTITIES = tuple(TRACKED.values())
+
+# Koleksionet e ndryshuara në transaksionin aktual (njoftohen pas commit-it)
+_PENDING_KEY = "sync_log_pending"
+# Ndryshimet e transaksionit aktual që shkruhen te change_log në before_commit
+_CHANGES_KEY = "sync_log_changes"
+_subscribers = []
+# Thirren brenda transaksionit me çdo grup ndryshimesh (p.sh. indeksi i kërkimit)
+_change_listeners = []
+
+
+def _collect_flush_changes(session) -> dict:
+    changes = {}
+    deleted = set()
+    for obj in session.deleted:
+        entity = TRACKED.get(type(obj))
+        if entity and obj.id is not None:
+            deleted.add((entity, obj.id))
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        cls = type(obj)
+        if cls in TRACKED:
+            key = (TRACKED[cls], obj.id)
+        elif cls in CHILDREN:
+            entity, fk = CHILDREN[cls]
+            key = (entity, getattr(obj, fk))
+        else:
+            continue
+        if key[1] is None:
+            continue
+        changes[key] = DELETE if key in deleted else UPSERT
+    return changes
+
+
+def _after_flush(session, flush_context):
+    changes = _collect_flush_changes(session)
+    if changes:
+        _stage(session, changes)
+
+
+def _stage(session, changes: dict):
+    session.info.setdefault(_PENDING_KEY, set()).update(entity for entity, _ in changes)
+    # Një flush i mëvonshëm mbishkruan operacionin (p.sh. upsert pastaj delete)
+    session.info.setdefault(_CHANGES_KEY, {}).update(changes)
+    for listener in _change_listeners:
+        listener(session, changes)
+
+
+def _lock_clock(session):
+    """Bllokon rreshtin `sync_log_clock` deri në commit (krijohet herën e parë)."""
+    setting = models.Setting
+    stmt = select(setting.id).where(setting.setting_key == CLOCK_SETTING_KEY).with_for_update()
+    if session.execute(stmt).first() is not None:
+        return
+    try:
+        with session.begin_nested():
+            session.execute(setting.__table__.insert().values(setting_key=CLOCK_SETTING_KEY, setting_value=""))
+    except IntegrityError:
+        # Një transaksion tjetër e krijoi ndërkohë
+        pass
+    session.execute(stmt)
+
+
+def _before_commit(session):
+    if session.in_nested_transaction():
+        # Commit i një savepoint-i: rreshtat shkruhen te commit-i i transaksionit kryesor
+        return
+    # Flush-i i fundit para commit-it, që ndryshimet e tij të jenë te _CHANGES_KEY
+    session.flush()
+    changes = session.info.pop(_CHANGES_KEY, None)
+    if not changes:
+        return
+    _lock_clock(session)
+    session.connection().execute(
+        models.ChangeLog.__table__.insert(),
+        [{"entity": entity, "entity_id": entity_id, "op": op} for (entity, entity_id), op in changes.items()],
+    )
+
+
+def _after_commit(session):
+    entities = session.info.pop(_PENDING_KEY, None)
+    if entities:
+        for callback in _subscribers:
+            callback(entities)
+
+
+def _after_transaction_end(session, transaction):
+    # Vetëm transaksioni kryesor: rollback-u i një savepoint-i nuk prek ndryshimet e mëparshme
+    if transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
+        session.info.pop(_CHANGES_KEY, None)
+
+
+def install(session_factory):
+    """Regjistron listener-at e flush-it dhe të commit-it mbi sessionmaker-in e aplikacionit."""
+    for name, listener in (("after_flush", _after_flush), ("before_commit", _before_commit),
+                           ("after_commit", _after_commit), ("after_transaction_end", _after_transaction_end)):
+        if not event.contains(session_factory, name, listener):
+            event.listen(session_factory, name, listener)
+
+
+def subscribe(callback):
+    """`callback(entities)` thirret pas çdo commit-i që preku invoices/offers/clients."""
+    if callback not in _subscribers:
+        _subscribers.append(callback)
+
+
+def on_changes(listener):
+    """`listener(session, {(entity, id): op})` thirret brenda transaksionit, pas regjistrimit në change_log."""
+    if listener not in _change_listeners:
+        _change_listeners.append(listener)
+
+
+def record(session, entity: str, ids, op: str = DELETE):
+    """Për operacione bulk (query.delete()) që nuk kalojnë nëpër flush."""
+    ids = [i for i in ids if i is not None]
+    if ids:
+        _stage(session, {(entity, entity_id): op for entity_id in ids})
+
+
+def current_token(session) -> int:
+    return session.query(func.max(models.ChangeLog.id)).scalar() or 0
+
+
+def pruned_before(session) -> int:
+    row = session.query(models.Setting).filter(models.Setting.setting_key == PRUNED_SETTING_KEY).first()
+    try:
+        return int(row.setting_value) if row and row.setting_value else 0
+    except ValueError:
+        return 0
+
+
+def read_changes(session, since: int, limit: int):
+    """
+    Kthen (ndryshimet e fundit për (entity, id), token-in e ri, has_more).
+    Një rresht i ndryshuar disa herë del vetëm një herë, me operacionin e fundit.
+    """
+    entries = session.query(models.ChangeLog).filter(
+        models.ChangeLog.id > since
+    ).order_by(models.ChangeLog.id).limit(limit + 1).all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    latest = {}
+    for entry in entries:
+        latest[(entry.entity, entry.entity_id)] = entry.op
+    token = entries[-1].id if entries else since
+    return latest, token, has_more
+
+
+def prune(session, days: int = RETENTION_DAYS) -> int:
+    """Fshin hyrjet më të vjetra se `days`; klientët me token më të vjetër marrin reset."""
+    cutoff = datetime.now() - timedelta(days=days)
+    watermark = session.query(func.max(models.ChangeLog.id)).filter(models.ChangeLog.changed_at < cutoff).scalar()
+    if not watermark:
+        return 0
+    deleted = session.query(models.ChangeLog).filter(models.ChangeLog.id <= watermark).delete(synchronize_session=False)
+    row = session.query(models.Setting).filter(models.Setting.setting_key == PRUNED_SETTING_KEY).first()
+    if row:
+        row.setting_value = str(watermark)
+    else:
+        session.add(models.Setting(setting_key=PRUNED_SETTING_KEY, setting_value=str(watermark)))
+    return deleted
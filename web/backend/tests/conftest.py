@@ -0,0 +1,169 @@
+"""
+Fixtures e testeve: API-ja mbi një databazë SQLite të përkohshme (DATABASE_URL vendoset para
+importit të `database`). Tabelat krijohen një herë; para çdo testi zbrazen dhe cache-t në memorie
+fshihen, kështu testet nuk varen nga radha e ekzekutimit.
+
+    cd web/backend && python -m pytest
+"""
+import os
+import smtplib
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_DB_FILE = os.path.join(tempfile.mkdtemp(prefix="holkos-tests-"), "test.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_FILE}"
+# Renderimi në thread-in e procesit (si në Vercel): procese "spawn" nuk do shihnin patch-et e testeve
+os.environ.setdefault("RENDER_WORKERS", "0")
+
+from sqlalchemy import event  # noqa: E402
+
+import database  # noqa: E402
+
+
+def _sqlite_functions(conn, _record):
+    """Funksionet MySQL që përdor API-ja (SUBSTRING_INDEX, GREATEST) për SQLite."""
+    def substring_index(value, delim, count):
+        if value is None:
+            return None
+        parts = value.split(delim)
+        return delim.join(parts[count:]) if count < 0 else delim.join(parts[:count])
+    conn.create_function("substring_index", 3, substring_index)
+    conn.create_function("greatest", 2, max)
+
+
+event.listen(database.engine, "connect", _sqlite_functions)
+if database.async_engine is not None:
+    event.listen(database.async_engine.sync_engine, "connect", _sqlite_functions)
+
+import main  # noqa: E402
+import models  # noqa: E402
+from auth import create_access_token  # noqa: E402
+from services import email_service, pdf_generator  # noqa: E402
+
+# PDF-të e renderuara nga testet (email-et, /pdf) nuk shkojnë te exports/ i repo-s
+pdf_generator.CACHE_DIR = os.path.join(os.path.dirname(_DB_FILE), "pdf-cache")
+
+models.Base.metadata.create_all(bind=database.engine)
+
+
+@pytest.fixture(autouse=True)
+def clean_database():
+    with database.engine.begin() as conn:
+        for table in reversed(models.Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    main.config_cache.invalidate()
+    main._stats_cache.invalidate()
+    yield
+
+
+@pytest.fixture
+def db():
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    # Pa `with`: eventet startup (migrimi, punëtorët në sfond) nuk ekzekutohen në teste
+    return TestClient(main.app)
+
+
+@pytest.fixture(scope="session")
+def auth_headers():
+    return {"Authorization": "Bearer " + create_access_token("admin")}
+
+
+@pytest.fixture
+def company(client, auth_headers):
+    response = client.put("/company", headers=auth_headers, json={
+        "name": "Holkos", "email": "info@example.com", "phone": "1", "address": "Rr. 1",
+        "smtp_server": "127.0.0.1", "smtp_port": 2525, "smtp_user": "info@example.com", "smtp_password": "x",
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+SMTP_PORT = 2525  # si te fixture-i `company`
+
+
+class Mailbox:
+    """Handler-i i aiosmtpd: ruan mesazhet; `rcpt_reply`/`data_reply` simulojnë refuzime."""
+
+    def __init__(self):
+        self.messages = []
+        self.rcpt_reply = None
+        self.data_reply = None
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if self.rcpt_reply:
+            return self.rcpt_reply
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.data_reply:
+            return self.data_reply
+        self.messages.append(envelope)
+        return "250 Message accepted"
+
+
+@pytest.fixture
+def mailbox(monkeypatch):
+    """Server SMTP lokal (aiosmtpd) në SMTP_PORT; `_connect` lidhet me të pa STARTTLS."""
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.smtp import AuthResult
+
+    handler = Mailbox()
+    controller = Controller(
+        handler, hostname="127.0.0.1", port=SMTP_PORT,
+        authenticator=lambda *args: AuthResult(success=True), auth_require_tls=False,
+    )
+    controller.start()
+
+    def connect(company):
+        # Serveri i testit nuk ka certifikatë: pa STARTTLS, por me login si në prodhim
+        server = smtplib.SMTP(company.smtp_server, int(company.smtp_port), timeout=5)
+        server.login(company.smtp_user, company.smtp_password)
+        return server
+
+    monkeypatch.setattr(email_service, "_connect", connect)
+    try:
+        yield handler
+    finally:
+        controller.stop()
+
+
+@pytest.fixture
+def client_row(client, auth_headers):
+    response = client.post("/clients", headers=auth_headers, json={"name": "Klienti A", "email": "a@example.com"})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def invoice_payload(number: str, client_id: int, day: str = "2026-01-10", **extra) -> dict:
+    payload = {
+        "invoice_number": number, "date": day, "client_id": client_id,
+        "subtotal": 100, "vat_amount": 18, "total": 118, "status": "unpaid",
+        "items": [{"description": "Shërbim", "quantity": 1, "unit_price": 100, "subtotal": 100}],
+    }
+    payload.update(extra)
+    return payload
+
+
+def offer_payload(number: str, client_id: int, day: str = "2026-01-10", **extra) -> dict:
+    payload = {
+        "offer_number": number, "date": day, "client_id": client_id, "subject": "Oferta",
+        "subtotal": 20, "vat_amount": 3.6, "total": 23.6,
+        "items": [{"description": "Artikull", "quantity": 1, "unit_price": 20, "subtotal": 20}],
+    }
+    payload.update(extra)
+    return payload
@@ -0,0 +1,72 @@
+"""Endpoint-et e leximit mbi AsyncSession: ekzekutohen me engine-in async dhe kthejnë relacionet."""
+import pytest
+from sqlalchemy import event
+
+import database
+from conftest import invoice_payload, offer_payload
+
+
+@pytest.fixture
+def engines():
+    """Numri i query-ve për engine: {"sync": n, "async": n}."""
+    counts = {"sync": 0, "async": 0}
+
+    def counter(name):
+        def count(*_args):
+            counts[name] += 1
+        return count
+
+    listeners = [(database.engine, counter("sync")), (database.async_engine.sync_engine, counter("async"))]
+    for engine, listener in listeners:
+        event.listen(engine, "before_cursor_execute", listener)
+    try:
+        yield counts
+    finally:
+        for engine, listener in listeners:
+            event.remove(engine, "before_cursor_execute", listener)
+
+
+def test_read_endpoints_use_the_async_engine(client, auth_headers, client_row, engines):
+    invoice = client.post("/invoices", headers=auth_headers, json=invoice_payload("FATURA NR.1", client_row["id"])).json()
+    offer = client.post("/offers", headers=auth_headers, json=offer_payload("NR.1", client_row["id"])).json()
+    engines["sync"] = engines["async"] = 0
+
+    for path in ("/invoices", "/offers", "/clients", f"/invoices/{invoice['id']}", f"/offers/{offer['id']}", "/dashboard/stats"):
+        response = client.get(path, headers=auth_headers)
+        assert response.status_code == 200, (path, response.text)
+    assert engines["sync"] == 0 and engines["async"] > 0
+
+
+def test_single_documents_include_client_and_items(client, auth_headers, client_row):
+    invoice = client.post("/invoices", headers=auth_headers, json=invoice_payload("FATURA NR.1", client_row["id"])).json()
+    loaded = client.get(f"/invoices/{invoice['id']}", headers=auth_headers).json()
+    assert loaded["client"]["name"] == "Klienti A"
+    assert [item["description"] for item in loaded["items"]] == ["Shërbim"]
+
+    offer = client.post("/offers", headers=auth_headers, json=offer_payload("NR.1", client_row["id"])).json()
+    loaded = client.get(f"/offers/{offer['id']}", headers=auth_headers).json()
+    assert (loaded["client"]["name"], len(loaded["items"])) == ("Klienti A", 1)
+
+    assert client.get("/invoices/999999", headers=auth_headers).status_code == 404
+    assert client.get("/offers/999999", headers=auth_headers).status_code == 404
+
+
+def test_clients_list_is_sorted_and_conditional(client, auth_headers):
+    for name in ("Zeta", "Alfa"):
+        client.post("/clients", headers=auth_headers, json={"name": name})
+    response = client.get("/clients", headers=auth_headers)
+    assert [row["name"] for row in response.json()] == ["Alfa", "Zeta"]
+    cached = client.get("/clients", headers=dict(auth_headers, **{"If-None-Match": response.headers["etag"]}))
+    assert cached.status_code == 304
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("mysql+pymysql://u:p@host:4000/db", "mysql+aiomysql://u:p@host:4000/db"),
+    ("sqlite:///./holkos.db", "sqlite+aiosqlite:///./holkos.db"),
+    ("postgresql://u@host/db", "postgresql://u@host/db"),
+])
+def test_async_url_keeps_the_same_database(url, expected, monkeypatch):
+    monkeypatch.delenv("ASYNC_DATABASE_URL", raising=False)
+    assert database._async_database_url(url) == expected
+    monkeypatch.setenv("ASYNC_DATABASE_URL", "mysql+asyncmy://x")
+    assert database._async_database_url(url) == "mysql+asyncmy://x"
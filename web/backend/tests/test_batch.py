@@ -0,0 +1,26 @@
+"""/batch: operacioni `status` pa status të vlefshëm refuzohet dhe nuk prek faturën."""
+import models
+from conftest import invoice_payload
+
+
+def _status_op(invoice_id, data):
+    return {"operations": [{"op": "status", "entity": "invoices", "id": invoice_id, "data": data}]}
+
+
+def test_status_op_without_status_is_rejected(client, auth_headers, client_row, db):
+    created = client.post("/invoices", headers=auth_headers, json=invoice_payload("FATURA NR.1", client_row["id"])).json()
+    for data in (None, {}, {"status": None}):
+        response = client.post("/batch", headers=auth_headers, json=_status_op(created["id"], data))
+        assert response.status_code == 422, response.text
+        assert response.json()["detail"].startswith("Operacioni #0 (status invoices)")
+
+    db.expire_all()
+    assert db.get(models.Invoice, created["id"]).status == created["status"]
+
+
+def test_status_op_updates_status(client, auth_headers, client_row, db):
+    created = client.post("/invoices", headers=auth_headers, json=invoice_payload("FATURA NR.1", client_row["id"])).json()
+    response = client.post("/batch", headers=auth_headers, json=_status_op(created["id"], {"status": "unpaid"}))
+    assert response.status_code == 200, response.text
+    db.expire_all()
+    assert db.get(models.Invoice, created["id"]).status == "unpaid"
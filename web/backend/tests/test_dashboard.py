@@ -0,0 +1,67 @@
+"""Statistikat e dashboard-it: një query agregate, e ruajtur 30s dhe e fshirë pas çdo shkrimi."""
+from datetime import date
+
+from sqlalchemy import update
+
+import models
+import ttl_cache
+from conftest import invoice_payload
+
+
+def _stats(client, auth_headers):
+    response = client.get("/dashboard/stats", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _today_payload(number, client_id, **extra):
+    return invoice_payload(number, client_id, date.today().isoformat(), **extra)
+
+
+def test_stats_follow_invoice_writes(client, auth_headers, client_row):
+    assert _stats(client, auth_headers)["total_invoices"] == 0
+
+    created = client.post("/invoices", headers=auth_headers, json=_today_payload("FATURA NR.1", client_row["id"])).json()
+    stats = _stats(client, auth_headers)
+    assert (stats["total_invoices"], stats["unpaid_count"], stats["current_month_revenue"]) == (1, 1, 118.0)
+    assert stats["total_clients"] == 1
+
+    client.put(f"/invoices/{created['id']}/status", headers=auth_headers, json={"status": "paid"})
+    stats = _stats(client, auth_headers)
+    assert (stats["paid_count"], stats["unpaid_count"]) == (1, 0)
+
+    client.post("/invoices/bulk-delete", headers=auth_headers, json={"invoice_ids": [created["id"]]})
+    assert _stats(client, auth_headers)["total_invoices"] == 0
+
+
+def test_stats_are_served_from_the_cache_between_writes(client, auth_headers, client_row, db):
+    created = client.post("/invoices", headers=auth_headers, json=_today_payload("FATURA NR.1", client_row["id"])).json()
+    assert _stats(client, auth_headers)["total_revenue"] == 118.0
+    # Shkrim që nuk kalon nga API-ja (pa change_log): cache-i mbetet deri në TTL ose shkrimin e radhës
+    db.execute(update(models.Invoice).where(models.Invoice.id == created["id"]).values(total=500))
+    db.commit()
+    assert _stats(client, auth_headers)["total_revenue"] == 118.0
+
+    client.post("/clients", headers=auth_headers, json={"name": "Klienti B"})
+    stats = _stats(client, auth_headers)
+    assert (stats["total_revenue"], stats["total_clients"]) == (500.0, 2)
+
+
+def test_recent_activity_lists_invoices_and_offers(client, auth_headers, client_row):
+    client.post("/invoices", headers=auth_headers, json=_today_payload("FATURA NR.1", client_row["id"]))
+    activity = _stats(client, auth_headers)["recent_activity"]
+    assert [(item["type"], item["number"], item["client"]) for item in activity] == [
+        ("invoice", "FATURA NR.1", "Klienti A")
+    ]
+
+
+def test_invalidate_during_compute_does_not_store_a_stale_value():
+    cache = ttl_cache.TTLCache(ttl=60)
+
+    def compute():
+        cache.invalidate()  # një shkrim përfundon ndërsa llogaritet vlera
+        return "e vjetër"
+
+    assert cache.get_or_set("key", compute) == "e vjetër"
+    assert cache.get_or_set("key", lambda: "e re") == "e re"
+    assert cache.get_or_set("key", lambda: "nuk thirret") == "e re"
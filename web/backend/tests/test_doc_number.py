@@ -0,0 +1,34 @@
+"""Parseri i desktop-it (utils/doc_number.py) dhe ai i API-së (sequences.py) japin të njëjtat kolona."""
+import importlib.util
+import os
+
+import pytest
+
+import sequences
+from conftest import BACKEND_DIR
+
+DESKTOP_PARSER = os.path.join(os.path.dirname(os.path.dirname(BACKEND_DIR)), "utils", "doc_number.py")
+
+NUMBERS = [
+    "FATURA NR.12", "FATURA NR.12/A", "FATURA NR.12 / B", "fatura nr.7", "NR.0003",
+    "OFERTA NR.5/X" + "Y" * 30, "OF-2024-007", " of-2023-12 ", "OF-2024-7A", "FATURA 12", "", None,
+]
+
+
+@pytest.fixture(scope="module")
+def desktop_parser():
+    if not os.path.exists(DESKTOP_PARSER):
+        pytest.skip("utils/doc_number.py mungon (vetëm backend-i)")
+    spec = importlib.util.spec_from_file_location("desktop_doc_number", DESKTOP_PARSER)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.mark.parametrize("number", NUMBERS)
+def test_desktop_and_api_parse_numbers_the_same_way(desktop_parser, number):
+    assert desktop_parser.seq_columns(number) == sequences.seq_columns(number)
+
+
+def test_suffix_length_matches(desktop_parser):
+    assert desktop_parser.SUFFIX_LENGTH == sequences.SUFFIX_LENGTH
@@ -0,0 +1,118 @@
+"""Radha e email-eve kundrejt një serveri SMTP lokal (aiosmtpd): dërgimi, ripërpjekjet, dështimi."""
+import email
+import email.policy
+from datetime import datetime, timedelta
+
+import pytest
+
+import email_outbox
+import models
+
+
+@pytest.fixture
+def invoice(client, auth_headers, client_row, company):
+    from conftest import invoice_payload
+    response = client.post("/invoices", headers=auth_headers, json=invoice_payload("FATURA NR.1", client_row["id"]))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _enqueue(client, auth_headers, invoice):
+    response = client.post(f"/invoices/{invoice['id']}/email", headers=auth_headers)
+    assert response.status_code == 202, response.text
+    return response.json()["id"]
+
+
+def _message(db, message_id):
+    db.expire_all()
+    return db.get(models.OutboxEmail, message_id)
+
+
+def test_enqueue_then_deliver(client, auth_headers, invoice, mailbox, db):
+    message_id = _enqueue(client, auth_headers, invoice)
+    assert _message(db, message_id).status == "queued"
+    assert email_outbox.deliver_due() == 1
+    message = _message(db, message_id)
+    assert (message.status, message.attempts, message.error) == ("sent", 1, None)
+    assert [envelope.rcpt_tos for envelope in mailbox.messages] == [["a@example.com"]]
+    sent = email.message_from_bytes(mailbox.messages[0].original_content, policy=email.policy.default)
+    assert "FATURA NR.1" in sent["Subject"]
+    attachments = list(sent.iter_attachments())
+    assert len(attachments) == 1 and attachments[0].get_content().startswith(b"%PDF")
+
+
+def test_temporary_failure_backs_off_then_delivers(client, auth_headers, invoice, mailbox, db):
+    message_id = _enqueue(client, auth_headers, invoice)
+    mailbox.data_reply = "451 Provo më vonë"
+    email_outbox.deliver_due()
+    message = _message(db, message_id)
+    assert (message.status, message.attempts) == ("queued", 1)
+    assert message.next_attempt_at > datetime.now() + email_outbox.RETRY_BASE - timedelta(seconds=5)
+    # Nuk i ka ardhur radha ende
+    assert email_outbox.deliver_due() == 0
+
+    mailbox.data_reply = None
+    message.next_attempt_at = datetime.now()
+    db.commit()
+    email_outbox.deliver_due()
+    assert _message(db, message_id).status == "sent"
+    assert len(mailbox.messages) == 1
+
+
+def test_greylisted_recipient_is_retried(client, auth_headers, invoice, mailbox, db):
+    message_id = _enqueue(client, auth_headers, invoice)
+    mailbox.rcpt_reply = "450 Greylisted"
+    email_outbox.deliver_due()
+    assert _message(db, message_id).status == "queued"
+
+
+def test_permanent_failure_and_manual_retry(client, auth_headers, invoice, mailbox, db):
+    message_id = _enqueue(client, auth_headers, invoice)
+    mailbox.rcpt_reply = "550 Adresa nuk ekziston"
+    email_outbox.deliver_due()
+    message = _message(db, message_id)
+    assert (message.status, message.next_attempt_at) == ("failed", None)
+    assert "550" in message.error
+
+    mailbox.rcpt_reply = None
+    response = client.post(f"/email-outbox/{message_id}/retry", headers=auth_headers)
+    assert response.json()["status"] == "queued"
+    email_outbox.deliver_due()
+    assert _message(db, message_id).status == "sent"
+
+
+def test_attempts_are_capped(client, auth_headers, invoice, mailbox, db):
+    message_id = _enqueue(client, auth_headers, invoice)
+    mailbox.data_reply = "451 Provo më vonë"
+    for _ in range(email_outbox.MAX_ATTEMPTS):
+        message = _message(db, message_id)
+        message.next_attempt_at = datetime.now()
+        db.commit()
+        email_outbox.deliver_due()
+    message = _message(db, message_id)
+    assert (message.status, message.attempts) == ("failed", email_outbox.MAX_ATTEMPTS)
+
+
+def test_stale_sending_is_reclaimed_by_the_sender_loop(client, auth_headers, invoice, mailbox, db):
+    message_id = _enqueue(client, auth_headers, invoice)
+    # Procesi që e mori ra menjëherë pas UPDATE-it
+    message = _message(db, message_id)
+    message.status, message.started_at = "sending", datetime.now() - email_outbox.STALE_AFTER - timedelta(seconds=1)
+    db.commit()
+    assert email_outbox.deliver_due() == 1
+    assert _message(db, message_id).status == "sent"
+
+
+def test_retry_accepts_only_stale_sending(client, auth_headers, invoice, db):
+    message_id = _enqueue(client, auth_headers, invoice)
+    message = _message(db, message_id)
+    message.status, message.started_at = "sending", datetime.now()
+    db.commit()
+    assert client.post(f"/email-outbox/{message_id}/retry", headers=auth_headers).status_code == 409
+
+    message = _message(db, message_id)
+    message.started_at = datetime.now() - email_outbox.STALE_AFTER - timedelta(seconds=1)
+    db.commit()
+    response = client.post(f"/email-outbox/{message_id}/retry", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["status"] == "queued"
@@ -0,0 +1,103 @@
+"""SMTPPool kundrejt serverit SMTP lokal: çdo lidhje e hapur ose kthehet te pool-i ose mbyllet."""
+import io
+import smtplib
+import socket
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import SMTP_PORT
+from services import email_service, mime_stream
+
+
+@pytest.fixture
+def opened(mailbox, monkeypatch):
+    """Lidhjet e hapura nga pool-i (mbi `_connect` e fixture-it `mailbox`)."""
+    servers = []
+    connect = email_service._connect
+
+    def tracking_connect(company):
+        servers.append(connect(company))
+        return servers[-1]
+
+    monkeypatch.setattr(email_service, "_connect", tracking_connect)
+    return servers
+
+
+@pytest.fixture
+def pool():
+    company = SimpleNamespace(
+        name="Holkos", smtp_server="127.0.0.1", smtp_port=SMTP_PORT, smtp_user="info@example.com", smtp_password="x"
+    )
+    with email_service.SMTPPool(company, size=1) as pool:
+        yield pool
+
+
+def _spool():
+    return mime_stream.spool_message("Holkos", "info@example.com", "a@example.com", "Test", "Trupi", [])
+
+
+def _idle(pool):
+    return list(pool._idle.queue)
+
+
+def _connected(server):
+    return server.sock is not None
+
+
+def _dead_idle_connection(pool, opened):
+    """Lidhje në pool që serveri e ka mbyllur ndërkohë (timeout i lidhjes së papunë)."""
+    with _spool() as spool:
+        pool.send("a@example.com", spool)
+    [server] = _idle(pool)
+    server.sock.shutdown(socket.SHUT_RDWR)
+    return server
+
+
+def test_connection_is_reused(pool, opened, mailbox):
+    for _ in range(3):
+        with _spool() as spool:
+            pool.send("a@example.com", spool)
+    assert len(opened) == 1 and len(mailbox.messages) == 3
+
+
+def test_refused_recipient_keeps_the_connection(pool, opened, mailbox):
+    mailbox.rcpt_reply = "550 Adresa nuk ekziston"
+    with _spool() as spool, pytest.raises(smtplib.SMTPRecipientsRefused):
+        pool.send("a@example.com", spool)
+    assert _idle(pool) == opened and _connected(opened[0])
+
+    mailbox.rcpt_reply = None
+    with _spool() as spool:
+        pool.send("a@example.com", spool)
+    assert len(opened) == 1 and len(mailbox.messages) == 1
+
+
+def test_disconnect_then_server_error_returns_the_new_connection(pool, opened, mailbox):
+    dead = _dead_idle_connection(pool, opened)
+    mailbox.data_reply = "451 Provo më vonë"
+    with _spool() as spool, pytest.raises(smtplib.SMTPDataError):
+        pool.send("a@example.com", spool)
+    assert len(opened) == 2 and not _connected(dead)
+    assert _idle(pool) == [opened[1]] and _connected(opened[1])
+
+
+def test_disconnect_then_local_failure_closes_the_new_connection(pool, opened, mailbox):
+    dead = _dead_idle_connection(pool, opened)
+
+    class BrokenSpool(io.BytesIO):
+        def __iter__(self):
+            raise OSError("disku nuk lexohet")
+
+    with pytest.raises(OSError):
+        pool.send("a@example.com", BrokenSpool())
+    assert len(opened) == 2
+    assert _idle(pool) == [] and not _connected(dead) and not _connected(opened[1])
+
+
+def test_closing_reply_drops_the_connection(pool, opened, mailbox):
+    mailbox.data_reply = "421 Shërbimi nuk është në dispozicion"
+    with _spool() as spool, pytest.raises(smtplib.SMTPDataError):
+        pool.send("a@example.com", spool)
+    assert _idle(pool) == [] and not _connected(opened[0])
+
@@ -0,0 +1,42 @@
+"""ETag i koleksionit: ndryshon me çdo shkrim, edhe kur updated_at mbetet në të njëjtën sekondë."""
+from sqlalchemy import update
+
+import models
+from conftest import invoice_payload
+
+
+def _list(client, auth_headers, path, etag=None):
+    headers = dict(auth_headers, **({"If-None-Match": etag} if etag else {}))
+    return client.get(path, headers=headers)
+
+
+def test_unchanged_collection_returns_304(client, auth_headers, client_row):
+    client.post("/invoices", headers=auth_headers, json=invoice_payload("FATURA NR.1", client_row["id"]))
+    etag = _list(client, auth_headers, "/invoices").headers["etag"]
+    assert _list(client, auth_headers, "/invoices", etag).status_code == 304
+
+
+def test_two_edits_in_the_same_second_change_the_etag(client, auth_headers, client_row, db):
+    created = client.post("/invoices", headers=auth_headers, json=invoice_payload("FATURA NR.1", client_row["id"])).json()
+    first = _list(client, auth_headers, "/invoices")
+    updated_at = db.get(models.Invoice, created["id"]).updated_at
+
+    response = client.put(f"/invoices/{created['id']}/status", headers=auth_headers, json={"status": "unpaid"})
+    assert response.status_code == 200, response.text
+    # Ndryshimi i dytë bie në të njëjtën sekondë: updated_at, count dhe max(id) mbeten të njëjta
+    db.execute(update(models.Invoice).where(models.Invoice.id == created["id"]).values(updated_at=updated_at))
+    db.commit()
+
+    second = _list(client, auth_headers, "/invoices", first.headers["etag"])
+    assert second.status_code == 200
+    assert second.headers["etag"] != first.headers["etag"]
+    assert second.json()[0]["status"] == "unpaid"
+
+
+def test_item_edit_changes_the_etag_with_items_included(client, auth_headers, client_row, db):
+    created = client.post("/invoices", headers=auth_headers, json=invoice_payload("FATURA NR.1", client_row["id"])).json()
+    first = _list(client, auth_headers, "/invoices?include=items")
+    item = db.query(models.InvoiceItem).filter_by(invoice_id=created["id"]).first()
+    item.description = "Artikull i ndryshuar"
+    db.commit()
+    assert _list(client, auth_headers, "/invoices?include=items", first.headers["etag"]).status_code == 200
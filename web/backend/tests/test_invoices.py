@@ -0,0 +1,36 @@
+"""Lista e faturave: rruga Core (orjson) dhe serializuesit ORM japin të njëjtat objekte."""
+import json
+
+import main
+from conftest import invoice_payload
+
+INCLUDE = "client,items"
+
+
+def _ndjson(response):
+    assert response.status_code == 200, response.text
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def test_list_and_stream_return_identical_objects(client, auth_headers, client_row):
+    for number in range(1, 3):
+        response = client.post("/invoices", headers=auth_headers, json=invoice_payload(f"FATURA NR.{number}", client_row["id"]))
+        assert response.status_code == 200, response.text
+
+    listed = client.get("/invoices", headers=auth_headers, params={"include": INCLUDE}).json()
+    streamed = _ndjson(client.get("/invoices/stream", headers=auth_headers, params={"include": INCLUDE}))
+    negotiated = _ndjson(client.get(
+        "/invoices", headers=dict(auth_headers, Accept=main.NDJSON_MEDIA_TYPE), params={"include": INCLUDE}
+    ))
+    assert len(listed) == 2
+    assert listed == streamed == negotiated
+    # ISO 8601 si te Pydantic, jo str(datetime)
+    assert "T" in listed[0]["created_at"] and "T" in listed[0]["client"]["updated_at"]
+
+
+def test_sync_changes_use_the_same_format(client, auth_headers, client_row):
+    created = client.post("/invoices", headers=auth_headers, json=invoice_payload("FATURA NR.1", client_row["id"])).json()
+    listed = client.get("/invoices", headers=auth_headers).json()
+    synced = client.get("/sync/changes", headers=auth_headers, params={"since": 0}).json()
+    [row] = [row for row in synced["invoices"]["upserted"] if row["id"] == created["id"]]
+    assert (row["created_at"], row["updated_at"]) == (listed[0]["created_at"], listed[0]["updated_at"])
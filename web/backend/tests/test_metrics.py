@@ -0,0 +1,67 @@
+"""/metrics dhe Server-Timing: etiketat sipas shabllonit të rrugës, query-t e çdo kërkese."""
+import re
+
+import pytest
+
+import metrics
+from conftest import invoice_payload
+
+
+def _scrape(client, auth_headers) -> str:
+    response = client.get("/metrics", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    return response.text
+
+
+def _value(text: str, sample: str) -> float:
+    match = re.search(rf"^{re.escape(sample)} (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+def _requests(method, route, status):
+    return f'http_requests_total{{method="{method}",route="{route}",status="{status}"}}'
+
+
+def test_routes_are_labelled_by_template(client, auth_headers, client_row):
+    created = client.post("/invoices", headers=auth_headers, json=invoice_payload("FATURA NR.1", client_row["id"])).json()
+    before = _scrape(client, auth_headers)
+    for invoice_id in (created["id"], created["id"] + 1000):
+        client.get(f"/invoices/{invoice_id}", headers=auth_headers)
+    client.get("/nuk-ekziston", headers=auth_headers)
+    after = _scrape(client, auth_headers)
+
+    # MetricsMiddleware e lexon scope["route"] që e vendos router-i i Starlette-it pas përputhjes
+    for sample in (_requests("GET", "/invoices/{invoice_id}", 200), _requests("GET", "/invoices/{invoice_id}", 404),
+                   _requests("GET", metrics.UNMATCHED_ROUTE, 404)):
+        assert _value(after, sample) - _value(before, sample) == 1, sample
+    assert f"/invoices/{created['id']}" not in after
+    assert _value(after, 'http_request_duration_seconds_count{method="GET",route="/invoices/{invoice_id}"}') >= 2
+
+
+def test_server_timing_reports_the_queries_of_the_request(client, auth_headers, client_row):
+    response = client.get("/clients", headers=auth_headers)
+    timing = response.headers["server-timing"]
+    queries = int(re.search(r'db;dur=[\d.]+;desc="(\d+) queries"', timing).group(1))
+    assert queries >= 2  # ETag-u + lista
+    assert re.search(r"total;dur=[\d.]+$", timing)
+    assert response.headers["timing-allow-origin"] == "*"
+
+
+def test_metrics_require_a_token(client, auth_headers, monkeypatch):
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer i-pavlefshem"}).status_code == 401
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "scraper-secret")
+    assert client.get("/metrics", headers={"Authorization": "Bearer scraper-secret"}).status_code == 200
+
+
+def test_timer_labels_failures():
+    histogram = metrics.Histogram("test_seconds", "Test.", ("result",), (0.1, 1))
+    with metrics.timer(histogram, "test", result="ok"):
+        pass
+    with pytest.raises(RuntimeError), metrics.timer(histogram, "test", result="ok"):
+        raise RuntimeError("dështoi")
+    text = "\n".join(histogram.samples())
+    assert _value(text, 'test_seconds_count{result="ok"}') == 1
+    assert _value(text, 'test_seconds_count{result="error"}') == 1
+    assert _value(text, 'test_seconds_bucket{result="ok",le="+Inf"}') == 1
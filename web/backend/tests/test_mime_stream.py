@@ -0,0 +1,65 @@
+"""Mesazhi në spool: pas dërgimit me send_spooled, marrësi lexon të njëjtat bashkëngjitje."""
+import email
+import email.policy
+import os
+import smtplib
+
+import pytest
+
+from conftest import SMTP_PORT
+from services import mime_stream
+
+
+@pytest.fixture
+def server(mailbox):
+    connection = smtplib.SMTP("127.0.0.1", SMTP_PORT, timeout=5)
+    try:
+        yield connection
+    finally:
+        connection.quit()
+
+
+def _attachment(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def _received(mailbox):
+    [envelope] = mailbox.messages
+    return email.message_from_bytes(envelope.original_content, policy=email.policy.default)
+
+
+def test_attachments_round_trip(tmp_path, server, mailbox):
+    # Më e madhe se disa CHUNK_SIZE dhe se SPOOL_MAX_MEMORY: spool-i kalon në disk
+    large = os.urandom(mime_stream.SPOOL_MAX_MEMORY + mime_stream.CHUNK_SIZE * 3 + 11)
+    small = b"%PDF-1.4\n.\r\n..\n"
+    attachments = [
+        (_attachment(tmp_path, "a.pdf", large), "Fatura_NR.1_2026.pdf"),
+        (_attachment(tmp_path, "b.pdf", small), "Ofertë çmimesh.pdf"),
+        (str(tmp_path / "mungon.pdf"), "Mungon.pdf"),  # anashkalohet
+    ]
+    body = "Përshëndetje,\n.\nFaleminderit"
+    with mime_stream.spool_message(
+        "Holkos Sh.p.k.", "info@example.com", "a@example.com", "Faturë e re: NR.1 - Holkos", body, attachments
+    ) as spool:
+        assert spool._rolled
+        assert mime_stream.send_spooled(server, "info@example.com", "a@example.com", spool) == {}
+
+    message = _received(mailbox)
+    assert message["Subject"] == "Faturë e re: NR.1 - Holkos"
+    assert message["From"].addresses[0].display_name == "Holkos Sh.p.k."
+    assert message.get_body(("plain",)).get_content().rstrip("\n") == body
+    received = [(part.get_filename(), part.get_content()) for part in message.iter_attachments()]
+    assert received == [("Fatura_NR.1_2026.pdf", large), ("Ofertë çmimesh.pdf", small)]
+
+
+def test_refused_recipient_resets_the_session(server, mailbox):
+    mailbox.rcpt_reply = "550 Adresa nuk ekziston"
+    with mime_stream.spool_message("Holkos", "info@example.com", "x@example.com", "Test", "Trupi", []) as spool:
+        with pytest.raises(smtplib.SMTPRecipientsRefused):
+            mime_stream.send_spooled(server, "info@example.com", "x@example.com", spool)
+        # Pas RSET e njëjta lidhje dërgon mesazhin e radhës
+        mailbox.rcpt_reply = None
+        mime_stream.send_spooled(server, "info@example.com", "a@example.com", spool)
+    assert _received(mailbox)["Subject"] == "Test"
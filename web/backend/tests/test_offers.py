@@ -0,0 +1,84 @@
+"""Lista e ofertave: çdo faqe (edhe e fundit) ka të njëjtën formë dhe renditje."""
+import json
+
+import models
+import pagination
+from conftest import offer_payload
+
+
+def _shape(value):
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_shape(item) for item in value[:1]]
+    return type(value).__name__
+
+
+def _pages(client, auth_headers, query):
+    pages, cursor = [], None
+    while True:
+        params = dict(query, cursor=cursor) if cursor else query
+        response = client.get("/offers", headers=auth_headers, params=params)
+        assert response.status_code == 200, response.text
+        pages.append(response.json())
+        cursor = response.headers.get(pagination.NEXT_CURSOR_HEADER)
+        if not cursor:
+            return pages
+
+
+def test_every_page_has_the_same_shape(client, auth_headers, client_row):
+    for number in range(1, 4):
+        response = client.post("/offers", headers=auth_headers, json=offer_payload(f"NR.{number}", client_row["id"]))
+        assert response.status_code == 200, response.text
+
+    pages = _pages(client, auth_headers, {"limit": 1})
+    assert len(pages) == 3
+    shapes = [_shape(page[0]) for page in pages]
+    assert shapes[0] == shapes[1] == shapes[2]
+    assert pages[-1][0]["subtotal"] == 20.0
+    # Pa limit, lista e plotë ka po atë formë
+    full = client.get("/offers", headers=auth_headers).json()
+    assert [_shape(offer) for offer in full] == shapes
+    assert [offer["id"] for offer in full] == [page[0]["id"] for page in pages]
+
+
+def test_include_fields_apply_to_the_last_page_too(client, auth_headers, client_row):
+    for number in range(1, 3):
+        client.post("/offers", headers=auth_headers, json=offer_payload(f"NR.{number}", client_row["id"]))
+
+    pages = _pages(client, auth_headers, {"limit": 1, "include": "client"})
+    assert len(pages) == 2
+    for page in pages:
+        assert "client" in page[0] and "items" not in page[0]
+
+
+def test_pages_cross_from_nr_0_to_numbers_without_sequence(client, auth_headers, client_row, db):
+    ids = []
+    for number in range(1, 5):
+        response = client.post("/offers", headers=auth_headers, json=offer_payload(f"NR.{number}", client_row["id"]))
+        assert response.status_code == 200, response.text
+        ids.append(response.json()["id"])
+    # Të dhëna të vjetra/të importuara: API-ja i numëron vetë, kështu i vendosim drejtpërdrejt
+    db.get(models.Offer, ids[2]).offer_number = "NR.0"
+    db.get(models.Offer, ids[3]).offer_number = "Pa numër"
+    db.commit()
+    seq_nos = {off.offer_number: off.seq_no for off in db.query(models.Offer)}
+    assert (seq_nos["NR.0"], seq_nos["Pa numër"]) == (0, None)
+
+    # "Pa numër" (seq_no NULL) ka id më të madhe se NR.0 dhe vjen pas saj
+    paged = [page[0]["offer_number"] for page in _pages(client, auth_headers, {"limit": 1})]
+    assert paged == ["NR.2", "NR.1", "NR.0", "Pa numër"]
+    full = [offer["offer_number"] for offer in client.get("/offers", headers=auth_headers).json()]
+    streamed = [
+        json.loads(line)["offer_number"]
+        for line in client.get("/offers/stream", headers=auth_headers).text.splitlines() if line
+    ]
+    assert full == streamed == paged
+
+
+def test_timestamps_use_iso_8601(client, auth_headers, client_row):
+    payload = offer_payload("NR.1", client_row["id"], save_timestamp="2026-01-10T08:30:00")
+    assert client.post("/offers", headers=auth_headers, json=payload).status_code == 200
+    [offer] = client.get("/offers", headers=auth_headers).json()
+    assert offer["save_timestamp"] == "2026-01-10T08:30:00"
+    assert "T" in offer["created_at"] and "T" in offer["client"]["created_at"]
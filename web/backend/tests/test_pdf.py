@@ -0,0 +1,89 @@
+"""GET i PDF-së është vetëm lexim; me Blob vendndodhja mbetet e njëjtë edhe pas cold start."""
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import models
+from conftest import invoice_payload
+from services import pdf_generator
+
+
+@pytest.fixture(autouse=True)
+def pdf_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_generator, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(pdf_generator, "_BLOB_URLS", {})
+    return tmp_path / "cache"
+
+
+@pytest.fixture
+def blob(monkeypatch):
+    """Vercel Blob në memorie: numëron ngarkimet."""
+    uploads = []
+
+    def put(path, data, token=None):
+        uploads.append(path)
+        return SimpleNamespace(url=f"https://blob.example/{path[:-len('.pdf')]}-r{len(uploads)}.pdf")
+
+    monkeypatch.setenv("BLOB_READ_WRITE_TOKEN", "test")
+    monkeypatch.setattr(pdf_generator, "vercel", SimpleNamespace(blob=SimpleNamespace(put=put)))
+    return uploads
+
+
+@pytest.fixture
+def invoice(client, auth_headers, client_row, company):
+    response = client.post("/invoices", headers=auth_headers, json=invoice_payload("FATURA NR.1", client_row["id"]))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _get_pdf(client, auth_headers, invoice_id):
+    return client.get(f"/invoices/{invoice_id}/pdf", headers=auth_headers, follow_redirects=False)
+
+
+def test_get_pdf_does_not_write(client, auth_headers, invoice, db):
+    before = db.get(models.Invoice, invoice["id"])
+    updated_at, changes = before.updated_at, db.query(models.ChangeLog).count()
+    first = _get_pdf(client, auth_headers, invoice["id"])
+    second = _get_pdf(client, auth_headers, invoice["id"])
+    assert first.status_code == second.status_code == 200
+    assert first.headers["etag"] == second.headers["etag"]
+
+    db.expire_all()
+    after = db.get(models.Invoice, invoice["id"])
+    assert (after.pdf_path, after.updated_at) == (None, updated_at)
+    assert db.query(models.ChangeLog).count() == changes
+
+
+def test_blob_location_is_stable_between_miss_and_hit(client, auth_headers, invoice, blob):
+    miss = _get_pdf(client, auth_headers, invoice["id"])
+    hit = _get_pdf(client, auth_headers, invoice["id"])
+    assert miss.status_code == hit.status_code == 307
+    assert miss.headers["location"] == hit.headers["location"]
+    assert len(blob) == 1
+
+
+def test_stored_blob_url_is_used_after_cold_start(client, auth_headers, invoice, blob, db, pdf_cache, monkeypatch):
+    url = _get_pdf(client, auth_headers, invoice["id"]).headers["location"]
+    # render_queue e ka ruajtur URL-në te pdf_path; instanca e re nuk ka as disk as memorie
+    db.get(models.Invoice, invoice["id"]).pdf_path = url
+    db.commit()
+    for root, _, files in os.walk(pdf_cache):
+        for name in files:
+            os.remove(os.path.join(root, name))
+    monkeypatch.setattr(pdf_generator, "_BLOB_URLS", {})
+    monkeypatch.setattr(pdf_generator.WebPDFGenerator, "generate_invoice_pdf", lambda *args, **kwargs: pytest.fail("rerendered"))
+
+    response = _get_pdf(client, auth_headers, invoice["id"])
+    assert response.headers["location"] == url
+    assert len(blob) == 1
+
+
+def test_edited_invoice_does_not_reuse_stored_url(client, auth_headers, invoice, blob, db):
+    url = _get_pdf(client, auth_headers, invoice["id"]).headers["location"]
+    db.get(models.Invoice, invoice["id"]).pdf_path = url
+    db.commit()
+    edited = invoice_payload("FATURA NR.1", invoice["client_id"], total=200)
+    assert client.put(f"/invoices/{invoice['id']}", headers=auth_headers, json=edited).status_code == 200
+    assert _get_pdf(client, auth_headers, invoice["id"]).headers["location"] != url
+    assert len(blob) == 2
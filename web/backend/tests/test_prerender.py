@@ -0,0 +1,111 @@
+"""Renderimi paraprak: pas commit-it, me debounce, vetëm për ndryshime që duken në PDF."""
+import threading
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+import database
+import models
+import prerender
+from conftest import invoice_payload
+
+DELAY = 0.05
+
+
+@pytest.fixture
+def rendered(monkeypatch):
+    """Aktivizon PDF_PRERENDER për testin; kthen listën e (doc_type, id) të futura në radhë."""
+    calls = []
+
+    def enqueue(db, doc_type, doc):
+        calls.append((doc_type, doc.id))
+
+    monkeypatch.setattr(prerender, "ENABLED", True)
+    monkeypatch.setattr(prerender, "PRERENDER_DELAY", DELAY)
+    monkeypatch.setattr(prerender.render_queue, "enqueue", enqueue)
+    prerender.install(database.SessionLocal)
+    try:
+        yield calls
+    finally:
+        prerender.shutdown()
+        for name, fn in (("after_flush", prerender._after_flush), ("after_commit", prerender._after_commit),
+                         ("after_transaction_end", prerender._after_transaction_end)):
+            if event.contains(database.SessionLocal, name, fn):
+                event.remove(database.SessionLocal, name, fn)
+
+
+def _settle():
+    """Pret sa të skadojnë timer-at e planifikuar."""
+    threading.Event().wait(DELAY * 4)
+
+
+def _create(client, auth_headers, client_id, number="FATURA NR.1", **extra):
+    response = client.post("/invoices", headers=auth_headers, json=invoice_payload(number, client_id, **extra))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_new_invoice_is_rendered_after_commit(client, auth_headers, client_row, rendered):
+    created = _create(client, auth_headers, client_row["id"])
+    assert rendered == []  # jo menjëherë: pas PRERENDER_DELAY
+    _settle()
+    assert rendered == [("invoice", created["id"])]
+
+
+def test_quick_edits_render_once(client, auth_headers, client_row, rendered, monkeypatch):
+    # Debounce më i gjatë se dy PUT-et, që edhe në një makinë të ngadaltë të bien brenda tij
+    monkeypatch.setattr(prerender, "PRERENDER_DELAY", 0.5)
+    created = _create(client, auth_headers, client_row["id"])
+    for total in (200, 300):
+        edited = invoice_payload("FATURA NR.1", client_row["id"], total=total)
+        assert client.put(f"/invoices/{created['id']}", headers=auth_headers, json=edited).status_code == 200
+    threading.Event().wait(1.0)
+    assert rendered == [("invoice", created["id"])]
+
+
+def test_status_change_and_delete_do_not_render(client, auth_headers, client_row, rendered):
+    created = _create(client, auth_headers, client_row["id"])
+    _settle()
+    rendered.clear()
+    client.put(f"/invoices/{created['id']}/status", headers=auth_headers, json={"status": "paid"})
+    _settle()
+    assert rendered == []
+
+    second = _create(client, auth_headers, client_row["id"], "FATURA NR.2")
+    assert client.delete(f"/invoices/{second['id']}", headers=auth_headers).status_code == 200
+    _settle()
+    assert rendered == []
+
+
+def test_savepoint_rollback_keeps_earlier_changes(client_row, rendered):
+    db = database.SessionLocal()
+    try:
+        invoice = models.Invoice(invoice_number="FATURA NR.9", date=date(2026, 1, 10),
+                                 client_id=client_row["id"], subtotal=1, vat_amount=0, total=1, status="unpaid")
+        db.add(invoice)
+        db.flush()
+        # P.sh. një konflikt numri te sequences.flush_new për dokumentin e radhës në të njëjtin batch
+        savepoint = db.begin_nested()
+        db.add(models.Client(name="Klienti B"))
+        db.flush()
+        savepoint.rollback()
+        db.commit()
+        invoice_id = invoice.id
+    finally:
+        db.close()
+    _settle()
+    assert rendered == [("invoice", invoice_id)]
+
+
+def test_rollback_renders_nothing(client_row, rendered):
+    db = database.SessionLocal()
+    try:
+        db.add(models.Invoice(invoice_number="FATURA NR.9", date=date(2026, 1, 10),
+                              client_id=client_row["id"], subtotal=1, vat_amount=0, total=1, status="unpaid"))
+        db.flush()
+        db.rollback()
+    finally:
+        db.close()
+    _settle()
+    assert rendered == []
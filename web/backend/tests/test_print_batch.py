@@ -0,0 +1,58 @@
+"""Printimi i shumë dokumenteve: një PDF, çdo dokument në faqe të re, cache sipas gjurmëve."""
+import re
+
+from conftest import invoice_payload, offer_payload
+
+
+def _pages(pdf: bytes) -> int:
+    return len(re.findall(rb"/Type\s*/Page\b", pdf))
+
+
+def _invoices(client, auth_headers, client_id, count):
+    ids = []
+    for number in range(1, count + 1):
+        response = client.post("/invoices", headers=auth_headers, json=invoice_payload(f"FATURA NR.{number}", client_id))
+        assert response.status_code == 200, response.text
+        ids.append(response.json()["id"])
+    return ids
+
+
+def _print(client, auth_headers, ids, **extra):
+    return client.post("/invoices/print-batch", headers=auth_headers, json={"invoice_ids": ids, **extra})
+
+
+def test_batch_has_every_document_on_its_own_pages(client, auth_headers, client_row, company):
+    ids = _invoices(client, auth_headers, client_row["id"], 3)
+    single = [client.get(f"/invoices/{doc_id}/pdf", headers=auth_headers) for doc_id in ids]
+    response = _print(client, auth_headers, ids)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.content.startswith(b"%PDF")
+    assert _pages(response.content) == sum(_pages(r.content) for r in single) >= 3
+    assert response.headers["content-location"] == f"/pdf/{response.headers['etag'].strip(chr(34))}.pdf"
+
+
+def test_cache_key_follows_documents_and_order(client, auth_headers, client_row, company):
+    ids = _invoices(client, auth_headers, client_row["id"], 2)
+    first = _print(client, auth_headers, ids).headers["etag"]
+    # Dublikatat hiqen, radha e kërkesës ruhet
+    assert _print(client, auth_headers, ids + ids[:1]).headers["etag"] == first
+    assert _print(client, auth_headers, ids[::-1]).headers["etag"] != first
+
+    edited = invoice_payload("FATURA NR.1", client_row["id"], total=200)
+    assert client.put(f"/invoices/{ids[0]}", headers=auth_headers, json=edited).status_code == 200
+    assert _print(client, auth_headers, ids).headers["etag"] != first
+
+
+def test_offers_batch_and_errors(client, auth_headers, client_row, company):
+    offer_ids = [
+        client.post("/offers", headers=auth_headers, json=offer_payload(f"NR.{n}", client_row["id"])).json()["id"]
+        for n in (1, 2)
+    ]
+    response = client.post("/offers/print-batch", headers=auth_headers, json={"offer_ids": offer_ids})
+    assert response.status_code == 200, response.text
+    assert _pages(response.content) >= 2
+
+    assert _print(client, auth_headers, []).status_code == 400
+    missing = _print(client, auth_headers, [offer_ids[0] + 1000])
+    assert missing.status_code == 404 and str(offer_ids[0] + 1000) in missing.json()["detail"]
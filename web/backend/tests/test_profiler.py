@@ -0,0 +1,67 @@
+"""Profilizimi sipas kërkesës: vetëm me flamur dhe token, i ruajtur te request_profiles."""
+import time
+from datetime import datetime, timedelta
+
+import models
+import profiler
+import sequences
+
+
+def _profile_id(response):
+    assert response.status_code == 200, response.text
+    return response.headers.get("x-profile-id")
+
+
+def test_flagged_request_is_profiled(client, auth_headers, monkeypatch):
+    peek = sequences.peek
+
+    def slow_peek(*args):
+        time.sleep(0.05)  # mjaftueshëm për disa mostra të sampler-it
+        return peek(*args)
+
+    monkeypatch.setattr(sequences, "peek", slow_peek)
+    profile_id = _profile_id(client.get("/invoices/next-number", headers=dict(auth_headers, **{"X-Profile": "1"})))
+    assert profile_id
+
+    profile = client.get(f"/debug/profiles/{profile_id}", headers=auth_headers).json()
+    assert (profile["method"], profile["route"], profile["status_code"]) == ("GET", "/invoices/next-number", 200)
+    assert profile["duration_ms"] >= 50 and profile["sample_count"] > 0
+    assert profile["query_count"] == len(profile["queries"]) > 0
+    assert all(query["statement"] and query["duration_ms"] >= 0 for query in profile["queries"])
+
+    response = client.get(profile["speedscope_url"], headers=auth_headers)
+    assert response.headers["content-disposition"] == f'attachment; filename="profile-{profile_id}.speedscope.json"'
+    document = response.json()
+    assert document["$schema"] == "https://www.speedscope.app/file-format-schema.json"
+    frames = {frame["name"] for frame in document["shared"]["frames"]}
+    # Endpoint-i sync ekzekutohet në threadpool: thread-i i tij hyn në profil pranë event loop-it
+    assert "get_next_invoice_number" in frames
+    assert any(p["name"] != "event-loop" and p["samples"] for p in document["profiles"])
+
+    listed = client.get("/debug/profiles", headers=auth_headers).json()
+    assert [p["id"] for p in listed] == [profile_id]
+    assert "queries" not in listed[0]
+
+
+def test_query_flag_also_works(client, auth_headers):
+    assert _profile_id(client.get("/clients", headers=auth_headers, params={"profile": "1"}))
+
+
+def test_requests_without_flag_or_token_are_not_profiled(client, auth_headers, db):
+    assert _profile_id(client.get("/clients", headers=auth_headers)) is None
+    # Rrugë publike: flamuri pa token të vlefshëm injorohet
+    assert _profile_id(client.get("/health", headers={"X-Profile": "1"})) is None
+    assert _profile_id(client.get("/health", headers={"X-Profile": "1", "Authorization": "Bearer x"})) is None
+    assert db.query(models.RequestProfile).count() == 0
+    assert client.get("/debug/profiles/nuk-ekziston", headers=auth_headers).status_code == 404
+
+
+def test_prune_keeps_the_latest_profiles(db):
+    now = datetime.now()
+    for age in range(4):
+        db.add(models.RequestProfile(id=f"p{age}", method="GET", path="/", speedscope="{}",
+                                     created_at=now - timedelta(minutes=age)))
+    db.commit()
+    assert profiler._prune(db, keep=2) == 2
+    db.commit()
+    assert sorted(p.id for p in db.query(models.RequestProfile)) == ["p0", "p1"]
@@ -0,0 +1,65 @@
+"""monthly_rollups: muajt e prekur rillogariten nga faturat pas çdo shkrimi."""
+from decimal import Decimal
+
+import models
+import rollups
+from conftest import invoice_payload
+
+
+def _row(db, year, month, doc_type="invoice"):
+    db.expire_all()
+    return db.query(models.MonthlyRollup).filter_by(doc_type=doc_type, year=year, month=month).one_or_none()
+
+
+def _create(client, auth_headers, payload):
+    response = client.post("/invoices", headers=auth_headers, json=payload)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_create_and_move_invoice_between_months(client, auth_headers, client_row, db):
+    first = _create(client, auth_headers, invoice_payload("FATURA NR.1", client_row["id"], "2026-01-10"))
+    _create(client, auth_headers, invoice_payload("FATURA NR.2", client_row["id"], "2026-01-20", status="paid"))
+    january = _row(db, 2026, 1)
+    assert (january.doc_count, january.revenue, january.paid_count, january.unpaid_count) == (2, Decimal("236.00"), 1, 1)
+    assert january.unpaid_revenue == Decimal("118.00")
+
+    moved = invoice_payload("FATURA NR.1", client_row["id"], "2026-02-03")
+    response = client.put(f"/invoices/{first['id']}", headers=auth_headers, json=moved)
+    assert response.status_code == 200, response.text
+    assert (_row(db, 2026, 1).doc_count, _row(db, 2026, 2).doc_count) == (1, 1)
+
+
+def test_drifted_row_is_corrected_by_the_next_write(client, auth_headers, client_row, db):
+    _create(client, auth_headers, invoice_payload("FATURA NR.1", client_row["id"]))
+    # P.sh. një rresht i shkruar gabim ose tabela e krijuar pasi faturat ekzistonin
+    db.query(models.MonthlyRollup).filter_by(doc_type="invoice").update({"doc_count": 40, "revenue": 9999})
+    db.commit()
+    _create(client, auth_headers, invoice_payload("FATURA NR.2", client_row["id"]))
+    january = _row(db, 2026, 1)
+    assert (january.doc_count, january.revenue) == (2, Decimal("236.00"))
+
+
+def test_bulk_delete_refreshes_the_months_of_deleted_invoices(client, auth_headers, client_row, db):
+    ids = [
+        _create(client, auth_headers, invoice_payload(f"FATURA NR.{n}", client_row["id"], day))["id"]
+        for n, day in ((1, "2026-01-10"), (2, "2026-03-10"), (3, "2026-03-11"))
+    ]
+    response = client.post("/invoices/bulk-delete", headers=auth_headers, json={"invoice_ids": ids[:2]})
+    assert response.json() == {"deleted": 2}
+    assert _row(db, 2026, 1).doc_count == 0
+    assert _row(db, 2026, 3).doc_count == 1
+    assert rollups.years(db, "invoice") == [2026]
+
+
+def test_rebuild_matches_incremental_rows(client, auth_headers, client_row, db):
+    for n, day in ((1, "2025-12-31"), (2, "2026-01-01"), (3, "2026-01-02")):
+        _create(client, auth_headers, invoice_payload(f"FATURA NR.{n}", client_row["id"], day))
+    fields = lambda: sorted(
+        (r.doc_type, r.year, r.month, *[getattr(r, f) for f in rollups.FIELDS])
+        for r in db.query(models.MonthlyRollup).all()
+    )
+    incremental = fields()
+    rollups.rebuild(db)
+    db.commit()
+    assert fields() == incremental
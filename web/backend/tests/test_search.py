@@ -0,0 +1,46 @@
+"""Kërkimi: `?search=` i listave mbetet nënvarg si te desktop-i; /search përdor indeksin e fjalëve."""
+from conftest import invoice_payload, offer_payload
+
+
+def _numbers(client, auth_headers, path, search, field):
+    response = client.get(path, headers=auth_headers, params={"search": search})
+    assert response.status_code == 200, response.text
+    return [row[field] for row in response.json()]
+
+
+def _client(client, auth_headers, name):
+    return client.post("/clients", headers=auth_headers, json={"name": name}).json()["id"]
+
+
+def test_list_search_matches_substrings(client, auth_headers):
+    holkos = _client(client, auth_headers, "Holkos Sh.p.k.")
+    other = _client(client, auth_headers, "Tjetër")
+    client.post("/invoices", headers=auth_headers, json=invoice_payload("FATURA NR.123", other))
+    client.post("/invoices", headers=auth_headers, json=invoice_payload("FATURA NR.124", holkos))
+
+    assert _numbers(client, auth_headers, "/invoices", "23", "invoice_number") == ["FATURA NR.123"]
+    assert _numbers(client, auth_headers, "/invoices", "olkos", "invoice_number") == ["FATURA NR.124"]
+    # Artikujt nuk janë pjesë e filtrit të listës (si te desktop-i)
+    assert _numbers(client, auth_headers, "/invoices", "Shërbim", "invoice_number") == []
+
+
+def test_offer_list_search_includes_the_subject(client, auth_headers):
+    holkos = _client(client, auth_headers, "Holkos Sh.p.k.")
+    client.post("/offers", headers=auth_headers, json=offer_payload("NR.1", holkos, subject="Renovimi i zyrës"))
+    client.post("/offers", headers=auth_headers, json=offer_payload("NR.2", _client(client, auth_headers, "Tjetër")))
+
+    assert _numbers(client, auth_headers, "/offers", "novim", "offer_number") == ["NR.1"]
+    assert _numbers(client, auth_headers, "/offers", "olkos", "offer_number") == ["NR.1"]
+    assert _numbers(client, auth_headers, "/offers", "nr.2", "offer_number") == ["NR.2"]
+
+
+def test_global_search_matches_word_prefixes(client, auth_headers):
+    holkos = _client(client, auth_headers, "Holkos Sh.p.k.")
+    client.post("/invoices", headers=auth_headers, json=invoice_payload("FATURA NR.123", holkos))
+
+    def hits(q):
+        return {(hit["type"], hit["title"]) for hit in client.get("/search", headers=auth_headers, params={"q": q}).json()["results"]}
+
+    assert ("client", "Holkos Sh.p.k.") in hits("holk")
+    assert ("invoice", "FATURA NR.123") in hits("sherb")  # artikujt, pa diakritikë
+    assert hits("olkos") == set()
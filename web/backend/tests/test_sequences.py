@@ -0,0 +1,58 @@
+"""Numërimi i faturave/ofertave: numrat e kërkuar, konfliktet dhe krijimet njëkohësisht."""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import models
+import sequences
+from conftest import invoice_payload, offer_payload
+
+
+def _create(client, auth_headers, payload, path="/invoices"):
+    response = client.post(path, headers=auth_headers, json=payload)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_requested_number_is_kept_when_free(client, auth_headers, client_row):
+    created = _create(client, auth_headers, invoice_payload("FATURA NR.7", client_row["id"]))
+    assert created["invoice_number"] == "FATURA NR.7"
+    # Sekuenca kalon pas numrit të kërkuar
+    assert _create(client, auth_headers, invoice_payload("FATURA NR.7", client_row["id"]))["invoice_number"] == "FATURA NR.8"
+
+
+def test_number_below_next_value_is_never_reused_even_if_snapshot_misses_it(client, auth_headers, client_row, monkeypatch):
+    _create(client, auth_headers, invoice_payload("FATURA NR.5", client_row["id"]))
+    # Një transaksion me snapshot të vjetër (REPEATABLE READ) nuk e sheh faturën NR.5
+    monkeypatch.setattr(sequences, "is_taken", lambda *args, **kwargs: False)
+    second = _create(client, auth_headers, invoice_payload("FATURA NR.5", client_row["id"]))
+    assert second["invoice_number"] == "FATURA NR.6"
+
+
+def test_unique_conflict_from_outside_the_sequence_takes_next_number(client, auth_headers, client_row, db, monkeypatch):
+    _create(client, auth_headers, invoice_payload("FATURA NR.1", client_row["id"]))
+    # Desktop-i shkruan NR.2 pa kaluar nga document_sequences dhe snapshot-i ynë nuk e sheh
+    db.add(models.Invoice(invoice_number="FATURA NR.2", date=date(2026, 2, 1), client_id=client_row["id"],
+                          subtotal=1, vat_percentage=18, vat_amount=0, total=1, status="unpaid"))
+    db.commit()
+    monkeypatch.setattr(sequences, "is_taken", lambda *args, **kwargs: False)
+    created = _create(client, auth_headers, invoice_payload("FATURA NR.2", client_row["id"]))
+    assert created["invoice_number"] == "FATURA NR.3"
+    assert db.query(models.DocumentSequence.next_value).filter_by(doc_type="invoice", year=2026).scalar() == 4
+
+
+def test_concurrent_creates_with_the_same_number_get_distinct_numbers(client, auth_headers, client_row):
+    # SQLite nuk ka FOR UPDATE (radhën e saktë e garanton vetëm MySQL/TiDB), por asnjë krijim
+    # njëkohësisht nuk duhet të dështojë me 500 ose të marrë numër të dyfishtë
+    _create(client, auth_headers, invoice_payload("FATURA NR.19", client_row["id"]))
+    payload = invoice_payload("FATURA NR.20", client_row["id"])
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        responses = list(pool.map(lambda _: client.post("/invoices", headers=auth_headers, json=payload), range(6)))
+    assert [r.status_code for r in responses] == [200] * 6
+    numbers = sorted(int(r.json()["invoice_number"].split(".")[-1]) for r in responses)
+    assert numbers == list(range(20, 26))
+
+
+def test_offer_numbers_are_allocated_across_years(client, auth_headers, client_row):
+    first = _create(client, auth_headers, offer_payload("OFERTA NR.3", client_row["id"], "2025-12-30"), "/offers")
+    second = _create(client, auth_headers, offer_payload("OFERTA NR.3", client_row["id"], "2026-01-02"), "/offers")
+    assert (first["offer_number"], second["offer_number"]) == ("OFERTA NR.3", "OFERTA NR.4")
@@ -0,0 +1,61 @@
+"""Eksporti NDJSON: një dokument për rresht, i lexuar në grupe, me artikujt e secilit dokument."""
+import json
+
+import main
+from conftest import invoice_payload, offer_payload
+
+
+def _ndjson(response):
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith(main.NDJSON_MEDIA_TYPE)
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def _items(count, price=10):
+    return [{"description": f"Artikull {n}", "quantity": 1, "unit_price": price, "subtotal": price} for n in range(count)]
+
+
+def test_invoice_stream_spans_several_batches(client, auth_headers, client_row, monkeypatch):
+    # Grupe të vogla: artikujt ngarkohen veçmas për çdo grup, kursori kryesor mbetet i hapur
+    monkeypatch.setattr(main, "_STREAM_BATCH", 2)
+    for number in range(1, 6):
+        payload = invoice_payload(f"FATURA NR.{number}", client_row["id"], f"2026-01-{number:02d}", items=_items(number))
+        assert client.post("/invoices", headers=auth_headers, json=payload).status_code == 200
+
+    rows = _ndjson(client.get("/invoices/stream", headers=auth_headers, params={"include": "items"}))
+    assert [row["invoice_number"] for row in rows] == [f"FATURA NR.{n}" for n in range(5, 0, -1)]
+    assert [len(row["items"]) for row in rows] == [5, 4, 3, 2, 1]
+    assert all(item["invoice_id"] == row["id"] for row in rows for item in row["items"])
+    assert [item["description"] for item in rows[0]["items"]] == [f"Artikull {n}" for n in range(5)]
+
+
+def test_stream_applies_filters_and_include(client, auth_headers, client_row):
+    client.post("/invoices", headers=auth_headers, json=invoice_payload("FATURA NR.1", client_row["id"], "2025-06-01"))
+    client.post("/invoices", headers=auth_headers, json=invoice_payload("FATURA NR.2", client_row["id"], "2026-06-01"))
+
+    rows = _ndjson(client.get(
+        "/invoices", headers=dict(auth_headers, Accept=main.NDJSON_MEDIA_TYPE),
+        params={"date_from": "2026-01-01", "include": ""},
+    ))
+    assert [row["invoice_number"] for row in rows] == ["FATURA NR.2"]
+    assert "client" not in rows[0] and "items" not in rows[0]
+
+
+def test_offer_stream_matches_the_list(client, auth_headers, client_row, monkeypatch):
+    monkeypatch.setattr(main, "_STREAM_BATCH", 2)
+    for number in range(1, 4):
+        payload = offer_payload(f"NR.{number}", client_row["id"], items=_items(2))
+        assert client.post("/offers", headers=auth_headers, json=payload).status_code == 200
+
+    streamed = _ndjson(client.get("/offers/stream", headers=auth_headers))
+    negotiated = _ndjson(client.get("/offers", headers=dict(auth_headers, Accept=main.NDJSON_MEDIA_TYPE)))
+    listed = client.get("/offers", headers=auth_headers).json()
+    assert streamed == negotiated == listed
+    assert [len(row["items"]) for row in streamed] == [2, 2, 2]
+
+
+def test_cursor_requests_stay_json(client, auth_headers, client_row):
+    client.post("/invoices", headers=auth_headers, json=invoice_payload("FATURA NR.1", client_row["id"]))
+    response = client.get("/invoices", headers=dict(auth_headers, Accept=main.NDJSON_MEDIA_TYPE), params={"limit": 1})
+    assert response.headers["content-type"].startswith("application/json")
+    assert len(response.json()) == 1
@@ -0,0 +1,62 @@
+"""Delta sync: token-i nuk kalon mbi ndryshimet e transaksioneve ende pa commit."""
+import database
+import models
+import sync_log
+from conftest import invoice_payload
+
+
+def _changes(client, auth_headers, since):
+    response = client.get("/sync/changes", headers=auth_headers, params={"since": since})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_flush_does_not_hand_out_a_token_before_commit(client_row, db):
+    before = db.query(models.ChangeLog).count()
+    writer = database.SessionLocal()
+    try:
+        writer.add(models.Client(name="Klienti B"))
+        writer.flush()
+        # Asnjë id e change_log nuk rezervohet para commit-it, as brenda transaksionit
+        assert writer.query(models.ChangeLog).count() == before
+        writer.commit()
+    finally:
+        writer.close()
+    assert db.query(models.ChangeLog).count() == before + 1
+
+
+def test_interleaved_writers_are_not_skipped(client, auth_headers, client_row, monkeypatch):
+    # Indeksi i kërkimit shkruan brenda transaksionit, dhe në SQLite çdo shkrim bllokon gjithë
+    # databazën; pa të, shkruesi A mbetet në pritje pa bllokuar shkruesin B
+    monkeypatch.setattr(sync_log, "_change_listeners", [])
+    token = _changes(client, auth_headers, 0)["token"]
+    first = client.post("/invoices", headers=auth_headers, json=invoice_payload("FATURA NR.1", client_row["id"])).json()
+
+    # Shkruesi A: ndryshim bulk i regjistruar, transaksioni mbetet i hapur
+    writer_a = database.SessionLocal()
+    try:
+        sync_log.record(writer_a, "invoices", [first["id"]], sync_log.UPSERT)
+        # Shkruesi B nis pas A-së dhe bën commit para saj
+        second = client.post("/invoices", headers=auth_headers, json=invoice_payload("FATURA NR.2", client_row["id"])).json()
+        seen = _changes(client, auth_headers, token)
+        assert {row["id"] for row in seen["invoices"]["upserted"]} == {first["id"], second["id"]}
+        token = seen["token"]
+        writer_a.commit()
+    finally:
+        writer_a.close()
+
+    # Ndryshimi i A-së del pas token-it që u dha ndërkohë
+    after = _changes(client, auth_headers, token)
+    assert [row["id"] for row in after["invoices"]["upserted"]] == [first["id"]]
+    assert after["token"] > token
+
+
+def test_later_operation_in_the_same_transaction_wins(client, auth_headers, client_row, db):
+    created = client.post("/invoices", headers=auth_headers, json=invoice_payload("FATURA NR.1", client_row["id"])).json()
+    token = _changes(client, auth_headers, 0)["token"]
+    invoice = db.get(models.Invoice, created["id"])
+    invoice.status = "paid"
+    db.flush()
+    db.delete(invoice)
+    db.commit()
+    assert _changes(client, auth_headers, token)["invoices"] == {"upserted": [], "deleted": [created["id"]]}
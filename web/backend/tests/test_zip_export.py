@@ -0,0 +1,56 @@
+"""Eksporti ZIP: arkiv i vlefshëm me PDF-të e filtruara, dështimet te errors.txt."""
+import io
+import zipfile
+
+import render_queue
+from conftest import invoice_payload
+
+
+def _create(client, auth_headers, number, client_id, day):
+    response = client.post("/invoices", headers=auth_headers, json=invoice_payload(number, client_id, day))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _archive(response):
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/zip"
+    return zipfile.ZipFile(io.BytesIO(response.content))
+
+
+def test_export_contains_the_filtered_pdfs(client, auth_headers, client_row, company):
+    for number, day in ((1, "2026-01-10"), (2, "2026-01-20"), (3, "2026-02-01")):
+        _create(client, auth_headers, f"FATURA NR.{number}", client_row["id"], day)
+
+    with client.stream("GET", "/invoices/export.zip", headers=auth_headers,
+                       params={"date_from": "2026-01-01", "date_to": "2026-01-31"}) as response:
+        assert response.headers["content-disposition"] == 'attachment; filename="Faturat_2026-01-01_2026-01-31.zip"'
+        chunks = list(response.iter_bytes())
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+    assert archive.testzip() is None
+    assert sorted(archive.namelist()) == ["Fatura_FATURA_NR.1_2026.pdf", "Fatura_FATURA_NR.2_2026.pdf"]
+    for name in archive.namelist():
+        info = archive.getinfo(name)
+        assert info.compress_type == zipfile.ZIP_STORED
+        assert archive.read(name).startswith(b"%PDF")
+
+
+def test_failed_render_is_listed_in_errors_txt(client, auth_headers, client_row, company, monkeypatch):
+    ok = _create(client, auth_headers, "FATURA NR.1", client_row["id"], "2026-01-10")
+    broken = _create(client, auth_headers, "FATURA NR.2", client_row["id"], "2026-01-11")
+    render_by_id = render_queue._render_by_id
+
+    def flaky(doc_type, doc_id):
+        if doc_id == broken["id"]:
+            raise RuntimeError("shablloni mungon")
+        return render_by_id(doc_type, doc_id)
+
+    monkeypatch.setattr(render_queue, "_render_by_id", flaky)
+    archive = _archive(client.get("/invoices/export.zip", headers=auth_headers))
+    assert archive.namelist() == [f"Fatura_{ok['invoice_number'].replace(' ', '_')}_2026.pdf", "errors.txt"]
+    assert archive.read("errors.txt").decode("utf-8") == f"invoice {broken['id']}: shablloni mungon\n"
+
+
+def test_empty_export_is_404(client, auth_headers):
+    response = client.get("/invoices/export.zip", headers=auth_headers, params={"date_from": "2030-01-01"})
+    assert response.status_code == 404
@@ -0,0 +1,49 @@
+"""Cache e vogël në memorie me TTL (për përgjigje që lexohen shpesh dhe ndryshojnë rrallë)."""
+import threading
+import time
+
+
+class TTLCache:
+    """
+    Vlerat skadojnë pas `ttl` sekondash ose kur thirret `invalidate()`.
+    Në Vercel çdo instancë ka cache-in e vet, prandaj TTL mbahet i shkurtër.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: dict = {}
+        self._generation = 0
+
+    def get_or_set(self, key, compute):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                return entry[1]
+            generation = self._generation
+        value = compute()
+        with self._lock:
+            # Mos ruaj vlerë të llogaritur para një invalidate-i që ndodhi ndërkohë
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+        return value
+
+    async def get_or_set_async(self, key, compute):
+        """Si `get_or_set`, por `compute` është korutinë (p.sh. query me AsyncSession)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                return entry[1]
+            generation = self._generation
+        value = await compute()
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+        return value
+
+    def invalidate(self, *_args):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
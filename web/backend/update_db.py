@@ -15,9 +15,61 @@ def _seed_auth_credentials(conn):
             conn.execute(text("INSERT INTO settings (setting_key, setting_value) VALUES (:k, :v)"), {"k": key, "v": val})
             print(f"Seeded {key}.")
 
+def _create_change_log(conn):
+    """change_log krijohet me SQL që në TiDB id-të të jenë monotone (token-i i delta sync)."""
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS change_log (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            entity VARCHAR(30) NOT NULL,
+            entity_id INT NOT NULL,
+            op VARCHAR(10) NOT NULL,
+            changed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            INDEX ix_change_log_changed_at (changed_at)
+        ) /*T![auto_id_cache] AUTO_ID_CACHE=1 */
+    """))
+
+def _migrate_seq_columns(conn, table, number_col):
+    """doc_year/seq_no/seq_suffix: shto kolonat, mbush rreshtat ekzistues dhe krijo indekset."""
+    from sequences import seq_columns
+    cols = [row[0] for row in conn.execute(text(f"SHOW COLUMNS FROM {table}")).fetchall()]
+    if "doc_year" not in cols:
+        print(f"Adding 'doc_year', 'seq_no', 'seq_suffix' to {table}...")
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN doc_year INT NULL"))
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN seq_no INT NULL"))
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN seq_suffix VARCHAR(20) NOT NULL DEFAULT ''"))
+
+    # Backfill: numri analizohet në Python (i njëjti parser si në shkrime)
+    rows = conn.execute(text(f"SELECT id, {number_col}, date FROM {table} WHERE doc_year IS NULL")).fetchall()
+    if rows:
+        params = []
+        for row_id, number, doc_date in rows:
+            seq_no, suffix = seq_columns(number)
+            params.append({"id": row_id, "y": doc_date.year if doc_date else None, "n": seq_no, "s": suffix})
+        conn.execute(text(f"UPDATE {table} SET doc_year = :y, seq_no = :n, seq_suffix = :s WHERE id = :id"), params)
+        print(f"Backfilled seq columns for {len(params)} {table}.")
+
+    indexes = {row[2] for row in conn.execute(text(f"SHOW INDEX FROM {table}")).fetchall()}
+    if f"ix_{table}_seq_no" not in indexes:
+        conn.execute(text(f"CREATE INDEX ix_{table}_seq_no ON {table} (seq_no)"))
+    if f"uq_{table}_year_seq" not in indexes and f"ix_{table}_year_seq" not in indexes:
+        try:
+            conn.execute(text(f"CREATE UNIQUE INDEX uq_{table}_year_seq ON {table} (doc_year, seq_no, seq_suffix)"))
+        except Exception as ex:
+            # Dublikatat e vjetra duhen rregulluar me dorë; deri atëherë indeks jo-unik
+            print(f"Unique index on {table} skipped (duplicate numbers?): {ex}")
+            conn.execute(text(f"CREATE INDEX ix_{table}_year_seq ON {table} (doc_year, seq_no, seq_suffix)"))
+
 def update_db():
     print("Starting database schema update...")
     
+    # 0. change_log para create_all (MySQL e injoron komentin /*T! ... */)
+    with engine.connect() as conn:
+        try:
+            _create_change_log(conn)
+            conn.commit()
+        except Exception as ex:
+            print("change_log create skipped:", ex)
+    
     # 1. Create missing tables
     Base.metadata.create_all(bind=engine)
     print("Tables check/creation complete.")
@@ -127,6 +179,13 @@ def update_db():
         except Exception as e:
             print(f"companies logo migration skipped: {e}")
 
+        # Numri sekuencial i ruajtur (renditje dhe kontroll dublikatash me indeks)
+        for table, number_col in (("invoices", "invoice_number"), ("offers", "offer_number")):
+            try:
+                _migrate_seq_columns(conn, table, number_col)
+            except Exception as ex:
+                print(f"{table} seq columns migration skipped:", ex)
+
         # 3. Hiq indekset e vjeter qe kerkonin unike globale
         # Numrat e fatures jane unike per vit, jo globale (FATURA NR.1 2025 + FATURA NR.1 2026 OK)
         try:
@@ -150,6 +209,28 @@ def update_db():
         except Exception as ex:
             print("Auth seed skipped:", ex)
     
+    # 5. monthly_rollups: mbushe herën e parë (më pas mbahet nga shkrimet)
+    try:
+        from sqlalchemy.orm import Session
+        import rollups
+        with Session(engine) as session:
+            if session.query(models.MonthlyRollup.id).first() is None:
+                print(f"monthly_rollups built: {rollups.rebuild(session)} rows.")
+                session.commit()
+    except Exception as ex:
+        print("monthly_rollups build skipped:", ex)
+
+    # 6. search_tokens: ndërto indeksin e kërkimit herën e parë
+    try:
+        from sqlalchemy.orm import Session
+        import search_index
+        with Session(engine) as session:
+            if session.query(models.SearchToken.id).first() is None:
+                print(f"search_tokens built: {search_index.rebuild(session)} tokens.")
+                session.commit()
+    except Exception as ex:
+        print("search_tokens build skipped:", ex)
+    
     print("Database schema update finished.")
 
 if __name__ == "__main__":
@@ -0,0 +1,67 @@
+"""ZIP në rrjedhë: arkivi dërgohet te klienti hyrje pas hyrjeje, pa skedar të përkohshëm në disk.
+
+zipfile shkruan edhe në objekte jo-seekable (me "data descriptor" pas çdo hyrjeje), prandaj
+mjafton një buffer i vogël që zbrazet pas çdo copë – memoria mbetet konstante sido që të jetë arkivi.
+"""
+import time
+import zipfile
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _Sink:
+    """Objekt file-like vetëm për shkrim; bajtet mbahen vetëm deri te `drain()` i radhës."""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def location_chunks(location: str):
+    """Bajtet e një skedari lokal ose URL-je (Vercel Blob), në copa CHUNK_SIZE."""
+    if location.startswith(("http://", "https://")):
+        from urllib.request import urlopen
+        source = urlopen(location, timeout=30)
+    else:
+        source = open(location, "rb")
+    with source:
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def stream_zip(entries):
+    """
+    entries: (emri, iterable bajtesh) → gjenerator bajtesh të arkivit ZIP.
+    Hyrjet ruhen pa kompresim (ZIP_STORED): PDF-të janë tashmë të kompresuara.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+        for name, chunks in entries:
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            with archive.open(info, "w") as entry:
+                for chunk in chunks:
+                    entry.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            yield sink.drain()
+    yield sink.drain()